@@ -0,0 +1,43 @@
+# gunicorn_asgi.py - ASGI（uvicorn ワーカー）用の gunicorn 設定
+"""
+gunicorn -c learning_website/gunicorn_asgi.py learning_website.asgi:application
+
+uvicorn ワーカーで ASGI アプリを動かし、高頻度 JSON エンドポイントは
+非同期ビュー（tutorial.async_views）で処理する。1 ワーカーが多数の接続を
+同時に保持できるため、同期ワーカーよりも少ないプロセス数で済む。
+各値は環境変数で上書きできる。
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+# ワーカーの再起動でメモリの肥大化を防ぐ（同時に再起動しないよう揺らぎを入れる）
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '1000'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# 非同期ビューを有効にする（settings.TUTORIAL_ASYNC_VIEWS）
+raw_env = [
+    'DJANGO_SETTINGS_MODULE=' + os.environ.get('DJANGO_SETTINGS_MODULE', 'learning_website.settings'),
+    'TUTORIAL_ASYNC_VIEWS=' + os.environ.get('TUTORIAL_ASYNC_VIEWS', '1'),
+]
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG') or None
+errorlog = '-'
+
+
+def on_starting(server):
+    """プロセス内キャッシュのまま複数ワーカーを起動しようとしていれば警告する"""
+    backend = os.environ.get('TUTORIAL_CACHE_BACKEND', 'file')
+    if backend == 'locmem' and server.cfg.workers > 1:
+        server.log.warning(
+            'TUTORIAL_CACHE_BACKEND=locmem で %d ワーカーを起動します。キャッシュの無効化が'
+            'ワーカー間で共有されないため、管理画面での変更が他のワーカーに最大 '
+            'TUTORIAL_CACHE_CONTENT_TIMEOUT 秒反映されません（file か redis を使ってください）',
+            server.cfg.workers,
+        )
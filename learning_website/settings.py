@@ -70,10 +70,15 @@ TINYMCE_DEFAULT_CONFIG = {
     ''',
     'image_advtab': True,
     'image_caption': True,
+    # 画像は tutorial.views.upload_guide_image で内容アドレスのストレージに保存する
+    'images_upload_url': '/guide/images/upload/',
+    'automatic_uploads': True,
+    'relative_urls': False,
 }
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'tutorial.metrics.MetricsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -110,6 +115,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL モード: 読み取り（バックアップを含む）が書き込みをブロックしない
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
     }
 }
 
@@ -158,7 +167,18 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# collectstatic で CSS / JS を縮小し、ハッシュ付きのファイル名で圧縮して出力する
+# （Django 5.1 以降は STATICFILES_STORAGE ではなく STORAGES で指定する）
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "learning_website.storage.MinifiedManifestStaticFilesStorage"},
+}
+# collectstatic で縮小するファイル（STATIC_ROOT からの相対パス。fnmatch のパターン可）
+# 管理サイトや TinyMCE など他のアプリの静的ファイルは縮小しない
+TUTORIAL_STATIC_MINIFY_FILES = [
+    'css/chapter_detail.css', 'js/chapter_detail.js',
+    'css/building_blocks.css', 'js/building_blocks.js',
+]
 
 
 # Default primary key field type
@@ -177,3 +197,191 @@ LOGOUT_REDIRECT_URL = '/'
 
 # 登录页面URL
 LOGIN_URL = '/accounts/login/'
+
+# ==================== ロギング ====================
+# tutorial アプリのログは JSON 1 行形式で非同期キュー経由で出力する
+# モジュールごとのレベルは TUTORIAL_LOG_LEVELS で指定
+# 環境変数 TUTORIAL_LOG_LEVELS="tutorial=INFO,tutorial.models=DEBUG" で上書き可能
+
+TUTORIAL_LOG_LEVELS = {
+    'tutorial': 'INFO',
+}
+for _item in os.environ.get('TUTORIAL_LOG_LEVELS', '').split(','):
+    if '=' in _item:
+        _name, _level = _item.split('=', 1)
+        TUTORIAL_LOG_LEVELS[_name.strip()] = _level.strip().upper()
+
+# DEBUG ログのサンプリング率と、同一メッセージあたりの流量制限（件 / 秒）
+TUTORIAL_LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('TUTORIAL_LOG_DEBUG_SAMPLE_RATE', '0.1'))
+TUTORIAL_LOG_RATE_LIMIT = int(os.environ.get('TUTORIAL_LOG_RATE_LIMIT', '20'))
+TUTORIAL_LOG_RATE_INTERVAL = float(os.environ.get('TUTORIAL_LOG_RATE_INTERVAL', '60'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'tutorial.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sampled_debug': {
+            '()': 'tutorial.log.SampledDebugFilter',
+            'sample_rate': TUTORIAL_LOG_DEBUG_SAMPLE_RATE,
+            'rate_limit': TUTORIAL_LOG_RATE_LIMIT,
+            'interval': TUTORIAL_LOG_RATE_INTERVAL,
+        },
+    },
+    'handlers': {
+        'tutorial_async': {
+            'class': 'tutorial.log.AsyncQueueHandler',
+            'formatter': 'json',
+            'filters': ['sampled_debug'],
+        },
+    },
+    'loggers': {
+        name: {
+            'handlers': ['tutorial_async'] if name == 'tutorial' else [],
+            'level': level,
+            'propagate': name != 'tutorial',
+        }
+        for name, level in TUTORIAL_LOG_LEVELS.items()
+    },
+}
+
+# ==================== メトリクス ====================
+# ワーカーごとの集計ファイルの置き場所（gunicorn の全ワーカーで共有する。既定は /dev/shm 配下）
+TUTORIAL_METRICS_DIR = os.environ.get('TUTORIAL_METRICS_DIR') or None
+# 集計ファイルへの書き出し間隔（秒）
+TUTORIAL_METRICS_FLUSH_INTERVAL = float(os.environ.get('TUTORIAL_METRICS_FLUSH_INTERVAL', '5'))
+
+# ==================== バックアップ ====================
+# backup_db / restore_db のスナップショット保存先と保持数
+TUTORIAL_BACKUP_DIR = os.environ.get('TUTORIAL_BACKUP_DIR') or BASE_DIR / 'backups'
+TUTORIAL_BACKUP_KEEP = int(os.environ.get('TUTORIAL_BACKUP_KEEP', '14'))
+
+# ==================== ASGI ====================
+# 高頻度 JSON エンドポイントに非同期ビュー（tutorial.async_views）を使う
+# ASGI（gunicorn + uvicorn ワーカー、learning_website/gunicorn_asgi.py）で運用する場合に有効にする
+TUTORIAL_ASYNC_VIEWS = os.environ.get('TUTORIAL_ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
+
+# ==================== 学習セッション ====================
+# sendBeacon による終了通知の冪等キーを覚えておく秒数
+TUTORIAL_BEACON_IDEMPOTENCY_TTL = int(os.environ.get('TUTORIAL_BEACON_IDEMPOTENCY_TTL', '86400'))
+# 1 セッションとして記録する最長秒数（閉じ忘れたセッションの経過時間はここで打ち切る）
+TUTORIAL_STUDY_SESSION_MAX_SECONDS = int(os.environ.get('TUTORIAL_STUDY_SESSION_MAX_SECONDS', str(4 * 3600)))
+# ハートビートの間隔がこの秒数を超えた区間はアイドルとみなして学習時間に加算しない
+TUTORIAL_STUDY_IDLE_CUTOFF_SECONDS = int(os.environ.get('TUTORIAL_STUDY_IDLE_CUTOFF_SECONDS', '90'))
+# 最後のハートビート（無ければ start_time）からこの時間が経っても終了していないセッションを定期ジョブで閉じる
+TUTORIAL_STUDY_SESSION_STALE_HOURS = int(os.environ.get('TUTORIAL_STUDY_SESSION_STALE_HOURS', '24'))
+
+# ==================== 誤答記録 ====================
+# 誤答は (ユーザー, 問題) ごとに 1 行へ集約し、重複を除いた最近の誤答をこの件数まで残す
+TUTORIAL_WRONG_ANSWER_HISTORY = int(os.environ.get('TUTORIAL_WRONG_ANSWER_HISTORY', '5'))
+
+# ==================== バックグラウンドジョブ ====================
+# 'db': Job テーブルに登録し run_jobs コマンドのワーカーが実行（既定。ワーカーが動いていなければ
+#       ログと `manage.py check --database` が警告する）
+# 'immediate': コミット後にリクエスト内で実行（開発用。失敗したジョブの再試行は run_jobs のワーカーが行う）
+TUTORIAL_JOB_BACKEND = os.environ.get('TUTORIAL_JOB_BACKEND', 'db')
+# 'db' で実行予定をこの秒数過ぎても待機中のジョブがあれば、ワーカーが動いていないとみなして警告する
+TUTORIAL_JOB_STALL_SECONDS = int(os.environ.get('TUTORIAL_JOB_STALL_SECONDS', '600'))
+# run_jobs のワーカープロセス数
+TUTORIAL_JOB_WORKERS = int(os.environ.get('TUTORIAL_JOB_WORKERS', '2'))
+# 再試行の初回待ち秒数（以降は倍々）
+TUTORIAL_JOB_RETRY_DELAY = int(os.environ.get('TUTORIAL_JOB_RETRY_DELAY', '10'))
+# 実行中のまま残ったジョブを待機中に戻すまでの秒数
+TUTORIAL_JOB_LOCK_TIMEOUT = int(os.environ.get('TUTORIAL_JOB_LOCK_TIMEOUT', '300'))
+# 定期的にキューへ追加するジョブ（ジョブ名: 間隔秒）。run_jobs のワーカーが登録する
+TUTORIAL_PERIODIC_JOBS = {
+    'tutorial.tasks.close_stale_study_sessions': int(os.environ.get('TUTORIAL_SESSION_SWEEP_INTERVAL', '600')),
+    # 期限切れのログインセッション（django_session）を小分けの DELETE で削除
+    'tutorial.tasks.purge_expired_sessions': int(os.environ.get('TUTORIAL_SESSION_PURGE_INTERVAL', str(24 * 3600))),
+    # 終了時に DB へ書けなかった添付ファイルのダウンロード数（スプール）を反映
+    'tutorial.tasks.flush_download_counts': int(os.environ.get('TUTORIAL_DOWNLOAD_COUNT_SWEEP_INTERVAL', '300')),
+}
+
+# ==================== キャッシュ ====================
+# tutorial.cache が使うキャッシュ。TUTORIAL_CACHE_BACKEND で選択する
+#   file:   ファイル（既定。/dev/shm 配下に置き、同じホストの全ワーカーで共有される）
+#   redis:  Redis 互換サーバー（別途 `pip install redis` が必要）
+#   locmem: プロセス内メモリ（単一プロセスの開発・テスト向け。保存時の無効化が
+#           他のワーカーに届かないため、複数ワーカーでは使わない）
+TUTORIAL_CACHE_BACKEND = os.environ.get('TUTORIAL_CACHE_BACKEND', 'file')
+_cache_location = os.environ.get('TUTORIAL_CACHE_LOCATION')
+if TUTORIAL_CACHE_BACKEND == 'file':
+    _default_cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': _cache_location or ('/dev/shm/tutorial_cache' if os.path.isdir('/dev/shm') else str(BASE_DIR / 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+elif TUTORIAL_CACHE_BACKEND == 'redis':
+    _default_cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': _cache_location or 'redis://127.0.0.1:6379/1',
+    }
+else:
+    _default_cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': _cache_location or 'tutorial',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+CACHES = {'default': _default_cache}
+# 名前空間ごとの既定のタイムアウト（秒）
+TUTORIAL_CACHE_TIMEOUTS = {
+    'content': int(os.environ.get('TUTORIAL_CACHE_CONTENT_TIMEOUT', '3600')),
+    'user': int(os.environ.get('TUTORIAL_CACHE_USER_TIMEOUT', '300')),
+    'leaderboard': int(os.environ.get('TUTORIAL_CACHE_LEADERBOARD_TIMEOUT', '60')),
+}
+
+# ==================== 添付ファイルの配信 ====================
+# 学習ガイドの添付（ZIP など）は tutorial.views.download_attachment で配信する
+# （MEDIA_URL は DEBUG 時しか配信されないため、study_guide_zips/ は公開しない）
+# 'x-accel':    nginx に転送を任せる。例:
+#                 location /protected-media/ { internal; alias /path/to/media/; }
+# 'x-sendfile': Apache mod_xsendfile などに転送を任せる
+# '':           Django が直接返す（Range・条件付きリクエスト対応、gunicorn では sendfile）
+TUTORIAL_ATTACHMENT_OFFLOAD = os.environ.get('TUTORIAL_ATTACHMENT_OFFLOAD', '')
+TUTORIAL_ATTACHMENT_ACCEL_PREFIX = os.environ.get('TUTORIAL_ATTACHMENT_ACCEL_PREFIX', '/protected-media/')
+# ダウンロード数を DB にまとめて反映する間隔（秒）
+TUTORIAL_DOWNLOAD_COUNT_FLUSH_INTERVAL = int(os.environ.get('TUTORIAL_DOWNLOAD_COUNT_FLUSH_INTERVAL', '10'))
+# ワーカーの終了時に DB へ反映できなかったダウンロード数の書き出し先（既定は /dev/shm 配下）
+TUTORIAL_DOWNLOAD_COUNT_SPOOL_DIR = os.environ.get('TUTORIAL_DOWNLOAD_COUNT_SPOOL_DIR') or None
+
+# ==================== アップロードファイルの保存 ====================
+# 添付ファイルとガイド画像は tutorial.storage.ContentAddressedStorage で SHA-256 ごとに
+# 1 つだけ保存し、名前はハードリンクで共有する。未参照の実体は gc_media コマンドで削除する
+TUTORIAL_BLOB_DIR = 'blobs'
+# 更新からこの秒数以内の実体は保存中の可能性があるため gc_media で削除しない
+TUTORIAL_BLOB_GC_GRACE_SECONDS = int(os.environ.get('TUTORIAL_BLOB_GC_GRACE_SECONDS', '3600'))
+# 学習ガイドにアップロードできる画像の最大サイズ（バイト）
+TUTORIAL_GUIDE_IMAGE_MAX_BYTES = int(os.environ.get('TUTORIAL_GUIDE_IMAGE_MAX_BYTES', str(5 * 1024 * 1024)))
+
+# ==================== セッション ====================
+# TUTORIAL_SESSION_ENGINE で選択する
+#   cached_db:      読み込みはキャッシュから、書き込みは DB とキャッシュの両方（既定）
+#   signed_cookies: 署名付き Cookie に保存し DB を使わない（ログアウトしても
+#                   盗まれた Cookie は期限まで有効なので、SESSION_COOKIE_AGE を短めにする）
+#   db:             従来どおり DB のみ
+TUTORIAL_SESSION_ENGINE = os.environ.get('TUTORIAL_SESSION_ENGINE', 'cached_db')
+SESSION_ENGINE = {
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'db': 'django.contrib.sessions.backends.db',
+}[TUTORIAL_SESSION_ENGINE]
+# セッションのキャッシュは全ワーカーで共有する必要がある（ログアウトが他のワーカーに
+# 届かないため）。redis 以外では、教材キャッシュの件数上限で追い出されないよう
+# 別ディレクトリのファイルキャッシュを使う
+if TUTORIAL_CACHE_BACKEND != 'redis':
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('TUTORIAL_SESSION_CACHE_LOCATION') or (
+            '/dev/shm/tutorial_sessions' if os.path.isdir('/dev/shm') else str(BASE_DIR / 'cache' / 'sessions')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+else:
+    CACHES['sessions'] = dict(_default_cache, KEY_PREFIX='sessions')
+SESSION_CACHE_ALIAS = 'sessions'
+# 内容が変わったときだけ保存する（毎リクエストの書き込みをしない）
+SESSION_SAVE_EVERY_REQUEST = False
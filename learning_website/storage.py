@@ -0,0 +1,191 @@
+# storage.py - 静的ファイルのストレージ
+"""
+collectstatic で CSS / JavaScript を縮小してから、ハッシュ付きのファイル名
+（ManifestStaticFilesStorage）と gzip / Brotli 圧縮（WhiteNoise）を適用する。
+縮小するのは settings.TUTORIAL_STATIC_MINIFY_FILES に挙げたこのサイトのバンドルだけで、
+他のアプリ（管理サイトなど）の静的ファイルはそのままハッシュ化・圧縮する。
+
+ハッシュ付きのファイルは WhiteNoise が長期キャッシュ（immutable）で配信する
+ため、ブラウザは内容が変わるまで再取得しない。
+
+縮小は依存ライブラリを使わない保守的なもの:
+- CSS: コメントを削除し、空白をまとめ、{ } ; , の前後の空白を削る
+- JavaScript: コメントと行頭・行末の空白、空行を削る。改行は残す
+  （自動セミコロン挿入に頼ったコードを壊さないため）
+文字列・テンプレートリテラル・正規表現リテラルの中身は変更しない。
+"""
+import re
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+# この文字の直後の / は割り算ではなく正規表現リテラルの開始とみなす
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'delete', 'throw')
+
+
+def _skip_string(source, i, quote):
+    """source[i] の引用符で始まる文字列の終わりの次の位置"""
+    i += 1
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == quote:
+            return i + 1
+        if char == '\n' and quote != '`':
+            return i
+        i += 1
+    return i
+
+
+def _skip_template(source, i):
+    """source[i] のバッククォートで始まるテンプレートリテラルの終わりの次の位置（${} の入れ子に対応）"""
+    i += 1
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '`':
+            return i + 1
+        if source.startswith('${', i):
+            i = _skip_braces(source, i + 2)
+            continue
+        i += 1
+    return i
+
+
+def _skip_braces(source, i):
+    """${ の後ろから対応する } の次の位置まで読み飛ばす"""
+    depth = 1
+    while i < len(source) and depth:
+        char = source[i]
+        if char in '\'"':
+            i = _skip_string(source, i, char)
+            continue
+        if char == '`':
+            i = _skip_template(source, i)
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        i += 1
+    return i
+
+
+def _skip_regex(source, i):
+    """source[i] の / で始まる正規表現リテラルの終わりの次の位置"""
+    i += 1
+    in_class = False
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '\n':
+            return i
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            return i + 1
+        i += 1
+    return i
+
+
+def _regex_allowed(out):
+    """出力済みの内容から、次の / が正規表現リテラルを始められる位置か判定"""
+    text = ''.join(out[-3:]).rstrip()
+    if not text:
+        return True
+    if text[-1] in _REGEX_PRECEDERS:
+        return True
+    return re.search(r'(?:^|[^\w$])(?:%s)$' % '|'.join(_REGEX_KEYWORDS), text) is not None
+
+
+def minify_js(source):
+    out = []
+    i = 0
+    length = len(source)
+    while i < length:
+        char = source[i]
+        if char in '\'"':
+            end = _skip_string(source, i, char)
+        elif char == '`':
+            end = _skip_template(source, i)
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = length if end == -1 else end
+            continue
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            out.append(' ')
+            continue
+        elif char == '/' and _regex_allowed(out):
+            end = _skip_regex(source, i)
+        else:
+            end = i + 1
+            while end < length and source[end] not in '\'"`/':
+                end += 1
+        out.append(source[i:end])
+        i = end
+
+    lines = (line.strip() for line in ''.join(out).splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+_CSS_STRINGS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+
+
+def _minify_css_code(code):
+    code = re.sub(r'\s+', ' ', code)
+    code = re.sub(r' ?([{};,]) ?', r'\1', code)
+    return code.replace(';}', '}')
+
+
+def minify_css(source):
+    # コメントを先に削除（文字列の中の /* */ は残す）
+    source = re.sub(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', lambda m: m.group(1) or '', source, flags=re.S)
+    # 奇数番目の要素が文字列。文字列の外側だけ空白を詰める
+    parts = _CSS_STRINGS.split(source)
+    css = ''.join(part if index % 2 else _minify_css_code(part) for index, part in enumerate(parts))
+    return css.strip() + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+class MinifiedManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """collectstatic の後処理で CSS / JavaScript を縮小してからハッシュ化・圧縮する"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            # ハッシュ化は paths の元ファイルを読むので、縮小したコピー（STATIC_ROOT 側）を読ませる
+            paths = {
+                name: (self, name) if self.minify(name) else source
+                for name, source in paths.items()
+            }
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    def minify(self, name):
+        """STATIC_ROOT にコピーされたファイルを縮小し、縮小したら True を返す"""
+        if name.endswith(('.min.css', '.min.js')):
+            return False
+        patterns = getattr(settings, 'TUTORIAL_STATIC_MINIFY_FILES', [])
+        if not any(fnmatchcase(name, pattern) for pattern in patterns):
+            return False
+        minifier = next((func for suffix, func in MINIFIERS.items() if name.endswith(suffix)), None)
+        if minifier is None or not self.exists(name):
+            return False
+        path = self.path(name)
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(minifier(source))
+        return True
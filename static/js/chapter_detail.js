@@ -0,0 +1,1130 @@
+// chapter_detail.js - チャプター詳細ページ（学習時間・学習ガイド・問題の回答）
+// ページごとの値は chapter_detail.html の CHAPTER_CONFIG から読む
+// グローバル変数
+let studySessionId = null;
+let studyStartTime = Date.now();
+let studyTimer = null;
+let currentStudySeconds;
+let autoSaveInterval = null;
+let isPageUnloading = false;
+
+
+const chapterIdForStorage = String(CHAPTER_CONFIG.chapterId);
+const storageKey = `study_seconds_ch_${chapterIdForStorage}`;
+
+// ★ 学習ガイドを「最後まで読んだかどうか」のフラグ
+let hasReadStudyGuide = false;
+
+// ページ読み込み時の初期化
+document.addEventListener('DOMContentLoaded', function() {
+    console.log('チャプター詳細ページを読み込みました');
+
+    // 学習時間記録を開始
+    startStudyTime();
+    
+    // 学習時間表示を初期化
+    initializeStudyTimeDisplay();
+    
+    // Enterキーで回答を送信
+    setupEnterKeySubmit();
+
+    // 途中保存された回答を画面に反映
+    initializeSavedAnswers();
+    
+    // ページ可視性変化の監視を登録
+    document.addEventListener('visibilitychange', handleVisibilityChange);
+    
+    // 学習ガイド読了判定の初期化
+    initStudyGuideReadTracking();
+    
+    // 完了セクションを表示（もし完了済みの場合）
+    if (CHAPTER_CONFIG.completed) {
+        setTimeout(() => {
+            document.getElementById('completionSection').style.display = 'block';
+        }, 1000);
+    }
+
+    const stats = getQuestionStats();
+    if (stats.accuracy === 100) {
+        const nextBtnArea = document.getElementById('next-chapter-section');
+        if (nextBtnArea) nextBtnArea.style.display = 'block';
+    }
+});
+
+// ★ チャプターを中断して退出
+function exitChapter() {
+    // 学習時間を終了してからホームへ戻る
+    endStudyTime().finally(() => {
+        window.location.href = CHAPTER_CONFIG.homeUrl;
+    });
+}
+
+// ★ 学習ガイドスクロール状況の監視
+function initStudyGuideReadTracking() {
+    const guideSection = document.getElementById('studyGuideSection');
+    if (!guideSection) return;
+
+    // 中身が少なくてスクロールしない場合は、最初から「読了扱い」
+    if (guideSection.scrollHeight <= guideSection.clientHeight + 10) {
+        hasReadStudyGuide = true;
+        return;
+    }
+
+    const onScroll = () => {
+        const threshold = 20; // 少し余裕をもたせる
+        if (guideSection.scrollTop + guideSection.clientHeight >= guideSection.scrollHeight - threshold) {
+            hasReadStudyGuide = true;
+            // 一度 true になったら監視を外してもOK
+            guideSection.removeEventListener('scroll', onScroll);
+            console.log('学習ガイドを最後までスクロールしました');
+        }
+    };
+
+    guideSection.addEventListener('scroll', onScroll);
+}
+
+// ★ 学習ガイドから練習問題ビューへ切り替える
+function goToQuestions() {
+    // 学習ガイドセクションを非表示
+    const guideSection = document.getElementById('studyGuideSection');
+    if (guideSection) {
+        guideSection.classList.add('hidden');
+    }
+
+    // 練習問題セクションを表示
+    const questionsSection = document.getElementById('questionsSection');
+    if (questionsSection) {
+        questionsSection.classList.remove('hidden');
+    }
+
+    // ページ上部へスクロール
+    window.scrollTo({
+        top: 0,
+        behavior: 'smooth'
+    });
+}
+
+// ページ可視性変化の処理
+function handleVisibilityChange() {
+    if (document.hidden) {
+        if (studyTimer) {
+            clearInterval(studyTimer);
+            studyTimer = null;
+            console.log('ページ非表示：タイマー停止（セッションは維持）');
+            // 最後の自動保存から非表示になるまでの区間を記録する（セッションは閉じない）。
+            // この時点で document.hidden は true なので、操作時刻だけで判定する
+            sendStudyHeartbeat(isRecentlyActive());
+        }
+    } else {
+        if (!studyTimer) {
+            console.log('ページ表示：タイマー再開');
+            // 非表示だった区間は学習時間に加算しない
+            sendStudyHeartbeat(false);
+            startStudyTimeDisplay();
+        }
+    }
+}
+
+// 自動保存学習時間
+// ★ 操作の有無（ハートビートの active フラグ）
+// 一定時間操作が無い間はアイドルとして送り、サーバー側で学習時間に加算しない
+const ACTIVITY_IDLE_MS = 3 * 60 * 1000;
+let lastActivityAt = Date.now();
+['mousemove', 'mousedown', 'keydown', 'scroll', 'touchstart', 'wheel'].forEach(eventName => {
+    window.addEventListener(eventName, () => { lastActivityAt = Date.now(); }, { passive: true });
+});
+
+function isRecentlyActive() {
+    return (Date.now() - lastActivityAt) < ACTIVITY_IDLE_MS;
+}
+
+function isUserActive() {
+    return !document.hidden && isRecentlyActive();
+}
+
+// ハートビートを送る（学習時間はサーバーがハートビートの間隔から積算する）
+function sendStudyHeartbeat(active) {
+    if (!studySessionId || isPageUnloading) return;
+    const chapterId = CHAPTER_CONFIG.chapterId;
+
+    console.log('自動保存学習時間:', { sessionId: studySessionId, active: active });
+
+    fetch(`/chapter/${chapterId}/update-study-time/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken'),
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            study_session_id: studySessionId,
+            active: active,
+            is_auto_save: true
+        }),
+        keepalive: true
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('自動保存失敗');
+        }
+        console.log('自動保存成功');
+    })
+    .catch(error => {
+        console.error('自動保存エラー:', error);
+    });
+}
+
+function autoSaveStudyTime() {
+    if (currentStudySeconds > 0 && !document.hidden) {
+        sendStudyHeartbeat(isUserActive());
+    }
+}
+
+// 定期的な自動保存を開始
+function startAutoSave() {
+    if (autoSaveInterval) {
+        clearInterval(autoSaveInterval);
+    }
+    
+    autoSaveInterval = setInterval(() => {
+        if (studySessionId && currentStudySeconds > 0 && !isPageUnloading && !document.hidden) {
+            autoSaveStudyTime();
+        }
+    }, 30000); // 30秒
+}
+
+// 学習時間記録を開始
+function startStudyTime() {
+    if (studySessionId) {
+        endStudyTime().then(() => {
+            createNewStudySession();
+        });
+    } else {
+        createNewStudySession();
+    }
+}
+
+// 新しい学習セッションを作成
+function createNewStudySession() {
+// 1. 从本地存储读取
+    let savedSeconds = localStorage.getItem(storageKey);
+    console.log('尝试恢复本地时间，原始数据:', savedSeconds);
+
+    // 2. 防御性检测：如果读取到的是 null, undefined, "NaN" 字符串或无法转换的乱码
+    if (savedSeconds === null || savedSeconds === "undefined" || isNaN(parseInt(savedSeconds))) {
+        currentStudySeconds = 0;
+        console.log('检测到无效时间，已重置为 0');
+    } else {
+        currentStudySeconds = parseInt(savedSeconds, 10);
+        console.log('成功恢复本地时间:', currentStudySeconds);
+    }
+
+    // 3. 立即更新 UI
+    updateStudyTimeDisplay();
+
+    const currentSessionId = CHAPTER_CONFIG.sessionId;
+    
+    if (currentSessionId) {
+        studySessionId = currentSessionId;
+        startStudyTimeDisplay();
+        startAutoSave();
+        return;
+    }
+    
+    const chapterId = CHAPTER_CONFIG.chapterId;
+    fetch(`/chapter/${chapterId}/start-study/`, {
+        method: 'POST',
+        headers: { 'X-CSRFToken': getCookie('csrftoken'), 'Content-Type': 'application/json' }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            studySessionId = data.study_session_id;
+            // 只有当本地完全没数据时，才采用后端返回的 initial_seconds
+            if (!localStorage.getItem(storageKey) && data.initial_seconds) {
+                currentStudySeconds = data.initial_seconds;
+            }
+            startStudyTimeDisplay();
+            startAutoSave();
+        }
+    });
+}
+
+// 学習時間表示を初期化
+function initializeStudyTimeDisplay() {
+    const studyTimeDisplay = document.getElementById('studyTimeDisplay');
+    if (studyTimeDisplay) {
+        studyTimeDisplay.style.display = 'block';
+    }
+}
+
+// 学習時間表示を開始
+function startStudyTimeDisplay() {
+    if (!studyTimer) {
+        studyTimer = setInterval(() => {
+            currentStudySeconds++;
+            updateStudyTimeDisplay();
+        }, 1000);
+        console.log('学習時間タイマー開始');
+    }
+}
+
+// 学習時間表示を更新
+function updateStudyTimeDisplay() {
+    // 关键：将当前秒数实时存入本地
+    localStorage.setItem(storageKey, currentStudySeconds);
+
+    const minutes = Math.floor(currentStudySeconds / 60);
+    const seconds = currentStudySeconds % 60;
+    const timeString = `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`;
+    
+    const studyTimeValue = document.getElementById('studyTimeValue');
+    const currentStudyTime = document.getElementById('currentStudyTime');
+    
+    if (studyTimeValue) studyTimeValue.textContent = timeString;
+    if (currentStudyTime) currentStudyTime.textContent = `学習時間: ${timeString}`;
+}
+
+// 学習時間記録を終了
+function endStudyTime() {
+    if (!studySessionId) {
+        console.log('アクティブな学習セッションはありません');
+        return Promise.resolve();
+    }
+    
+    const chapterId = CHAPTER_CONFIG.chapterId;
+
+    console.log('学習時間記録を終了:', {
+        sessionId: studySessionId,
+        chapterId: chapterId
+    });
+    
+    return fetch(`/chapter/${chapterId}/end-study/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken'),
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            study_session_id: studySessionId,
+            active: isUserActive()
+        }),
+        keepalive: true
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('学習時間終了リクエスト失敗');
+        }
+        return response.json();
+    })
+    .then(data => {
+        console.log('学習時間終了成功:', data);
+        
+        if (studyTimer) {
+            clearInterval(studyTimer);
+            studyTimer = null;
+        }
+        if (autoSaveInterval) {
+            clearInterval(autoSaveInterval);
+            autoSaveInterval = null;
+        }
+        studySessionId = null;
+        currentStudySeconds = 0;
+        
+        return data;
+    })
+    .catch(error => {
+        console.error('学習時間終了エラー:', error);
+        if (studyTimer) {
+            clearInterval(studyTimer);
+            studyTimer = null;
+        }
+        if (autoSaveInterval) {
+            clearInterval(autoSaveInterval);
+            autoSaveInterval = null;
+        }
+        studySessionId = null;
+        currentStudySeconds = 0;
+    });
+}
+
+// ページ離脱時の処理（sendBeacon で 1 回だけ終了通知を送り、離脱を待たせない）
+let studyEndBeaconSent = false;
+window.addEventListener('pagehide', function() {
+    if (studyEndBeaconSent || !studySessionId || currentStudySeconds <= 0) return;
+    studyEndBeaconSent = true;
+    isPageUnloading = true;
+
+    const chapterId = CHAPTER_CONFIG.chapterId;
+    const payload = new URLSearchParams({
+        study_session_id: studySessionId,
+        // pagehide の時点では document.hidden になっていることがあるため操作時刻だけで判定
+        active: isRecentlyActive(),
+        idempotency_key: `${studySessionId}:end`
+    });
+    const url = `/chapter/${chapterId}/end-study/beacon/`;
+
+    if (!(navigator.sendBeacon && navigator.sendBeacon(url, payload))) {
+        fetch(url, { method: 'POST', body: payload, keepalive: true, credentials: 'same-origin' });
+    }
+});
+
+// タイマーをクリーンアップ
+window.addEventListener('unload', function() {
+    if (autoSaveInterval) {
+        clearInterval(autoSaveInterval);
+    }
+    if (studyTimer) {
+        clearInterval(studyTimer);
+    }
+});
+
+// 選択問題の選択処理
+function selectChoice(choiceElement, choiceId) {
+    const questionItem = choiceElement.closest('.question-item');
+    const allChoices = questionItem.querySelectorAll('.choice-item');
+    allChoices.forEach(choice => {
+        choice.classList.remove('selected');
+    });
+    
+    choiceElement.classList.add('selected');
+    choiceElement.dataset.selectedChoice = choiceId;
+}
+
+// 回答を送信
+function submitAnswer(questionId) {
+    const questionElement = document.getElementById(`question-${questionId}`);
+    const feedbackElement = document.getElementById(`feedback-${questionId}`);
+    const explanationElement = document.getElementById(`explanation-${questionId}`);
+
+    feedbackElement.innerHTML = '';
+    
+    const questionType = questionElement.dataset.questionType;
+    
+    let userAnswer = '';
+    
+    if (questionType === 'choice') {
+        const selectedChoice = questionElement.querySelector('.choice-item.selected');
+        if (!selectedChoice) {
+            showLocalMessage(feedbackElement, '回答を選択してください', 'error');
+            return;
+        }
+        userAnswer = selectedChoice.dataset.choiceId;
+    } else if (questionType === 'fill') {
+        userAnswer = document.getElementById(`answer-${questionId}`).value.trim();
+        if (!userAnswer) {
+            showLocalMessage(feedbackElement, '回答を入力してください', 'error');
+            return;
+        }
+    } else if (questionType === 'multi_fill') {
+        const blankInputs = questionElement.querySelectorAll('input[class*="blank-input"]');
+        const answers = [];
+        blankInputs.forEach(input => {
+            answers.push(input.value.trim());
+        });
+        userAnswer = answers.join(',');
+        
+        const allFilled = Array.from(blankInputs).every(input => input.value.trim() !== '');
+        if (!allFilled) {
+            showLocalMessage(feedbackElement, 'すべての空欄に入力してください', 'error');
+            return;
+        }
+    }
+    
+    showLocalMessage(feedbackElement, '回答を送信中...', 'info');
+    
+    fetch(`/question/${questionId}/submit/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken'),
+            'Content-Type': 'application/x-www-form-urlencoded',
+        },
+        body: `answer=${encodeURIComponent(userAnswer)}`
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+    })
+    .then(data => {
+        console.log('回答送信結果:', data);
+        
+        if (data.success) {
+            showAnswerResult(questionId, data, feedbackElement, explanationElement);
+        } else {
+            showLocalMessage(feedbackElement, data.message || '回答の送信に失敗しました', 'error');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showLocalMessage(feedbackElement, '回答の送信中にエラーが発生しました', 'error');
+    });
+}
+
+function recordChapterResult(correctCount, totalQuestions) {
+    const chapterId = CHAPTER_CONFIG.chapterId;
+
+    fetch(`/chapters/${chapterId}/record_result/`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'X-CSRFToken': getCookie('csrftoken'),
+        },
+        body: `correct=${encodeURIComponent(correctCount)}&total=${encodeURIComponent(totalQuestions)}`
+    })
+    .then(response => response.json())
+    .then(data => {
+        console.log('チャプター結果記録APIレスポンス:', data);
+        if (!data.success) {
+            console.warn('結果記録に失敗:', data.message);
+        }
+    })
+    .catch(error => {
+        console.error('結果記録の通信エラー:', error);
+    });
+}
+
+
+// 回答結果を表示
+function showAnswerResult(questionId, data, feedbackElement, explanationElement) {
+    console.log('显示回答结果:', data);
+    
+    feedbackElement.innerHTML = '';
+    
+    // 1. 处理正确/错误显示
+    if (data.is_correct) {
+        showLocalMessage(feedbackElement, '✅ 正解！', 'success');
+        highlightCorrectAnswer(questionId);
+    } else {
+        // --- ★ 重点修改区域：就在这个 else 里面 ★ ---
+        let errorMessage = '❌ 不正解。';
+        
+        // 获取后端传来的原始答案字符串
+        let rawAnswer = data.correct_answer || '';
+        
+        // 【核心修复】：防止浏览器把 <class 'float'> 当成 HTML 标签
+        // 我们把 < 换成 &lt; 把 > 换成 &gt;
+        let safeAnswer = rawAnswer.replace(/</g, '&lt;').replace(/>/g, '&gt;');
+        
+        if (safeAnswer) {
+            // 使用 <code> 标签包裹，让编程代码显示更清晰
+            errorMessage += `<br><strong>正解:</strong> <code>${safeAnswer}</code>`;
+        }
+        
+        if (data.message) {
+            errorMessage += `<br>${data.message}`;
+        }
+        showLocalMessage(feedbackElement, errorMessage, 'error');
+        highlightCorrectAnswer(questionId);
+        // --- ★ 修改结束 ★ ---
+    }
+
+    // 2. 更新题目数据集（用于计算进度）
+    const qEl = document.getElementById(`question-${questionId}`);
+    if (qEl) {
+        qEl.dataset.userCorrect = data.is_correct ? "1" : "0";
+    }
+
+    // 3. 实时更新页面上的分数数字（解决“必须点完了才能看分数”的违和感）
+    const stats = getQuestionStats(); 
+    const scoreSpan = document.getElementById('current-score-display');
+    if (scoreSpan) {
+        scoreSpan.textContent = stats.accuracy; 
+    }
+    
+    // 4. 全问正确时的逻辑处理（自动停止计时）
+    if (data.is_correct) {
+        if (stats.accuracy === 100) {
+            console.log('達成全問正解！案内ボタンを表示します...');
+            
+            if (studyTimer) {
+                clearInterval(studyTimer);
+                studyTimer = null;
+            }
+            if (autoSaveInterval) {
+                clearInterval(autoSaveInterval);
+                autoSaveInterval = null;
+            }
+
+            autoSaveStudyTime();
+            
+            if (typeof storageKey !== 'undefined') {
+                localStorage.removeItem(storageKey);
+            }
+
+            showMessage('恭喜！全問正解。学習記録を保存しました。', 'success');
+        }
+    }
+    
+    // 显示解析
+    if (data.explanation) {
+        showExplanation(explanationElement, data.explanation);
+    }
+    
+    // 如果回答正确，禁用按钮防止重复提交
+    if (data.is_correct) {
+        disableQuestionActions(questionId);
+    }
+}
+
+// 正解をハイライト表示（必要なら今后再具体实现）
+function highlightCorrectAnswer(questionId) {
+    // TODO: バックエンドから正解情報を受け取ってハイライトする実装
+}
+
+// 解説を表示
+function showExplanation(explanationElement, explanation) {
+    const explanationContent = explanationElement.querySelector('.explanation-content');
+    if (explanationContent) {
+        explanationContent.innerHTML = explanation;
+        explanationElement.style.display = 'block';
+        
+        setTimeout(() => {
+            explanationElement.scrollIntoView({ 
+                behavior: 'smooth', 
+                block: 'nearest' 
+            });
+        }, 500);
+    }
+}
+
+// ローカルフィードバックエリアにメッセージを表示
+function showLocalMessage(element, message, type) {
+    element.innerHTML = '';
+    
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `alert alert-${type}`;
+    messageDiv.innerHTML = message;
+    
+    element.appendChild(messageDiv);
+}
+
+// 問題のアクションボタンを無効化
+function disableQuestionActions(questionId) {
+    const questionElement = document.getElementById(`question-${questionId}`);
+    const submitButton = questionElement.querySelector('.btn-primary');
+    const hintButton = questionElement.querySelector('.hint-button');
+    
+    if (submitButton) {
+        submitButton.disabled = true;
+        submitButton.textContent = '回答済み';
+        submitButton.style.opacity = '0.6';
+    }
+    
+    if (hintButton) {
+        hintButton.disabled = true;
+        hintButton.style.opacity = '0.6';
+    }
+}
+
+// ヒントを表示
+function showHint(questionId) {
+    console.log('ヒント取得開始:', questionId);
+    
+    const feedbackElement = document.getElementById(`feedback-${questionId}`);
+    showLocalMessage(feedbackElement, 'ヒントを取得中...', 'info');
+    
+    fetch(`/question/${questionId}/hint/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken'),
+            'Content-Type': 'application/json',
+        }
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+    })
+    .then(data => {
+        console.log('ヒント取得結果:', data);
+        
+        if (data.success) {
+            feedbackElement.innerHTML = '';
+            showHintModal(data.hint, questionId);
+        } else {
+            showLocalMessage(feedbackElement, data.message || 'ヒントの取得に失敗しました', 'error');
+        }
+    })
+    .catch(error => {
+        console.error('ヒント取得エラー:', error);
+        showLocalMessage(feedbackElement, 'ヒントの取得中にエラーが発生しました', 'error');
+    });
+}
+
+// ヒント表示用モーダル
+function showHintModal(hintText, questionId) {
+    const existingModal = document.getElementById('hintModal');
+    if (existingModal) {
+        existingModal.remove();
+    }
+    
+    const modal = document.createElement('div');
+    modal.id = 'hintModal';
+    modal.style.cssText = `
+        position: fixed;
+        top: 0;
+        left: 0;
+        width: 100%;
+        height: 100%;
+        background: rgba(0,0,0,0.5);
+        display: flex;
+        justify-content: center;
+        align-items: center;
+        z-index: 2000;
+    `;
+    
+    modal.innerHTML = `
+        <div style="
+            background: white;
+            padding: 2rem;
+            border-radius: 12px;
+            max-width: 500px;
+            width: 90%;
+            max-height: 80vh;
+            overflow-y: auto;
+            box-shadow: 0 10px 30px rgba(0,0,0,0.3);
+            position: relative;
+        ">
+            <div style="
+                display: flex;
+                justify-content: space-between;
+                align-items: center;
+                margin-bottom: 1.5rem;
+                padding-bottom: 1rem;
+                border-bottom: 2px solid #f0f0f0;
+            ">
+                <h3 style="
+                    margin: 0;
+                    color: #2c3e50;
+                    display: flex;
+                    align-items: center;
+                    gap: 0.5rem;
+                ">
+                    💡 ヒント
+                </h3>
+                <button onclick="closeHintModal()" style="
+                    background: none;
+                    border: none;
+                    font-size: 1.5rem;
+                    cursor: pointer;
+                    color: #7f8c8d;
+                    padding: 0.5rem;
+                    border-radius: 50%;
+                    width: 40px;
+                    height: 40px;
+                    display: flex;
+                    align-items: center;
+                    justify-content: center;
+                ">&times;</button>
+            </div>
+            <div style="
+                line-height: 1.6;
+                color: #2c3e50;
+                font-size: 1.1rem;
+            ">
+                ${hintText.replace(/\n/g, '<br>')}
+            </div>
+            <div style="
+                margin-top: 2rem;
+                display: flex;
+                justify-content: flex-end;
+                gap: 1rem;
+            ">
+                <button onclick="closeHintModal()" style="
+                    padding: 0.8rem 1.5rem;
+                    background: #95a5a6;
+                    color: white;
+                    border: none;
+                    border-radius: 8px;
+                    cursor: pointer;
+                    font-weight: 600;
+                ">
+                    閉じる
+                </button>
+            </div>
+        </div>
+    `;
+    
+    document.body.appendChild(modal);
+    
+    modal.addEventListener('click', function(e) {
+        if (e.target === modal) {
+            closeHintModal();
+        }
+    });
+}
+
+// ヒントモーダルを閉じる
+function closeHintModal() {
+    const modal = document.getElementById('hintModal');
+    if (modal) {
+        modal.remove();
+    }
+}
+
+// ★ 学習ガイドを読了としてマーク
+function markGuideStudied() {
+    const chapterId = CHAPTER_CONFIG.chapterId;
+
+    // まだ最後まで読んでいない場合はブロック
+    if (!hasReadStudyGuide) {
+        showMessage('学習ガイドを最後まで読んでからこのボタンを押してください。', 'error');
+        const guideSection = document.getElementById('studyGuideSection');
+        if (guideSection) {
+            guideSection.scrollIntoView({ behavior: 'smooth' });
+        }
+        return;
+    }
+    
+    fetch(`/chapter/${chapterId}/mark_guide_studied/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken')
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showMessage('学習ガイドを読了としてマークしました', 'success');
+            setTimeout(() => {
+                location.reload();
+            }, 1500);
+        } else {
+            showMessage('操作に失敗しました', 'error');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showMessage('操作中にエラーが発生しました', 'error');
+    });
+}
+
+function calculateCurrentScore() {
+    const questions = document.querySelectorAll('.question-item');
+    if (questions.length === 0) return 100;
+
+    let correct = 0;
+    questions.forEach(q => {
+        if (q.dataset.isCorrect === "1") correct++;
+    });
+
+    return Math.round((correct / questions.length) * 100);
+}
+
+function getQuestionStats() {
+    const items = Array.from(document.querySelectorAll('.question-item'));
+    const total = items.length;
+
+    // 問題がない章は100%扱い
+    if (total === 0) return { total: 0, correct: 0, accuracy: 100 };
+
+    let correct = 0;
+    items.forEach(el => {
+        // data-user-correct="1" のときだけ正解扱い
+        if (el.dataset.userCorrect === "1") correct++;
+    });
+
+    const accuracy = Math.round((correct / total) * 100);
+    return { total, correct, accuracy };
+}
+
+function completeChapter() {
+    const chapterId = CHAPTER_CONFIG.chapterId;
+    const stats = getQuestionStats();
+
+    console.log("[completeChapter] stats:", stats); // ← 動作確認用
+
+    // 100%でなければ完了させない
+    if (stats.accuracy < 100) {
+        showMessage('すべての練習問題に正解してからチャプターを完了してください。', 'error');
+
+        const questionsSection = document.getElementById('questionsSection');
+        if (questionsSection) {
+            questionsSection.classList.remove('hidden');
+            questionsSection.scrollIntoView({ behavior: 'smooth' });
+        }
+        return;
+    }
+
+    // ① まず「今回の結果」を記録（correct/total）
+    fetch(`/chapters/${chapterId}/record_result/`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'X-CSRFToken': getCookie('csrftoken'),
+        },
+        body: `correct=${encodeURIComponent(stats.correct)}&total=${encodeURIComponent(stats.total)}`
+    })
+    .then(r => r.json())
+    .then(data => {
+        console.log("record_result:", data);
+        // 記録が失敗しても完了自体は進めたいので、ここでは止めない
+    })
+    .catch(err => {
+        console.warn("record_result error:", err);
+    })
+    .finally(() => {
+        // ② そのあとチャプター完了API
+        fetch(`/chapter/${chapterId}/complete/`, {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': getCookie('csrftoken')
+            }
+        })
+        .then(r => r.json())
+        .then(data => {
+            console.log("complete:", data);
+            if (data.success) {
+                // 如果后端返回了 level_up 为 true
+                if (data.level_up) {
+                    // 弹出华丽的升级弹窗，并将原本的跳转逻辑放进弹窗的关闭回调中
+                    showLevelUpNotification(data.new_level, () => {
+                        window.location.href = CHAPTER_CONFIG.homeUrl;
+                    });
+                } else {
+                    // 没有升级，执行你原来的逻辑：显示提示并自动跳转
+                    if (typeof showCustomMessage === 'function') {
+                        showCustomMessage(data.message || 'チャプターを完了しました！', 'success');
+                    } else {
+                        alert(data.message || 'チャプターを完了しました！');
+                    }
+                    setTimeout(() => window.location.href = CHAPTER_CONFIG.homeUrl, 1200);
+                }
+            } else {
+                const msg = data.message || '完了に失敗しました。';
+                typeof showCustomMessage === 'function' ? showCustomMessage(msg, 'error') : alert(msg);
+            }
+        })
+    });
+}
+
+function confirmAndResetProgress(chapterId) {
+    // 増加人性化的确认提示
+    const confirmMsg = "このチャプターの進捗をリセットしますか？\n\n注意：学習記録は清空されますが、【累計学習時間】は保持されますのでご安心ください。";
+    
+    if (confirm(confirmMsg)) {
+        fetch(`/chapter/${chapterId}/reset/`, {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': getCookie('csrftoken'),
+                'Content-Type': 'application/json'
+            }
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                // 重置成功后刷新页面
+                window.location.reload();
+            } else {
+                alert(data.message);
+            }
+        })
+        .catch(err => {
+            console.error('Error:', err);
+            alert('操作失败，请检查网络连接');
+        });
+    }
+}
+
+function showLevelUpNotification(level, onClose) {
+    const overlay = document.createElement('div');
+    overlay.style = `
+        position: fixed; top: 0; left: 0; width: 100%; height: 100%;
+        background: rgba(0,0,0,0.85); z-index: 99999;
+        display: flex; justify-content: center; align-items: center;
+        backdrop-filter: blur(10px);
+    `;
+
+    overlay.innerHTML = `
+        <div style="background: white; padding: 3rem; border-radius: 30px; text-align: center; 
+                    box-shadow: 0 0 50px rgba(255,215,0,0.6); border: 5px solid #FFD700;
+                    max-width: 400px; width: 90%; animation: popIn 0.5s cubic-bezier(0.17, 0.89, 0.32, 1.49);">
+            <div style="font-size: 5rem; margin-bottom: 1rem;">🎊</div>
+            <h1 style="color: #2c3e50; margin: 0; font-size: 2rem;">LEVEL UP!</h1>
+            <p style="color: #7f8c8d; font-size: 1.1rem; margin-top: 10px;">おめでとうございます！</p>
+            <div style="background: linear-gradient(135deg, #FFD700, #FFA500); 
+                        color: white; font-size: 3rem; font-weight: bold; 
+                        padding: 1rem; border-radius: 20px; margin: 1.5rem 0;">
+                Lv. ${level}
+            </div>
+            <button id="level-up-close-btn" style="
+                background: #764ba2; color: white; border: none; padding: 12px 40px; 
+                border-radius: 50px; font-size: 1.2rem; cursor: pointer; 
+                box-shadow: 0 4px 15px rgba(118,75,162,0.4); transition: transform 0.2s;">
+                ホームに戻る
+            </button>
+        </div>
+        <style>
+            @keyframes popIn {
+                from { opacity: 0; transform: scale(0.5); }
+                to { opacity: 1; transform: scale(1); }
+            }
+        </style>
+    `;
+
+    document.body.appendChild(overlay);
+
+    // 点击按钮后执行回调（跳转首页）
+    document.getElementById('level-up-close-btn').onclick = () => {
+        overlay.remove();
+        if (onClose) onClose();
+    };
+}
+
+// 進捗をリセット
+function resetProgress() {
+    const chapterId = CHAPTER_CONFIG.chapterId;
+    
+    if (!confirm('このチャプターの進捗をリセットしますか？すべての回答記録と学習状況が失われます。')) {
+        return;
+    }
+    
+    fetch(`/chapter/${chapterId}/reset/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken')
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showMessage('進捗をリセットしました', 'success');
+            setTimeout(() => {
+                location.reload();
+            }, 1500);
+        } else {
+            showMessage('リセットに失敗しました', 'error');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showMessage('リセット中にエラーが発生しました', 'error');
+    });
+}
+
+// Enterキーで回答を送信する設定
+function setupEnterKeySubmit() {
+    document.addEventListener('keydown', function(event) {
+        if (event.key === 'Enter') {
+            const activeElement = document.activeElement;
+            if (activeElement && activeElement.classList.contains('blank-input')) {
+                const questionItem = activeElement.closest('.question-item');
+                const questionId = questionItem.id.replace('question-', '');
+                submitAnswer(questionId);
+            }
+        }
+    });
+}
+
+// 保存済み回答の初期表示（途中退出からの再開用）
+function initializeSavedAnswers() {
+    // 問題のマークアップはキャッシュされた共通部分なので、ユーザーの回答状態は JSON から反映する
+    const statesEl = document.getElementById('question-states');
+    const questionStates = statesEl ? JSON.parse(statesEl.textContent) : {};
+    const questionItems = document.querySelectorAll('.question-item');
+    questionItems.forEach(item => {
+        const questionId = item.id.replace('question-', '');
+        const questionType = item.dataset.questionType;
+        const state = questionStates[questionId] || {};
+        const savedAnswer = state.answer || '';
+        const isCorrect = state.correct === true;
+        item.dataset.userCorrect = isCorrect ? '1' : '0';
+
+        if (!savedAnswer) {
+            return;  // 没有保存的答案就什么都不做
+        }
+
+        if (questionType === 'choice') {
+            // 选择题：把之前选中的 choice 高亮
+            const choices = item.querySelectorAll('.choice-item');
+            choices.forEach(choiceEl => {
+                if (choiceEl.dataset.choiceId === savedAnswer) {
+                    choiceEl.classList.add('selected');
+                }
+            });
+        } else if (questionType === 'fill') {
+            // 单空填空：把文本填回 input
+            const input = item.querySelector(`#answer-${questionId}`);
+            if (input) {
+                input.value = savedAnswer;
+            }
+        } else if (questionType === 'multi_fill') {
+            // 多空填空：按逗号分割，依次填回多个 input
+            const parts = savedAnswer.split(',');
+            const inputs = item.querySelectorAll('.multi-blank');
+            inputs.forEach((input, index) => {
+                if (parts[index]) {
+                    input.value = parts[index];
+                }
+            });
+        }
+
+        // 已经正解过的题，给一点视觉高亮（可选）
+        if (isCorrect) {
+            item.classList.add('answered-correct');
+        }
+    });
+}
+
+
+// メッセージ表示関数（右上浮動メッセージ）
+function showMessage(message, type) {
+    const existingMessages = document.querySelectorAll('.custom-message');
+    existingMessages.forEach(msg => msg.remove());
+    
+    const messageEl = document.createElement('div');
+    messageEl.textContent = message;
+    messageEl.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        padding: 12px 20px;
+        border-radius: 8px;
+        color: white;
+        font-weight: 500;
+        z-index: 1000;
+        transition: all 0.3s ease;
+        box-shadow: 0 4px 12px rgba(0,0,0,0.15);
+        max-width: 300px;
+        word-wrap: break-word;
+    `;
+    
+    if (type === 'success') {
+        messageEl.style.background = 'linear-gradient(135deg, #27ae60, #2ecc71)';
+    } else if (type === 'error') {
+        messageEl.style.background = 'linear-gradient(135deg, #e74c3c, #c0392b)';
+    } else if (type === 'info') {
+        messageEl.style.background = 'linear-gradient(135deg, #3498db, #2980b9)';
+    }
+    
+    messageEl.classList.add('custom-message');
+    document.body.appendChild(messageEl);
+    
+    setTimeout(() => {
+        messageEl.style.opacity = '0';
+        messageEl.style.transform = 'translateX(100px)';
+        setTimeout(() => {
+            if (messageEl.parentNode) {
+                messageEl.parentNode.removeChild(messageEl);
+            }
+        }, 300);
+    }, 3000);
+}
+
+// CSRFトークン取得関数
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
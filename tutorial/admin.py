@@ -1,12 +1,31 @@
 # admin.py - 修复版
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+from django.shortcuts import redirect, render
+from django.urls import path
 from django.utils.translation import gettext_lazy as _
 from django.utils.html import format_html
+from django.utils import timezone
 from .models import (
     Chapter, StudyGuide, StudyGuideAttachment, Question, Choice, UserProgress, 
     ChapterStudyTime, UserProfile, WrongAnswer, BuildingBlock, 
-    ArchitectureSlot, UserArchitecture, UserBadge, Badge
+    ArchitectureSlot, UserArchitecture, UserBadge, Badge, Job
 )
+from . import search
+from .forms import QuestionImportForm
+from .question_import import PARSERS, QuestionImportError, build_plan, detect_format, parse
+
+class SearchIndexAdminMixin:
+    """search_fields の LIKE '%...%' の代わりに全文検索インデックス（tutorial.search）で絞り込む"""
+    search_index_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        subquery = search.matching_ids_sql(self.search_index_kind, search_term) if search.is_available() else None
+        if subquery is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=RawSQL(*subquery)), False
 
 class ChoiceInline(admin.TabularInline):
     model = Choice
@@ -27,6 +46,9 @@ class ChapterStudyTimeAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'chapter__title']
     readonly_fields = ['total_seconds']
     date_hierarchy = 'start_time'
+    list_select_related = ['user', 'chapter']
+    # 行数の多いテーブルなので、絞り込み時に全件の COUNT(*) を取らない
+    show_full_result_count = False
     
     def get_duration_display(self, obj):
         return obj.get_duration_display()
@@ -40,19 +62,28 @@ class ChapterAdmin(admin.ModelAdmin):
     search_fields = ['title', 'description']
     ordering = ['order']
 
+    def get_queryset(self, request):
+        # 行ごとに COUNT を発行しないよう、有効な問題数をまとめて集計する
+        return super().get_queryset(request).annotate(
+            active_question_count=Count('question', filter=Q(question__is_active=True))
+        )
+
+    @admin.display(description=_('問題数'), ordering='active_question_count')
     def get_question_count(self, obj):
-        return obj.get_question_count()
-    get_question_count.short_description = _('問題数')
+        return obj.active_question_count
 
 @admin.register(StudyGuide)
-class StudyGuideAdmin(admin.ModelAdmin):
+class StudyGuideAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
+    search_index_kind = search.GUIDE
     list_display = ['chapter', 'is_published', 'created_at', 'updated_at']
     list_editable = ['is_published']
     list_filter = ['is_published', 'created_at']
     search_fields = ['chapter__title', 'content']
+    list_select_related = ['chapter']
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
+    search_index_kind = search.QUESTION
     list_display = [
         'chapter', 'question_type', 'difficulty', 'question_text_short', 
         'order', 'is_active'
@@ -62,11 +93,65 @@ class QuestionAdmin(admin.ModelAdmin):
     search_fields = ['question_text', 'explanation', 'hint']
     ordering = ['chapter__order', 'order']
     inlines = [ChoiceInline]
+    list_select_related = ['chapter']
+    change_list_template = 'admin/tutorial/question/change_list.html'
     
     def question_text_short(self, obj):
         return obj.question_text[:50] + '...' if len(obj.question_text) > 50 else obj.question_text
     question_text_short.short_description = _('問題内容')
 
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='tutorial_question_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        """
+        CSV / Markdown の問題ファイルをインポートする
+        1 回目の送信で検証と差分の表示だけを行い、確認後にファイルの内容を再送信して書き込む
+        """
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': _('問題をインポート'),
+        }
+        form = QuestionImportForm()
+        if request.method == 'POST':
+            prune = bool(request.POST.get('prune'))
+            if 'content' in request.POST:
+                text, fmt = request.POST['content'], request.POST.get('format', '')
+            else:
+                form = QuestionImportForm(request.POST, request.FILES)
+                text = fmt = None
+                if form.is_valid():
+                    upload = form.cleaned_data['file']
+                    try:
+                        text = upload.read().decode('utf-8-sig')
+                        fmt = detect_format(upload.name)
+                    except UnicodeDecodeError:
+                        context['errors'] = [_('UTF-8 のファイルを指定してください')]
+                    except QuestionImportError as e:
+                        context['errors'] = e.errors
+
+            if text is not None and fmt in PARSERS:
+                try:
+                    plan = build_plan(parse(text, fmt), prune=prune)
+                except QuestionImportError as e:
+                    context['errors'] = e.errors
+                else:
+                    if request.POST.get('confirm') and plan.has_changes():
+                        plan.apply()
+                        self.message_user(request, _('インポートしました: %(summary)s') % {'summary': plan.summary()})
+                        return redirect('admin:tutorial_question_changelist')
+                    context.update(plan=plan, diff_lines=plan.diff_lines(), content=text, format=fmt, prune=prune)
+
+        context['form'] = form
+        return render(request, 'admin/tutorial/question/import.html', context)
+
 @admin.register(Choice)
 class ChoiceAdmin(admin.ModelAdmin):
     list_display = ['choice_text_short', 'question', 'is_correct', 'blank_index', 'order']
@@ -81,11 +166,13 @@ class ChoiceAdmin(admin.ModelAdmin):
 
 @admin.register(WrongAnswer)
 class WrongAnswerAdmin(admin.ModelAdmin):
-    list_display = ['user', 'get_chapter', 'get_question_preview', 'created_at']
-    list_filter = ['question__chapter', 'created_at']  # 修复：使用 question__chapter
+    list_display = ['user', 'get_chapter', 'get_question_preview', 'attempt_count', 'created_at', 'last_wrong_at']
+    list_filter = ['question__chapter', 'last_wrong_at']  # 修复：使用 question__chapter
     search_fields = ['user__username', 'question__question_text', 'wrong_answer', 'correct_answer']
-    readonly_fields = ['created_at']
-    date_hierarchy = 'created_at'
+    readonly_fields = ['attempt_count', 'recent_wrong_answers', 'created_at', 'last_wrong_at']
+    date_hierarchy = 'last_wrong_at'
+    list_select_related = ['user', 'question__chapter']
+    show_full_result_count = False
     
     def get_chapter(self, obj):
         return obj.question.chapter.title  # 通过 question 获取 chapter
@@ -113,13 +200,15 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_filter = ['level', 'updated_at']
     search_fields = ['user__username']
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['user']
     
     def get_exp_progress(self, obj):
         return f"{obj.get_exp_progress():.1f}%"
     get_exp_progress.short_description = _('次のレベルまで')
 
 @admin.register(BuildingBlock)
-class BuildingBlockAdmin(admin.ModelAdmin):
+class BuildingBlockAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
+    search_index_kind = search.BLOCK
     list_display = [
         'name', 'block_type', 'order', 'is_active', 'get_related_chapters_count'
     ]
@@ -145,9 +234,12 @@ class BuildingBlockAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(related_chapters_count=Count('chapters', distinct=True))
+
+    @admin.display(description=_('関連チャプター数'), ordering='related_chapters_count')
     def get_related_chapters_count(self, obj):
-        return obj.chapters.count()
-    get_related_chapters_count.short_description = _('関連チャプター数')
+        return obj.related_chapters_count
 
 @admin.register(ArchitectureSlot)
 class ArchitectureSlotAdmin(admin.ModelAdmin):
@@ -199,8 +291,11 @@ class BadgeAdmin(admin.ModelAdmin):
 
 @admin.register(StudyGuideAttachment)
 class StudyGuideAttachmentAdmin(admin.ModelAdmin):
-    list_display = ('study_guide', 'key', 'display_name', 'file')
-    list_filter = ('study_guide',)
+    list_display = ('study_guide', 'key', 'display_name', 'file', 'download_count')
+    # 学習ガイドの表示名はチャプター名なので、絞り込みもチャプターで行う（ガイドごとのクエリを避ける）
+    list_filter = ('study_guide__chapter',)
+    list_select_related = ('study_guide__chapter',)
+    readonly_fields = ('download_count',)
     search_fields = ('study_guide__chapter__title', 'key', 'display_name')
 
 @admin.register(UserBadge)
@@ -210,6 +305,22 @@ class UserBadgeAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'badge__name']
     readonly_fields = ['unlocked_at']
     date_hierarchy = 'unlocked_at'
+    list_select_related = ['user', 'badge']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'last_error']
+    readonly_fields = ['locked_by', 'locked_at', 'created_at', 'finished_at', 'last_error']
+    actions = ['retry_jobs']
+
+    @admin.action(description=_('選択したジョブを再実行'))
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status='running').update(
+            status='pending', attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        self.message_user(request, _('%(count)d 件のジョブを再実行待ちにしました') % {'count': updated})
 
 # 管理サイトの設定
 admin.site.site_header = _('学習管理システム')
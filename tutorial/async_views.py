@@ -0,0 +1,238 @@
+# async_views.py - 高頻度 JSON エンドポイントの非同期版
+"""
+update_study_time / submit_answer / get_question_hint / block_detail_api /
+get_block_categories の非同期実装（Django の非同期 ORM を使用）
+
+レスポンスの形式は views.py の同期版と同じ。ASGI（uvicorn ワーカー）で
+動かす場合に settings.TUTORIAL_ASYNC_VIEWS を有効にすると urls.py が
+こちらを使う。WSGI では同期版のままの方が速いので既定では無効。
+"""
+import json
+import logging
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.http import require_http_methods
+
+from .grading import grade_answer
+from .study_time import arecord_heartbeat, parse_active
+from .wrong_answers import arecord_wrong_answer
+from .models import (
+    Question, BuildingBlock, ChapterStudyTime,
+    UserProgress, UserQuestionAnswer
+)
+
+logger = logging.getLogger(__name__)
+
+
+@login_required
+@require_http_methods(["POST"])
+async def update_study_time(request, chapter_id):
+    """
+    更新学习时间（用于自动保存）
+    ハートビートとして扱い、前回からの区間がアクティブなら学習時間に加算する
+    """
+    try:
+        user = await request.auser()
+        data = json.loads(request.body)
+        study_session_id = data.get('study_session_id')
+        active = parse_active(data.get('active'))
+        is_auto_save = data.get('is_auto_save', False)
+
+        logger.info(f"更新学习时间: 用户={user}, 章节={chapter_id}, 活动={active}, 自动保存={is_auto_save}")
+
+        if study_session_id:
+            await arecord_heartbeat(study_session_id, user, chapter_id, active=active)
+            study_session = await aget_object_or_404(
+                ChapterStudyTime,
+                id=study_session_id,
+                user=user,
+                chapter_id=chapter_id
+            )
+
+            return JsonResponse({
+                'success': True,
+                'message': '学習時間を更新しました',
+                'study_time': study_session.get_duration_display()
+            })
+        else:
+            return JsonResponse({
+                'success': False,
+                'message': '学習セッションが見つかりません'
+            })
+
+    except Exception as e:
+        logger.error(f"学習時間更新失敗: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'学習時間の更新に失敗しました: {str(e)}'
+        })
+
+
+@login_required
+@require_http_methods(["POST"])
+async def submit_answer(request, question_id):
+    """
+    問題の回答を提出
+    """
+    try:
+        user = await request.auser()
+        question = await aget_object_or_404(Question, id=question_id)
+        user_answer = request.POST.get('answer', '')
+
+        choices = [choice async for choice in question.choice_set.all()]
+        result = grade_answer(question.question_type, user_answer, choices)
+        is_correct = result['is_correct']
+
+        if result['wrong_answer'] is not None:
+            # 誤答を記録（ユーザー・問題ごとの 1 行に回数と最近の誤答を集約）
+            await arecord_wrong_answer(user, question, result['wrong_answer'], result['wrong_correct_answer'])
+
+        try:
+            await UserQuestionAnswer.objects.aupdate_or_create(
+                user=user,
+                question=question,
+                defaults={
+                    "answer_text": user_answer,
+                    "is_correct": is_correct,
+                }
+            )
+        except Exception as e:
+            logger.error(f"ユーザー回答の保存に失敗しました: {e}")
+
+        return JsonResponse({
+            'success': True,
+            'is_correct': is_correct,
+            'explanation': question.explanation,
+            'correct_answer': result['correct_answer'],
+            'message': result['message']
+        })
+
+    except Exception as e:
+        logger.error(f"回答提出エラー: {e}")
+        return JsonResponse({'success': False, 'message': '回答の送信中にエラーが発生しました'})
+
+
+@login_required
+@require_http_methods(["POST"])
+async def get_question_hint(request, question_id):
+    """
+    問題のヒントを取得
+    """
+    try:
+        question = await aget_object_or_404(Question.objects.only('id', 'hint'), id=question_id)
+
+        if not question.hint:
+            return JsonResponse({
+                'success': False,
+                'message': 'この問題にはヒントがありません'
+            })
+
+        return JsonResponse({
+            'success': True,
+            'hint': question.hint
+        })
+
+    except Exception as e:
+        logger.error(f"ヒント取得エラー: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'ヒントの取得中にエラーが発生しました: {str(e)}'
+        })
+
+
+@login_required
+async def block_detail_api(request, block_id):
+    """
+    API: ブロック詳細を取得
+    """
+    try:
+        user = await request.auser()
+        block = await aget_object_or_404(BuildingBlock, id=block_id)
+
+        # ユーザーがこのブロックをアンロックしているかチェック
+        is_unlocked = await block.ais_unlocked_for_user(user)
+        logger.debug(
+            "ブロック詳細API",
+            extra={'user_id': user.id, 'block_id': block_id, 'unlocked': is_unlocked}
+        )
+
+        if not is_unlocked:
+            return JsonResponse({
+                'success': False,
+                'message': 'このブロックはまだアンロックされていません'
+            })
+
+        block_data = {
+            'id': block.id,
+            'name': block.name,
+            'description': block.description,
+            'block_type': block.block_type,
+            'block_type_display': block.get_block_type_display(),
+            'code_snippet': block.code_snippet or '# コードスニペットが定義されていません',
+            'expand_knowledge': block.expand_knowledge or '<p class="no-content">拡張知識はまだ設定されていません<</p>',
+            'usage_examples': block.usage_examples or '// 使用例はまだ設定されていません',
+            'possible_projects': '<p class="no-content">制作可能なプロジェクトはまだ設定されていません</p>'
+        }
+
+        return JsonResponse({
+            'success': True,
+            'block': block_data
+        })
+
+    except Exception as e:
+        logger.error(f"ブロック詳細取得エラー: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'ブロック詳細の取得中にエラーが発生しました: {str(e)}'
+        })
+
+
+@login_required
+async def get_block_categories(request):
+    """
+    API: ブロックカテゴリを取得
+    アンロック判定はブロックごとに問い合わせず、完了チャプターに属する
+    ブロック ID をまとめて取得して行う
+    """
+    try:
+        user = await request.auser()
+        completed_chapters = UserProgress.objects.filter(
+            user=user,
+            completed=True
+        ).values_list('chapter_id', flat=True)
+        unlocked_ids = {
+            block_id async for block_id in BuildingBlock.chapters.through.objects.filter(
+                chapter_id__in=completed_chapters
+            ).values_list('buildingblock_id', flat=True)
+        }
+
+        # タイプ別に分類
+        categories = {}
+        async for block in BuildingBlock.objects.filter(is_active=True):
+            block_type = block.block_type
+            if block_type not in categories:
+                categories[block_type] = {
+                    'name': block.get_block_type_display(),
+                    'blocks': []
+                }
+
+            categories[block_type]['blocks'].append({
+                'id': block.id,
+                'name': block.name,
+                'description': block.description,
+                'is_unlocked': block.manually_unlocked or block.id in unlocked_ids
+            })
+
+        return JsonResponse({
+            'success': True,
+            'categories': categories
+        })
+
+    except Exception as e:
+        logger.error(f"ブロックカテゴリ取得エラー: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'積木カテゴリの取得に失敗しました: {str(e)}'
+        })
@@ -0,0 +1,209 @@
+# backup.py - SQLite のオンラインバックアップとリストア
+"""
+SQLite のオンラインバックアップ API（sqlite3.Connection.backup）を使い、
+サイトを止めずにデータベースのスナップショットを取得する。
+
+- WAL モード（settings.DATABASES の init_command で有効化）では読み取りが
+  書き込みをブロックしないため、1 つの読み取りトランザクションで一貫した
+  時点のコピーを取る。ハートビートや回答送信は止まらない。
+- WAL 以外では pages ページずつコピーし、各ステップの間に sleep 秒待つ。
+  1 ステップで読み取りロックを保持するのは数ミリ秒程度に抑えられる。
+- 取得したスナップショットは integrity_check で検証してから gzip で圧縮し、
+  SHA-256 を横に保存する。古いものは keep 件を残して削除する。
+- リストアは展開・検証したファイルから同じバックアップ API で稼働中の
+  データベースへ書き戻すため、WAL ファイルとの不整合が起きない。
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.utils import timezone
+
+SNAPSHOT_PREFIX = 'db-'
+SNAPSHOT_SUFFIX = '.sqlite3.gz'
+
+
+class BackupError(Exception):
+    """バックアップまたはリストアに失敗した"""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _remove_db_file(path):
+    """データベースファイルと WAL の付随ファイルを削除"""
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def integrity_check(path):
+    """integrity_check を実行し、問題が無ければ None、あればメッセージを返す"""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    finally:
+        conn.close()
+    if rows == ['ok']:
+        return None
+    return '; '.join(rows[:10])
+
+
+def journal_mode(path):
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        return conn.execute('PRAGMA journal_mode').fetchone()[0].lower()
+    finally:
+        conn.close()
+
+
+def online_copy(source_path, dest_path, pages=256, sleep=0.05, max_restarts=20, progress=None):
+    """
+    稼働中のデータベースを dest_path へコピー
+    WAL モードでは 1 回の読み取りトランザクションでコピーする（書き込みは
+    ブロックされず、途中の書き込みでコピーがやり直しになることもない）。
+    それ以外のモードでは pages ページずつコピーして読み取りロックの保持を
+    短くする。他の接続の書き込みでコピーが最初からやり直しになるため、
+    max_restarts 回を超えたら BackupError を送出する。
+    progress(残りページ数, 総ページ数) を各ステップ後に呼ぶ
+    """
+    if journal_mode(source_path) == 'wal':
+        pages = -1
+
+    state = {'remaining': None, 'restarts': 0}
+
+    def on_progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > max_restarts:
+                raise BackupError(
+                    f'書き込みが多くコピーが {max_restarts} 回やり直しになりました'
+                    '（WAL モードでの実行を推奨します）'
+                )
+        state['remaining'] = remaining
+        if progress:
+            progress(remaining, total)
+
+    source = sqlite3.connect(source_path, timeout=30)
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.backup(dest, pages=pages, sleep=sleep, progress=on_progress)
+    finally:
+        dest.close()
+        source.close()
+
+
+def snapshot_path(directory, when=None):
+    when = when or timezone.now()
+    return os.path.join(directory, f"{SNAPSHOT_PREFIX}{when.strftime('%Y%m%dT%H%M%S')}{SNAPSHOT_SUFFIX}")
+
+
+def create_snapshot(db_path, directory, pages=256, sleep=0.05, compresslevel=6, progress=None):
+    """スナップショットを取得・検証・圧縮し、作成したファイルのパスを返す"""
+    os.makedirs(directory, exist_ok=True)
+    target = snapshot_path(directory)
+
+    fd, raw_path = tempfile.mkstemp(dir=directory, suffix='.sqlite3.tmp')
+    os.close(fd)
+    gz_tmp = target + '.tmp'
+    try:
+        online_copy(db_path, raw_path, pages=pages, sleep=sleep, progress=progress)
+
+        problem = integrity_check(raw_path)
+        if problem:
+            raise BackupError(f'スナップショットの整合性チェックに失敗しました: {problem}')
+
+        with open(raw_path, 'rb') as src, gzip.open(gz_tmp, 'wb', compresslevel=compresslevel) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(gz_tmp, target)
+
+        with open(target + '.sha256', 'w', encoding='utf-8') as f:
+            f.write(f'{_sha256(target)}  {os.path.basename(target)}\n')
+    finally:
+        _remove_db_file(raw_path)
+        if os.path.exists(gz_tmp):
+            os.remove(gz_tmp)
+    return target
+
+
+def list_snapshots(directory):
+    """スナップショットを新しい順に返す"""
+    if not os.path.isdir(directory):
+        return []
+    names = [
+        name for name in os.listdir(directory)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)
+    ]
+    return [os.path.join(directory, name) for name in sorted(names, reverse=True)]
+
+
+def rotate_snapshots(directory, keep):
+    """新しいものから keep 件を残して削除し、削除したパスを返す"""
+    removed = []
+    for path in list_snapshots(directory)[keep:]:
+        os.remove(path)
+        if os.path.exists(path + '.sha256'):
+            os.remove(path + '.sha256')
+        removed.append(path)
+    return removed
+
+
+def verify_snapshot(path, work_dir):
+    """
+    チェックサムと integrity_check でスナップショットを検証し、
+    展開した一時ファイルのパスを返す（呼び出し側で discard_verified() で削除する）
+    """
+    checksum_path = path + '.sha256'
+    if os.path.exists(checksum_path):
+        with open(checksum_path, encoding='utf-8') as f:
+            expected = f.read().split()[0]
+        if _sha256(path) != expected:
+            raise BackupError(f'チェックサムが一致しません: {path}')
+
+    fd, raw_path = tempfile.mkstemp(dir=work_dir, suffix='.sqlite3.restore')
+    os.close(fd)
+    try:
+        with gzip.open(path, 'rb') as src, open(raw_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        problem = integrity_check(raw_path)
+        if problem:
+            raise BackupError(f'整合性チェックに失敗しました: {problem}')
+
+        conn = sqlite3.connect(f'file:{raw_path}?mode=ro', uri=True)
+        try:
+            has_migrations = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'django_migrations'"
+            ).fetchone()
+        finally:
+            conn.close()
+        if not has_migrations:
+            raise BackupError('Django のデータベースではありません（django_migrations がありません）')
+    except Exception:
+        _remove_db_file(raw_path)
+        raise
+    return raw_path
+
+
+def discard_verified(raw_path):
+    """verify_snapshot が展開した一時ファイルを削除"""
+    _remove_db_file(raw_path)
+
+
+def restore_snapshot(path, db_path, pages=256, sleep=0.0, progress=None):
+    """スナップショットを検証し、稼働中のデータベースへ書き戻す"""
+    raw_path = verify_snapshot(path, os.path.dirname(os.path.abspath(db_path)))
+    try:
+        online_copy(raw_path, db_path, pages=pages, sleep=sleep, progress=progress)
+        problem = integrity_check(db_path)
+        if problem:
+            raise BackupError(f'リストア後の整合性チェックに失敗しました: {problem}')
+    finally:
+        _remove_db_file(raw_path)
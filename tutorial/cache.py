@@ -0,0 +1,153 @@
+# cache.py - tutorial アプリのキャッシュ層
+"""
+ビューやクエリの結果を名前空間ごとにバージョン付きのキーでキャッシュする。
+
+名前空間:
+- content: チャプター・問題・選択肢・学習ガイド・ブロック・バッジなど全ユーザー共通のデータ
+- user: ユーザーごとのデータ（進捗・回答・誤答・バッジ・プロファイル）。ユーザー ID ごとにバージョンを持つ
+- leaderboard: 経験値ランキング
+
+キーは tutorial:<名前空間>[:<ユーザー ID>]:v<バージョン>:<名前>:<引数> の形式。
+モデルの保存・削除シグナル（signals.py）で名前空間のバージョンを上げると、
+古いキーは参照されなくなりタイムアウトで消える。キャッシュのバックエンドは
+settings.TUTORIAL_CACHE_BACKEND（file / redis / locmem）で選ぶ。既定の file は
+/dev/shm 上の共有ディレクトリなので、バージョンの更新は同じホストの全ワーカーに
+届く。locmem はプロセスごとのキャッシュで、gunicorn で複数ワーカーを動かすと
+他のワーカーが古い内容を返し続けるため、gunicorn_asgi.py の起動時に警告する。
+
+ヒット／ミスは tutorial.metrics に "<名前空間>:<名前>" で記録する。
+"""
+import functools
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .metrics import record_cache
+
+CONTENT = 'content'
+USER = 'user'
+LEADERBOARD = 'leaderboard'
+NAMESPACES = (CONTENT, USER, LEADERBOARD)
+
+DEFAULT_TIMEOUTS = {CONTENT: 60 * 60, USER: 5 * 60, LEADERBOARD: 60}
+
+_MISSING = object()
+
+
+def get_cache():
+    return caches[getattr(settings, 'TUTORIAL_CACHE_ALIAS', 'default')]
+
+
+def timeout_for(namespace):
+    """名前空間の既定のタイムアウト（秒）。テンプレートのフラグメントキャッシュにも使う"""
+    timeouts = getattr(settings, 'TUTORIAL_CACHE_TIMEOUTS', {})
+    return timeouts.get(namespace, DEFAULT_TIMEOUTS[namespace])
+
+
+def _timeout(namespace, timeout):
+    return timeout_for(namespace) if timeout is None else timeout
+
+
+def _version_key(namespace, user_id=None):
+    if namespace not in NAMESPACES:
+        raise ValueError(f'未知のキャッシュ名前空間です: {namespace}')
+    if namespace == USER:
+        if user_id is None:
+            raise ValueError('user 名前空間には user_id が必要です')
+        return f'tutorial:{namespace}:{user_id}:version'
+    return f'tutorial:{namespace}:version'
+
+
+def namespace_version(namespace, user_id=None):
+    """名前空間の現在のバージョン"""
+    cache = get_cache()
+    key = _version_key(namespace, user_id)
+    version = cache.get(key)
+    if version is None:
+        # キャッシュが消えた後も以前のキーと衝突しないよう、時刻から初期値を作る
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump(namespace, user_id=None):
+    """名前空間のバージョンを上げて、その名前空間のキャッシュをすべて無効にする"""
+    cache = get_cache()
+    key = _version_key(namespace, user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def make_key(namespace, name, *parts, user_id=None):
+    version = namespace_version(namespace, user_id)
+    owner = f'{namespace}:{user_id}' if namespace == USER else namespace
+    suffix = ':'.join(str(part) for part in parts)
+    return f'tutorial:{owner}:v{version}:{name}:{suffix}'
+
+
+def cached_query(namespace, name, func, *parts, user_id=None, timeout=None):
+    """
+    func() の結果をキャッシュして返す
+    parts はキーに含める引数（チャプター ID など）。結果はピクル可能な値にすること
+    （QuerySet は list() で評価してから返す）
+    """
+    cache = get_cache()
+    key = make_key(namespace, name, *parts, user_id=user_id)
+    value = cache.get(key, _MISSING)
+    hit = value is not _MISSING
+    record_cache(f'{namespace}:{name}', hit)
+    if not hit:
+        value = func()
+        cache.set(key, value, _timeout(namespace, timeout))
+    return value
+
+
+def _cacheable_response(request, response):
+    """ユーザー固有の状態を含まないレスポンスだけを保存する"""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    # テンプレートで CSRF トークンを使ったページやセッションを更新したリクエストは保存しない
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return False
+    session = getattr(request, 'session', None)
+    return not (session is not None and session.modified)
+
+
+def cached_view(namespace=CONTENT, per_user=False, timeout=None):
+    """
+    GET リクエストのレスポンスをキャッシュするビューデコレーター
+    per_user=True ではユーザーごとにキャッシュし、user 名前空間のバージョンもキーに含める
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            parts = [request.get_full_path()]
+            user_id = None
+            if per_user:
+                if request.user.is_authenticated:
+                    user_id = request.user.id
+                    parts.append(f'u{namespace_version(USER, user_id)}')
+                else:
+                    parts.append('anonymous')
+
+            cache = get_cache()
+            key = make_key(namespace, f'view:{view_func.__name__}', *parts, user_id=user_id if namespace == USER else None)
+            cached = cache.get(key)
+            record_cache(f'{namespace}:view:{view_func.__name__}', cached is not None)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = view_func(request, *args, **kwargs)
+            if _cacheable_response(request, response):
+                cache.set(key, (response.content, response['Content-Type']), _timeout(namespace, timeout))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,26 @@
+# checks.py - tutorial アプリのシステムチェック
+"""
+`manage.py check --database` で実行されるチェック。
+"""
+from django.core.checks import Tags, Warning, register
+from django.db import DatabaseError
+
+
+@register(Tags.database)
+def check_job_queue(app_configs, **kwargs):
+    """ジョブ（immediate バックエンドでは失敗したジョブの再試行）が処理されずに溜まっていないか"""
+    from .tasks import stalled_job_count
+
+    try:
+        stalled = stalled_job_count()
+    except DatabaseError:
+        # マイグレーション前など、Job テーブルが無い場合は確認しない
+        return []
+    if not stalled:
+        return []
+    return [Warning(
+        f'実行予定を過ぎたまま待機中のジョブが {stalled} 件あります',
+        hint='run_jobs のワーカーを起動してください'
+             '（ワーカーが動いていないと経験値・バッジ・チャプター結果が記録されません）',
+        id='tutorial.W001',
+    )]
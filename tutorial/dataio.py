@@ -0,0 +1,205 @@
+# dataio.py - JSON Lines 形式のストリーミングエクスポート／インポート
+"""
+dumpdata / loaddata の代わりに使う、モデル単位の JSON Lines 入出力
+
+- エクスポートは依存関係順（外部キーの参照先が先）にモデルごとのファイルへ
+  1 行 1 レコードで書き出し、manifest.json に順序と件数を記録する。
+- インポートは manifest の順に読み込み、batch_size 件ごとに bulk_create する。
+  bulk_create は save() もシグナル（post_save / m2m_changed）も呼ばないため、
+  create_user_profile などのハンドラーはインポート中に発火しない。
+- どちらもファイル全体をメモリに載せないため、メモリ使用量は
+  batch_size で決まり、処理時間は件数に比例する。
+"""
+import datetime
+import json
+import os
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers import sort_dependencies
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_VERSION = 1
+
+# 既定で除外するモデル（管理画面の操作ログとセッション）
+DEFAULT_EXCLUDES = ('admin.logentry', 'sessions.session')
+
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    """
+    auto_now / auto_now_add を一時的に無効にし、保存時に値を上書きさせない
+    field_names を省略した場合はモデルのすべての自動日時フィールドが対象
+    """
+    if field_names:
+        fields = [model._meta.get_field(name) for name in field_names]
+    else:
+        fields = [
+            field for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = False
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder はミリ秒に丸めるため、日時はマイクロ秒まで出力する"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def resolve_models(labels, excludes=DEFAULT_EXCLUDES):
+    """
+    'app_label' / 'app_label.ModelName' の指定をモデルのリストに変換し、依存関係順に並べる
+    自動生成された多対多の中間テーブルは、両側のモデルの後に追加する
+    """
+    excludes = {label.lower() for label in excludes}
+    app_list = {}
+    for label in labels:
+        if '.' in label:
+            model = apps.get_model(label)
+            app_list.setdefault(model._meta.app_config, []).append(model)
+        else:
+            app_config = apps.get_app_config(label)
+            app_list.setdefault(app_config, []).extend(app_config.get_models())
+
+    models = []
+    for model in sort_dependencies(app_list.items(), allow_cycles=True):
+        if model in models:
+            continue
+        if model_label(model) in excludes or model._meta.app_label in excludes:
+            continue
+        if model._meta.proxy or not model._meta.managed:
+            continue
+        models.append(model)
+
+    through_models = []
+    for model in models:
+        for field in model._meta.local_many_to_many:
+            through = field.remote_field.through
+            if through._meta.auto_created and through not in through_models and model_label(through) not in excludes:
+                through_models.append(through)
+    return models + through_models
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _filename(index, model):
+    return f'{index:03d}_{model_label(model)}.jsonl'
+
+
+def export_models(models, directory, batch_size=2000, using=DEFAULT_DB_ALIAS, progress=None):
+    """モデルごとに JSON Lines を書き出し、manifest を返す"""
+    os.makedirs(directory, exist_ok=True)
+    manifest = {
+        'format': FORMAT_VERSION,
+        'created_at': timezone.now().isoformat(),
+        'models': [],
+    }
+
+    for index, model in enumerate(models):
+        filename = _filename(index, model)
+        columns = _columns(model)
+        count = 0
+        queryset = model._default_manager.using(using).order_by('pk').values_list(*columns)
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+            for row in queryset.iterator(chunk_size=batch_size):
+                f.write(json.dumps(dict(zip(columns, row)), cls=ExportEncoder, ensure_ascii=False))
+                f.write('\n')
+                count += 1
+
+        manifest['models'].append({'model': model_label(model), 'file': filename, 'count': count})
+        if progress:
+            progress(model_label(model), count)
+
+    with open(os.path.join(directory, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _read_batches(path, batch_size):
+    batch = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def import_models(directory, labels=None, excludes=DEFAULT_EXCLUDES, batch_size=2000,
+                  ignore_conflicts=False, using=DEFAULT_DB_ALIAS, progress=None):
+    """
+    manifest の順にモデルを読み込み、bulk_create で一括登録する
+    labels を指定した場合は該当するモデルのみ（'app_label' または 'app_label.modelname'）
+    戻り値: {モデルラベル: 件数}
+    """
+    manifest = read_manifest(directory)
+    wanted = {label.lower() for label in labels} if labels else None
+    excludes = {label.lower() for label in excludes}
+
+    entries = []
+    for entry in manifest['models']:
+        label = entry['model']
+        app_label = label.split('.', 1)[0]
+        if label in excludes or app_label in excludes:
+            continue
+        if wanted is not None and label not in wanted and app_label not in wanted:
+            continue
+        entries.append((apps.get_model(label), entry))
+
+    counts = {}
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        for model, entry in entries:
+            columns = set(_columns(model))
+            count = 0
+            with explicit_timestamps(model):
+                for batch in _read_batches(os.path.join(directory, entry['file']), batch_size):
+                    objs = [model(**{k: v for k, v in row.items() if k in columns}) for row in batch]
+                    model._default_manager.using(using).bulk_create(
+                        objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts
+                    )
+                    count += len(objs)
+            counts[model_label(model)] = count
+            if progress:
+                progress(model_label(model), count)
+
+        # 主キーを明示して登録したので、シーケンスを最大値に合わせる（PostgreSQL など）
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), [model for model, _ in entries])
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+    return counts
@@ -0,0 +1,235 @@
+# diagram.py - 架构图データのキャッシュ読み取りとレイアウト更新
+"""
+get_architecture_data / building_blocks が使う架構図テンプレートと
+アーキテクチャスロットをキャッシュから読み取る。
+
+架構図テンプレートは version 列を持ち、キャッシュにはバージョンと
+シリアライズ済み JSON をまとめて保持する。レイアウト更新は version を
+条件にした UPDATE（コンペア・アンド・スワップ）で行い、変更のあった層だけを
+最新の行にマージするため、同時保存でも更新が失われない。
+
+更新後はキャッシュを書き換えずに破棄する。キャッシュのキーには架構図ごとの
+世代番号を含め、破棄は世代番号を進めて行うので、破棄より前に DB から読み込んだ
+リクエストが古い内容を保存しても、その内容は古い世代のキーに入り参照されない。
+
+データの投入は tutorial.seeding が担当し、ここでは読み取りと
+レイアウト更新のみ行う。モデル保存時のシグナルでキャッシュを破棄する
+（models.py 参照）。
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db.models import F
+
+from .metrics import record_cache
+from .seeding import DEFAULT_DIAGRAM_NAME
+
+# %s は架構図名の SHA-1（名前の空白や日本語はキャッシュキーに使えないため）
+DIAGRAM_CACHE_KEY = 'tutorial:diagram:%s:g%s'
+DIAGRAM_GENERATION_KEY = 'tutorial:diagram:%s:generation'
+SLOTS_CACHE_KEY = 'tutorial:architecture_slots'
+CACHE_TIMEOUT = 60 * 60
+
+# 自動マージ時の最大リトライ回数
+LAYOUT_UPDATE_RETRIES = 5
+LAYOUT_FIELDS = ('x', 'y', 'size')
+
+
+class LayoutConflict(Exception):
+    """期待したバージョンと現在のバージョンが一致しない"""
+
+    def __init__(self, current_version):
+        super().__init__(f'架构图已被更新 (当前版本: {current_version})')
+        self.current_version = current_version
+
+
+def _with_layout_defaults(layers):
+    """位置情報が欠けている層にデフォルト値を補った新しいリストを返す"""
+    layers = [dict(layer) for layer in layers]
+    for idx, layer in enumerate(layers):
+        layer.setdefault('x', 100 + idx * 220)
+        layer.setdefault('y', 200)
+        layer.setdefault('size', 160)
+    return layers
+
+
+def serialize_diagram(diagram):
+    """架構図テンプレートとコンポーネントを JSON 返却用の dict に変換"""
+    from .models import DiagramComponent
+
+    components = []
+    for comp in DiagramComponent.objects.filter(diagram=diagram):
+        components.append({
+            'id': comp.id,
+            'name': comp.name,
+            'type': comp.component_type,
+            'position': {'x': comp.position_x, 'y': comp.position_y},
+            'size': {'width': comp.width, 'height': comp.height},
+            'color': comp.color,
+            'allowed_block_types': comp.allowed_block_types,
+            'layer': comp.layer
+        })
+
+    return {
+        'name': diagram.name,
+        'description': diagram.description,
+        'version': diagram.version,
+        'layers': _with_layout_defaults(diagram.layers),
+        'components': components,
+        'connections': diagram.connections
+    }
+
+
+def _build_entry(data):
+    """キャッシュに保存するエントリ（バージョン・dict・レスポンス JSON）を作成"""
+    return {
+        'version': data['version'],
+        'data': data,
+        'json': json.dumps({'success': True, 'diagram': data}),
+    }
+
+
+def _name_hash(name):
+    return hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+
+def _diagram_key(name):
+    """架構図の現在の世代のキャッシュキー"""
+    generation_key = DIAGRAM_GENERATION_KEY % _name_hash(name)
+    generation = cache.get(generation_key)
+    if generation is None:
+        # キャッシュが消えた後も以前のキーと衝突しないよう、時刻から初期値を作る
+        cache.add(generation_key, int(time.time() * 1000), None)
+        generation = cache.get(generation_key, 0)
+    return DIAGRAM_CACHE_KEY % (_name_hash(name), generation)
+
+
+def get_diagram_entry(name=DEFAULT_DIAGRAM_NAME):
+    """
+    架構図のキャッシュエントリを取得
+    テンプレートが未投入の場合は None を返す（書き込みは行わない）
+    """
+    key = _diagram_key(name)
+    entry = cache.get(key)
+    record_cache('diagram', entry is not None)
+    if entry is not None:
+        return entry
+
+    from .models import ArchitectureDiagramTemplate
+
+    diagram = ArchitectureDiagramTemplate.objects.filter(name=name).first()
+    if diagram is None:
+        return None
+
+    entry = _build_entry(serialize_diagram(diagram))
+    cache.set(key, entry, CACHE_TIMEOUT)
+    return entry
+
+
+def get_diagram_data(name=DEFAULT_DIAGRAM_NAME):
+    """架構図データ（dict）をキャッシュ経由で取得"""
+    entry = get_diagram_entry(name)
+    return entry['data'] if entry else None
+
+
+def get_diagram_json(name=DEFAULT_DIAGRAM_NAME):
+    """シリアライズ済みのレスポンス JSON をキャッシュ経由で取得"""
+    entry = get_diagram_entry(name)
+    return entry['json'] if entry else None
+
+
+def _patch_layers(current_layers, incoming_layers):
+    """
+    受信した層の位置を現在の層リストにマージ
+    実際に値が変わった層だけを書き換え、変更された層名のリストを返す
+    """
+    layers = [dict(layer) for layer in current_layers]
+    by_name = {layer['name']: layer for layer in layers}
+    changed = []
+
+    for item in incoming_layers:
+        name = item.get('name')
+        layer = by_name.get(name)
+        if layer is None:
+            continue
+
+        updates = {}
+        for field in LAYOUT_FIELDS:
+            if field in item:
+                value = int(item[field])
+                if layer.get(field) != value:
+                    updates[field] = value
+        if updates:
+            layer.update(updates)
+            changed.append(name)
+
+    return layers, changed
+
+
+def update_layer_layout(incoming_layers, expected_version=None, name=DEFAULT_DIAGRAM_NAME):
+    """
+    層のレイアウト（x / y / size）を楽観的排他で更新
+    expected_version を指定した場合、現在のバージョンと異なれば LayoutConflict を送出する。
+    省略した場合は最新の行に変更層だけをマージし、競合時は再試行する。
+    戻り値: (新しいバージョン, 変更された層名のリスト)
+    """
+    from .models import ArchitectureDiagramTemplate
+
+    current_version = None
+    for _ in range(LAYOUT_UPDATE_RETRIES):
+        row = ArchitectureDiagramTemplate.objects.filter(name=name).values(
+            'id', 'layers', 'version'
+        ).first()
+        if row is None:
+            raise ArchitectureDiagramTemplate.DoesNotExist(name)
+
+        current_version = row['version']
+        if expected_version is not None and current_version != expected_version:
+            raise LayoutConflict(current_version)
+
+        layers, changed = _patch_layers(row['layers'], incoming_layers)
+        if not changed:
+            return current_version, []
+
+        updated = ArchitectureDiagramTemplate.objects.filter(
+            id=row['id'], version=current_version
+        ).update(layers=layers, version=F('version') + 1)
+
+        if updated:
+            invalidate_diagram_cache(name)
+            return current_version + 1, changed
+
+        if expected_version is not None:
+            break
+
+    raise LayoutConflict(current_version)
+
+
+def get_architecture_slots():
+    """任意アーキテクチャスロットの一覧をキャッシュ経由で取得"""
+    slots = cache.get(SLOTS_CACHE_KEY)
+    record_cache('architecture_slots', slots is not None)
+    if slots is not None:
+        return slots
+
+    from .models import ArchitectureSlot
+
+    slots = list(ArchitectureSlot.objects.filter(required=False))
+    cache.set(SLOTS_CACHE_KEY, slots, CACHE_TIMEOUT)
+    return slots
+
+
+def invalidate_diagram_cache(name=None):
+    """架構図キャッシュを破棄（name 省略時はデフォルト架構図）。世代番号を進め、古いキーを参照させない"""
+    generation_key = DIAGRAM_GENERATION_KEY % _name_hash(name or DEFAULT_DIAGRAM_NAME)
+    try:
+        cache.incr(generation_key)
+    except ValueError:
+        cache.set(generation_key, int(time.time() * 1000), None)
+
+
+def invalidate_slots_cache():
+    """スロット一覧キャッシュを破棄"""
+    cache.delete(SLOTS_CACHE_KEY)
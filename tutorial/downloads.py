@@ -0,0 +1,350 @@
+# downloads.py - 学習ガイド添付ファイルの配信
+"""
+StudyGuideAttachment のファイルをアクセス権を確認してから配信する。
+
+- settings.TUTORIAL_ATTACHMENT_OFFLOAD でフロントのプロキシに転送を任せる
+    'x-accel':    nginx の X-Accel-Redirect（TUTORIAL_ATTACHMENT_ACCEL_PREFIX
+                  を internal な location で MEDIA_ROOT に割り当てておく）
+    'x-sendfile': Apache mod_xsendfile / lighttpd の X-Sendfile（絶対パス）
+  プロキシが Range・条件付きリクエストも処理する。
+- 未設定の場合は Django が直接返す。ETag / Last-Modified による条件付き
+  リクエスト（304）と、単一の Range（206 / 416）に対応する。ファイルは
+  FileResponse で返すため、gunicorn では wsgi.file_wrapper 経由で
+  sendfile(2) によるゼロコピー転送になる（Range の場合も開始位置まで seek し、
+  Content-Length で長さを区切る）。
+- ダウンロード数はプロセス内で集計し、TUTORIAL_DOWNLOAD_COUNT_FLUSH_INTERVAL
+  秒ごとに UPDATE 1 文でまとめて加算する。ダウンロードのたびに行ロックを
+  取らない。次のダウンロードが来なくても間隔が過ぎればタイマーで反映し、
+  ワーカーの終了時（max_requests による再起動を含む）にも atexit で反映する。
+  UPDATE に失敗した分は次回に持ち越し、終了時に反映できなかった分は
+  スプールディレクトリ（既定は /dev/shm 配下）に書き出して、定期ジョブ
+  tutorial.tasks.flush_download_counts が反映する。プロセスが強制終了
+  （SIGKILL など）された場合の未反映分だけは失われる。
+"""
+import atexit
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from .metrics import record_count
+from .models import StudyGuideAttachment
+from .storage import CONTENT_ADDRESSED_NAME_RE
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== ダウンロード数 ====================
+
+def _flush_interval():
+    return getattr(settings, 'TUTORIAL_DOWNLOAD_COUNT_FLUSH_INTERVAL', 10)
+
+
+def _spool_dir():
+    default = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    path = getattr(settings, 'TUTORIAL_DOWNLOAD_COUNT_SPOOL_DIR', None) or os.path.join(default, 'tutorial_downloads')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def apply_counts(counts):
+    """{添付ファイル ID: 件数} を UPDATE 1 文で加算する"""
+    if not counts:
+        return
+    increment = Case(
+        *[When(id=attachment_id, then=Value(count)) for attachment_id, count in counts.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    StudyGuideAttachment.objects.filter(id__in=counts).update(download_count=F('download_count') + increment)
+
+
+def write_spool(counts):
+    """DB に反映できなかったダウンロード数をスプールファイルにアトミックに書き出す"""
+    directory = _spool_dir()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({str(attachment_id): count for attachment_id, count in counts.items()}, f)
+    os.replace(tmp_path, os.path.join(directory, f'{os.getpid()}-{time.time_ns()}.json'))
+
+
+def drain_spool():
+    """スプールファイルのダウンロード数を DB に加算してファイルを削除し、加算した件数を返す"""
+    directory = _spool_dir()
+    total = 0
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(directory, filename)
+        # 同時に実行された別のジョブと同じファイルを二重に加算しないよう、改名してから読む
+        claimed = f'{path}.{os.getpid()}.claimed'
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            continue
+        try:
+            with open(claimed, encoding='utf-8') as f:
+                counts = {int(attachment_id): count for attachment_id, count in json.load(f).items()}
+            apply_counts(counts)
+        except ValueError:
+            logger.error(f"ダウンロード数のスプールファイルを読み込めません: {filename}")
+            os.rename(claimed, path + '.bad')
+            continue
+        except Exception:
+            os.rename(claimed, path)
+            raise
+        os.remove(claimed)
+        total += sum(counts.values())
+    return total
+
+
+class DownloadCounter:
+    """添付ファイルごとのダウンロード数をプロセス内で集計し、まとめて DB に加算する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pid = os.getpid()
+        self._last_flush = time.monotonic()
+        self._timer = None
+
+    def add(self, attachment_id):
+        with self._lock:
+            # fork 後の子プロセスは親の未反映分を引き継がない（親が反映する）
+            if self._pid != os.getpid():
+                self._pending = {}
+                self._pid = os.getpid()
+                self._timer = None
+            self._pending[attachment_id] = self._pending.get(attachment_id, 0) + 1
+            self._schedule()
+        record_count('attachment_downloads')
+        self.maybe_flush()
+
+    def _schedule(self):
+        """次のダウンロードが来なくても間隔後に反映されるようタイマーを仕掛ける（ロック内で呼ぶ）"""
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(_flush_interval(), self._flush_from_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"ダウンロード数の反映に失敗しました（次回に持ち越し）: {e}")
+        finally:
+            # タイマーのスレッドが開いた DB 接続を残さない
+            connection.close()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= _flush_interval():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"ダウンロード数の反映に失敗しました（次回に持ち越し）: {e}")
+
+    def flush(self):
+        """
+        未反映のダウンロード数を UPDATE 1 文で加算し、加算した件数を返す
+        UPDATE に失敗した場合は未反映分に戻してから例外を送出する
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            apply_counts(pending)
+        except Exception:
+            with self._lock:
+                for attachment_id, count in pending.items():
+                    self._pending[attachment_id] = self._pending.get(attachment_id, 0) + count
+                self._schedule()
+            raise
+        return sum(pending.values())
+
+    def flush_at_exit(self):
+        """プロセス終了時に反映する。DB に書けなければスプールに書き出す"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if pending:
+                write_spool(pending)
+                logger.warning(f"終了時にダウンロード数を反映できないためスプールに書き出しました: {e}")
+
+
+download_counter = DownloadCounter()
+atexit.register(download_counter.flush_at_exit)
+
+
+# ==================== 配信 ====================
+
+class _RangeFile:
+    """ファイルの start から length バイトだけを読ませるラッパー（fileno は sendfile 用）"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self._file = file
+        self._remaining = length
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+def _etag(name, stat):
+    # 内容アドレスの名前なら SHA-256 をそのまま ETag にする
+    match = CONTENT_ADDRESSED_NAME_RE.match(name)
+    if match:
+        return f'"{match.group("digest")}"'
+    return f'"{stat.st_size:x}-{int(stat.st_mtime * 1000000):x}"'
+
+
+def parse_range(header, size):
+    """
+    Range ヘッダーを (start, end) に変換する（end を含む）
+    ヘッダーが無い・解釈できない・複数範囲の場合は None（全体を返す）、
+    満たせない範囲は ValueError
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # 末尾から last バイト
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _range_applies(request, etag, last_modified):
+    """If-Range が付いていれば、検証子が一致する場合だけ Range を使う"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _disposition(filename):
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+
+def _offload_response(attachment, filename, content_type):
+    mode = getattr(settings, 'TUTORIAL_ATTACHMENT_OFFLOAD', '')
+    if mode == 'x-accel':
+        prefix = getattr(settings, 'TUTORIAL_ATTACHMENT_ACCEL_PREFIX', '/protected-media/')
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(attachment.file.name)
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = attachment.file.path
+    else:
+        return None
+    response['Content-Disposition'] = _disposition(filename)
+    return response
+
+
+def serve_attachment(request, attachment):
+    """添付ファイルのレスポンスを作る（アクセス権の確認は呼び出し側で行う）"""
+    filename = os.path.basename(attachment.file.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = _offload_response(attachment, filename, content_type)
+    if response is not None:
+        download_counter.add(attachment.id)
+        patch_cache_control(response, private=True)
+        return response
+
+    path = attachment.file.path
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    etag = _etag(attachment.file.name, stat)
+    last_modified = int(stat.st_mtime)
+
+    # If-None-Match / If-Modified-Since などの条件付きリクエスト
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        size = stat.st_size
+        byte_range = None
+        if _range_applies(request, etag, last_modified):
+            try:
+                byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                response['Accept-Ranges'] = 'bytes'
+                return response
+
+        file = open(path, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, as_attachment=True, filename=filename, content_type=content_type)
+            response['Content-Length'] = str(size)
+        else:
+            start, end = byte_range
+            response = FileResponse(
+                _RangeFile(file, start, end - start + 1),
+                as_attachment=True, filename=filename, content_type=content_type, status=206,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+
+        # 途中から再開したダウンロードは数えない
+        if byte_range is None or byte_range[0] == 0:
+            download_counter.add(attachment.id)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    return response
@@ -49,3 +49,14 @@ class RegisterForm(UserCreationForm):
         if commit:
             user.save()
         return user
+
+
+class QuestionImportForm(forms.Form):
+    """管理画面の問題インポート（CSV / Markdown）"""
+
+    file = forms.FileField(label="ファイル（.csv / .md）")
+    prune = forms.BooleanField(
+        label="ファイルに無い問題を削除する",
+        required=False,
+        help_text="ファイルに含まれるチャプターの問題のうち、ファイルに無いものを削除します（誤答・解答履歴も削除されます）。",
+    )
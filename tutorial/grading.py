@@ -0,0 +1,86 @@
+# grading.py - 回答の採点ロジック
+"""
+submit_answer（同期版・非同期版）で共有する採点処理
+
+DB アクセスは行わず、呼び出し側が取得した問題の選択肢（Choice のリスト、
+既定の並び順）を受け取って判定する。同期ビューは通常の ORM、非同期ビューは
+非同期 ORM で選択肢を取得し、同じ関数で採点する。
+"""
+from .models import Choice
+
+
+def grade_answer(question_type, user_answer, choices):
+    """
+    回答を採点する
+    choices: 問題のすべての選択肢（blank_index, order 順）
+    戻り値: {
+        'is_correct': 正解かどうか,
+        'correct_answer': レスポンスに含める正解テキスト,
+        'message': 不正解時のメッセージ,
+        'wrong_answer': 誤答として記録する回答（正解なら None）,
+        'wrong_correct_answer': 誤答記録に残す正解テキスト,
+    }
+    選択問題で問題に属さない選択肢 ID が指定された場合は Choice.DoesNotExist を送出する
+    """
+    result = {
+        'is_correct': False,
+        'correct_answer': '',
+        'message': '',
+        'wrong_answer': None,
+        'wrong_correct_answer': '',
+    }
+
+    if question_type == 'choice':
+        selected = next((c for c in choices if str(c.id) == str(user_answer)), None)
+        if selected is None:
+            raise Choice.DoesNotExist(user_answer)
+
+        result['is_correct'] = selected.is_correct
+        result['correct_answer'] = ", ".join(c.choice_text for c in choices if c.is_correct)
+        if not selected.is_correct:
+            result['message'] = "選択が間違っています"
+            result['wrong_answer'] = selected.choice_text
+            result['wrong_correct_answer'] = result['correct_answer']
+
+    elif question_type == 'fill':
+        correct_choices = [c for c in choices if c.is_correct and c.blank_index == 0]
+        user_answer_clean = user_answer.strip().lower()
+        for choice in correct_choices:
+            if user_answer_clean == choice.choice_text.strip().lower():
+                result['is_correct'] = True
+                result['correct_answer'] = choice.choice_text
+                break
+
+        if not result['is_correct']:
+            result['message'] = "回答が正しくありません"
+            result['wrong_answer'] = user_answer
+            result['wrong_correct_answer'] = ", ".join(c.choice_text for c in correct_choices)
+
+    elif question_type == 'multi_fill':
+        user_answers = user_answer.split(',')
+
+        # 回答された空欄ごとの正解（小文字・空白除去済み）
+        correct_answers_by_blank = {
+            i: [c.choice_text.strip().lower() for c in choices if c.is_correct and c.blank_index == i]
+            for i in range(len(user_answers))
+        }
+
+        is_correct = True
+        for i, user_ans in enumerate(user_answers):
+            if user_ans.strip().lower() not in correct_answers_by_blank[i]:
+                is_correct = False
+                break
+
+        parts = []
+        for i in sorted(correct_answers_by_blank):
+            if correct_answers_by_blank[i]:
+                parts.append(f"空{i+1}: {', '.join(correct_answers_by_blank[i])}")
+
+        result['is_correct'] = is_correct
+        result['correct_answer'] = "; ".join(parts)
+        if not is_correct:
+            result['message'] = "一部の回答が正しくありません"
+            result['wrong_answer'] = user_answer
+            result['wrong_correct_answer'] = result['correct_answer']
+
+    return result
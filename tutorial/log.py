@@ -0,0 +1,140 @@
+# log.py - tutorial アプリのロギング部品
+"""
+settings.LOGGING から参照するロギング部品
+
+- JsonFormatter: 1 レコード 1 行の JSON（extra で渡した項目も出力）
+- SampledDebugFilter: DEBUG レコードのサンプリングと、同一メッセージの流量制限
+- AsyncQueueHandler: レコードをキューに積むだけで返し、実際の書き込みは
+  バックグラウンドスレッド（QueueListener）が行う。リクエストスレッドは
+  ログ I/O でブロックしない。
+
+ビューやモデルでは通常どおり logging.getLogger(__name__) を使い、
+構造化したい値は extra={...} で渡す。
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+# LogRecord が標準で持つ属性（extra として出力しないもの）
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """ログレコードを 1 行の JSON に整形"""
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            payload['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SampledDebugFilter(logging.Filter):
+    """
+    DEBUG レコードを間引くフィルター
+    sample_rate: DEBUG レコードを通す割合（0.0〜1.0）
+    rate_limit: 同一ロガー・同一メッセージ書式あたり interval 秒間に通す最大件数（0 で無制限）
+    INFO 以上のレコードはそのまま通す。
+    """
+
+    def __init__(self, sample_rate=1.0, rate_limit=0, interval=60.0):
+        super().__init__()
+        self.sample_rate = float(sample_rate)
+        self.rate_limit = int(rate_limit)
+        self.interval = float(interval)
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        if self.rate_limit <= 0:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window_start, count = self._windows.get(key, (now, 0))
+            if now - window_start >= self.interval:
+                window_start, count = now, 0
+            if count >= self.rate_limit:
+                self._windows[key] = (window_start, count)
+                return False
+            self._windows[key] = (window_start, count + 1)
+        return True
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    キュー経由で非同期に書き込むハンドラー
+    整形はこのハンドラーの formatter で行い、書き込みはバックグラウンドの
+    QueueListener が stream に対して行う。キューが満杯の場合は破棄して
+    dropped を数える（リクエストスレッドを待たせない）。
+    gunicorn の fork 後は最初の emit でリスナーを起動し直す。
+    """
+
+    def __init__(self, stream='ext://sys.stderr', maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.stream = stream
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def _resolve_stream(self):
+        if self.stream == 'ext://sys.stdout':
+            return sys.stdout
+        if self.stream == 'ext://sys.stderr':
+            return sys.stderr
+        return self.stream
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            target = logging.StreamHandler(self._resolve_stream())
+            target.setFormatter(logging.Formatter('%(message)s'))
+            self._listener = logging.handlers.QueueListener(self.queue, target)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
+
+    def stop(self):
+        """キューに残ったレコードを書き出してリスナーを停止"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
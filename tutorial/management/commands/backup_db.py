@@ -0,0 +1,55 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from tutorial.backup import BackupError, create_snapshot, rotate_snapshots
+
+
+def sqlite_database_path(alias='default'):
+    """SQLite データベースファイルのパスを返す（SQLite 以外ならエラー）"""
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        raise CommandError('このコマンドは SQLite データベースのみ対応しています')
+    return str(connection.settings_dict['NAME'])
+
+
+class Command(BaseCommand):
+    help = 'SQLite のオンラインバックアップ API でスナップショットを取得（サイト稼働中でも実行可）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=str(settings.TUTORIAL_BACKUP_DIR),
+            help=f'保存先ディレクトリ（デフォルト: {settings.TUTORIAL_BACKUP_DIR}）',
+        )
+        parser.add_argument(
+            '--keep', type=int, default=settings.TUTORIAL_BACKUP_KEEP,
+            help=f'残すスナップショット数（デフォルト: {settings.TUTORIAL_BACKUP_KEEP}）',
+        )
+        parser.add_argument('--pages', type=int, default=256, help='1ステップでコピーするページ数')
+        parser.add_argument('--sleep', type=float, default=0.05, help='ステップ間の待ち時間（秒）')
+
+    def handle(self, *args, **options):
+        db_path = sqlite_database_path()
+        started = time.perf_counter()
+
+        def progress(remaining, total):
+            if options['verbosity'] >= 2 and total:
+                self.stdout.write(f'  {total - remaining}/{total} ページ')
+
+        try:
+            path = create_snapshot(
+                db_path, options['dir'], pages=options['pages'], sleep=options['sleep'], progress=progress,
+            )
+        except BackupError as e:
+            raise CommandError(str(e))
+
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'スナップショットを作成しました: {path}（{size_mb:.1f}MB, {time.perf_counter() - started:.1f}秒）'
+        ))
+
+        for removed in rotate_snapshots(options['dir'], options['keep']):
+            self.stdout.write(f'古いスナップショットを削除しました: {removed}')
@@ -0,0 +1,177 @@
+import asyncio
+import http.cookiejar
+import json
+import time
+import urllib.parse
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tutorial.perf import summarize
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def login_cookies(base_url, username, password):
+    """ログインしてセッションと CSRF の Cookie を取得"""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), _NoRedirect)
+    opener.open(base_url + '/login/', timeout=30).read()
+    csrftoken = next((c.value for c in jar if c.name == 'csrftoken'), '')
+    body = urllib.parse.urlencode({
+        'username': username, 'password': password, 'csrfmiddlewaretoken': csrftoken,
+    }).encode()
+    req = urllib.request.Request(base_url + '/login/', data=body, headers={'Referer': base_url + '/'})
+    try:
+        opener.open(req, timeout=30)
+    except urllib.error.HTTPError as e:
+        if e.code != 302:
+            raise CommandError(f'{base_url} にログインできません（HTTP {e.code}）')
+    cookies = {c.name: c.value for c in jar}
+    if 'sessionid' not in cookies:
+        raise CommandError(f'{base_url} にログインできません（ユーザー名・パスワードを確認してください）')
+    return cookies
+
+
+async def _read_response(reader):
+    """HTTP/1.1 レスポンスを読み、(ステータス, keep-alive 可否) を返す"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def _client(url, request_bytes, deadline, latencies, errors):
+    """1 本の keep-alive 接続でリクエストを送り続ける"""
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+            started = time.perf_counter()
+            writer.write(request_bytes)
+            await writer.drain()
+            status, keep_alive = await asyncio.wait_for(_read_response(reader), timeout=30)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            errors.append(0)
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def run_level(url, request_bytes, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*[
+        _client(url, request_bytes, deadline, latencies, errors) for _ in range(concurrency)
+    ])
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = '同時接続数を段階的に増やし、WSGI / ASGI などのデプロイ構成ごとの処理能力を比較'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True, metavar='NAME=URL',
+            help='計測対象（例: --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001）',
+        )
+        parser.add_argument('--concurrency', default='10,50,100,200', help='同時接続数（カンマ区切り）')
+        parser.add_argument('--duration', type=float, default=10, help='各段階の計測秒数')
+        parser.add_argument('--path', default='/api/block-categories/', help='リクエストするパス')
+        parser.add_argument('--method', default='GET', choices=['GET', 'POST'], help='HTTP メソッド')
+        parser.add_argument('--data', default='', help='POST 時のフォームデータ（例: answer=1）')
+        parser.add_argument('--json', dest='json_body', help='POST 時の JSON ボディ')
+        parser.add_argument('--username', required=True, help='ログインするユーザー')
+        parser.add_argument('--password', required=True, help='パスワード')
+        parser.add_argument('--output', metavar='PATH', help='結果を JSON で保存')
+
+    def _build_request(self, url, options, cookies):
+        lines = [
+            f"{options['method']} {options['path']} HTTP/1.1",
+            f'Host: {url.netloc}',
+            'Connection: keep-alive',
+            'Cookie: ' + '; '.join(f'{k}={v}' for k, v in cookies.items()),
+        ]
+        body = b''
+        if options['method'] == 'POST':
+            if options['json_body']:
+                body = options['json_body'].encode()
+                lines.append('Content-Type: application/json')
+            else:
+                body = options['data'].encode()
+                lines.append('Content-Type: application/x-www-form-urlencoded')
+            lines.append(f"X-CSRFToken: {cookies.get('csrftoken', '')}")
+            lines.append(f'Referer: {url.scheme}://{url.netloc}/')
+        lines.append(f'Content-Length: {len(body)}')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        results = {}
+
+        for target in options['target']:
+            name, sep, base_url = target.partition('=')
+            if not sep:
+                raise CommandError(f'--target は NAME=URL の形式で指定してください: {target}')
+            base_url = base_url.rstrip('/')
+            url = urllib.parse.urlsplit(base_url)
+            if url.scheme != 'http':
+                raise CommandError('http:// の URL のみ対応しています')
+
+            cookies = login_cookies(base_url, options['username'], options['password'])
+            request_bytes = self._build_request(url, options, cookies)
+
+            self.stdout.write(f'== {name} ({base_url}{options["path"]})')
+            self.stdout.write(f"{'conns':>6}{'req/s':>10}{'err%':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+            results[name] = {}
+            for concurrency in levels:
+                latencies, errors = asyncio.run(
+                    run_level(url, request_bytes, concurrency, options['duration'])
+                )
+                stats = summarize(latencies)
+                attempts = len(latencies) + errors.count(0)
+                stats['throughput'] = len(latencies) / options['duration']
+                stats['error_rate'] = len(errors) / attempts if attempts else 0.0
+                results[name][str(concurrency)] = stats
+                self.stdout.write(
+                    f"{concurrency:>6}{stats['throughput']:>10.1f}{stats['error_rate'] * 100:>7.1f}%"
+                    f"{stats['p50']:>8.1f}ms{stats['p95']:>8.1f}ms{stats['p99']:>8.1f}ms"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"結果を保存しました: {options['output']}"))
@@ -0,0 +1,199 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from tutorial.perf import summarize, load_baseline, save_baseline, compare_to_baseline
+
+# 規模ごとのコンテンツ量
+SIZES = {
+    'small': {'questions': 10, 'blanks': 2, 'alternatives': 2, 'badges': 5, 'blocks': 5},
+    'medium': {'questions': 50, 'blanks': 5, 'alternatives': 3, 'badges': 20, 'blocks': 50},
+    'large': {'questions': 200, 'blanks': 10, 'alternatives': 5, 'badges': 100, 'blocks': 500},
+}
+
+BLOCK_TYPES = ['data_model', 'view', 'url', 'template', 'admin']
+
+
+class Command(BaseCommand):
+    help = '採点・経験値・バッジ判定などのロジックをインメモリ DB 上で計測（実行時間とクエリ数）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='small,medium,large',
+            help=f"計測する規模（カンマ区切り: {', '.join(SIZES)}）",
+        )
+        parser.add_argument('--iterations', type=int, default=50, help='ケースごとの計測回数（デフォルト50回）')
+        parser.add_argument('--save-baseline', metavar='PATH', help='結果をベースラインとして保存')
+        parser.add_argument('--baseline', metavar='PATH', help='比較するベースラインファイル')
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='ベースラインからの悪化許容率（デフォルト0.25 = 25%%）',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in SIZES]
+        if unknown:
+            raise CommandError(f"不明な規模です: {', '.join(unknown)}")
+
+        # テスト用 DB（SQLite ではインメモリ）を作成し、本番データには触れない
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = {}
+            for size in sizes:
+                with transaction.atomic():
+                    fixture = self._build_fixture(size, SIZES[size])
+                    results.update(self._run_cases(size, fixture, options['iterations']))
+                    transaction.set_rollback(True)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for case, stats in results.items():
+            self.stdout.write(
+                f"{case:<44} p50={stats['p50']:.3f}ms p95={stats['p95']:.3f}ms queries={stats['queries']}"
+            )
+
+        if options['baseline']:
+            baseline = load_baseline(options['baseline'])
+            regressions = compare_to_baseline(results, baseline, options['threshold'], ['p50', 'queries'])
+            for case, metric, base, current, change in regressions:
+                self.stdout.write(self.style.WARNING(
+                    f'{case}.{metric}: {base:g} -> {current:g} ({change * 100:+.1f}%)'
+                ))
+            if regressions:
+                raise CommandError(
+                    'ベースラインより悪化したケースがあります: '
+                    + ', '.join(f'{case}.{metric}' for case, metric, *_ in regressions)
+                )
+
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"ベースラインを保存しました: {options['save_baseline']}"))
+
+    # ==================== データ準備 ====================
+
+    def _build_fixture(self, size, spec):
+        from tutorial.models import Chapter, Question, Choice, Badge, BuildingBlock
+
+        chapter = Chapter.objects.create(title=f'bench {size}', description='bench', order=0)
+
+        difficulties = ['easy', 'medium', 'hard']
+        questions = Question.objects.bulk_create([
+            Question(
+                chapter=chapter,
+                question_type=['choice', 'fill', 'multi_fill'][i % 3],
+                question_text=f'bench question {i}',
+                order=i,
+                difficulty=difficulties[i % 3],
+            )
+            for i in range(spec['questions'])
+        ])
+        choice_q, fill_q, multi_q = questions[0], questions[1], questions[2]
+
+        choices = [
+            Choice(question=choice_q, choice_text=f'choice {i}', is_correct=i == 0, order=i)
+            for i in range(4)
+        ]
+        choices += [
+            Choice(question=fill_q, choice_text=f'answer {i}', is_correct=True, order=i)
+            for i in range(spec['alternatives'])
+        ]
+        choices += [
+            Choice(question=multi_q, choice_text=f'blank{b} answer {i}', is_correct=True, order=i, blank_index=b)
+            for b in range(spec['blanks'])
+            for i in range(spec['alternatives'])
+        ]
+        Choice.objects.bulk_create(choices)
+
+        # 半分のバッジは条件を満たすようにする
+        Badge.objects.bulk_create([
+            Badge(
+                name=f'bench badge {i}', description='bench',
+                required_experience=(i % 2) * 100000, required_level=1, order=i,
+            )
+            for i in range(spec['badges'])
+        ])
+
+        blocks = BuildingBlock.objects.bulk_create([
+            BuildingBlock(
+                name=f'bench block {i}', block_type=BLOCK_TYPES[i % len(BLOCK_TYPES)],
+                description='bench', code_snippet=f'# block {i}\n' + 'x = 1\n' * 20, order=i,
+            )
+            for i in range(spec['blocks'])
+        ])
+
+        user = User.objects.create(username=f'bench_{size}')
+        profile = user.userprofile
+        profile.experience = 5000
+        profile.level = profile.calculate_level()
+        profile.save()
+
+        return {
+            'chapter': chapter,
+            'choice_question': choice_q,
+            'correct_choice_id': str(Choice.objects.get(question=choice_q, is_correct=True).id),
+            'fill_question': fill_q,
+            'multi_question': multi_q,
+            'multi_answer': ','.join(f'blank{b} answer 0' for b in range(spec['blanks'])),
+            'profile': profile,
+            'architecture': [
+                {'block_type': block.block_type, 'block_name': block.name, 'code_snippet': block.code_snippet}
+                for block in blocks
+            ],
+        }
+
+    # ==================== 計測 ====================
+
+    def _measure(self, func, iterations, rollback=False):
+        """func を繰り返し実行し、実行時間（ms）の統計と 1 回あたりの最大クエリ数を返す"""
+        samples, queries = [], 0
+        # 1 回目はウォームアップとして捨てる
+        for iteration in range(iterations + 1):
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    func()
+                    elapsed = time.perf_counter() - started
+                if rollback:
+                    # 書き込みを伴うケースは毎回同じ状態から計測する
+                    transaction.set_rollback(True)
+            if iteration == 0:
+                continue
+            samples.append(elapsed * 1000)
+            queries = max(queries, len(captured.captured_queries))
+        stats = summarize(samples)
+        stats['queries'] = queries
+        return stats
+
+    def _run_cases(self, size, fixture, iterations):
+        from tutorial.models import calculate_experience_for_chapter
+        from tutorial.views import generate_code_from_architecture
+
+        profile = fixture['profile']
+        cases = {
+            'validate_answer.choice': lambda: fixture['choice_question'].validate_answer(
+                fixture['correct_choice_id'], 'choice'),
+            'validate_answer.fill': lambda: fixture['fill_question'].validate_answer('answer 0', 'fill'),
+            'validate_answer.multi_fill': lambda: fixture['multi_question'].validate_answer(
+                fixture['multi_answer'], 'multi_fill'),
+            'get_correct_answers_by_blank': fixture['multi_question'].get_correct_answers_by_blank,
+            'calculate_level': profile.calculate_level,
+            'calculate_experience_for_chapter': lambda: calculate_experience_for_chapter(fixture['chapter']),
+            'generate_code_from_architecture': lambda: generate_code_from_architecture(fixture['architecture']),
+        }
+        writing_cases = {
+            'award_experience': lambda: profile.award_experience(10, 'bench'),
+            'check_and_award_badges': profile.check_and_award_badges,
+        }
+
+        results = {}
+        for name, func in cases.items():
+            results[f'{name}[{size}]'] = self._measure(func, iterations)
+        for name, func in writing_cases.items():
+            results[f'{name}[{size}]'] = self._measure(func, iterations, rollback=True)
+        return results
@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tutorial.perf import summarize, load_baseline, save_baseline, compare_to_baseline
+
+# 子プロセスで実行する起動処理（gunicorn ワーカーの WSGI アプリ読み込みと同等）
+BOOT_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+boot = time.perf_counter() - t0
+from django.db import connections
+db_connected = any(c.connection is not None for c in connections.all(initialized_only=True))
+print(json.dumps({'boot': boot, 'db_connected': db_connected}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'ワーカー起動（WSGI アプリ読み込み）の所要時間を計測'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10, help='計測回数（デフォルト10回）')
+        parser.add_argument('--save-baseline', metavar='PATH', help='結果をベースラインとして保存')
+        parser.add_argument('--baseline', metavar='PATH', help='比較するベースラインファイル')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='ベースラインからの悪化許容率（デフォルト0.2 = 20%%）',
+        )
+
+    def handle(self, *args, **options):
+        # manage.py が設定した DJANGO_SETTINGS_MODULE をそのまま子プロセスに渡す
+        env = dict(os.environ)
+
+        boot_ms, process_ms = [], []
+        db_connected_runs = 0
+
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, '-c', BOOT_SCRIPT],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            elapsed = time.perf_counter() - started
+            if proc.returncode != 0:
+                raise CommandError(f'起動に失敗しました:\n{proc.stderr}')
+
+            # ready() が標準出力に何か書いていても最後の行だけを読む
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            boot_ms.append(result['boot'] * 1000)
+            process_ms.append(elapsed * 1000)
+            if result['db_connected']:
+                db_connected_runs += 1
+
+        results = {
+            'wsgi_boot': summarize(boot_ms),
+            'process_start': summarize(process_ms),
+        }
+
+        for case, stats in results.items():
+            self.stdout.write(
+                f"{case:<14} mean={stats['mean']:.1f}ms p50={stats['p50']:.1f}ms "
+                f"p95={stats['p95']:.1f}ms max={stats['max']:.1f}ms"
+            )
+        if db_connected_runs:
+            self.stdout.write(self.style.WARNING(
+                f'起動中にデータベース接続が開かれました（{db_connected_runs}/{options["runs"]} 回）'
+            ))
+        else:
+            self.stdout.write('起動中のデータベース接続: なし')
+
+        if options['baseline']:
+            baseline = load_baseline(options['baseline'])
+            for case, stats in results.items():
+                base = baseline.get(case)
+                if base:
+                    change = (stats['p50'] - base['p50']) / base['p50'] * 100 if base['p50'] else 0
+                    self.stdout.write(f"{case:<14} p50 {base['p50']:.1f}ms -> {stats['p50']:.1f}ms ({change:+.1f}%)")
+            regressions = compare_to_baseline(results, baseline, options['threshold'], ['p50'])
+            if regressions:
+                raise CommandError(
+                    '起動時間がベースラインより悪化しました: '
+                    + ', '.join(f'{case}.{metric}' for case, metric, *_ in regressions)
+                )
+
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"ベースラインを保存しました: {options['save_baseline']}"))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tutorial.dataio import DEFAULT_EXCLUDES, resolve_models, export_models
+
+
+class Command(BaseCommand):
+    help = 'モデルごとの JSON Lines（依存関係順）にデータをストリーミングでエクスポート'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='出力先ディレクトリ')
+        parser.add_argument(
+            'labels', nargs='*', default=['auth.user', 'tutorial'],
+            help='対象（app_label または app_label.ModelName、デフォルト: auth.user tutorial）',
+        )
+        parser.add_argument(
+            '-e', '--exclude', action='append', default=[],
+            help='除外するアプリまたはモデル（複数指定可）',
+        )
+        parser.add_argument(
+            '--include-logs', action='store_true',
+            help=f"既定で除外している {', '.join(DEFAULT_EXCLUDES)} も出力する",
+        )
+        parser.add_argument('--batch-size', type=int, default=2000, help='1回に読み込む件数')
+
+    def handle(self, *args, **options):
+        excludes = list(options['exclude'])
+        if not options['include_logs']:
+            excludes += DEFAULT_EXCLUDES
+
+        try:
+            models = resolve_models(options['labels'], excludes)
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        manifest = export_models(
+            models, options['directory'], batch_size=options['batch_size'],
+            progress=lambda label, count: self.stdout.write(f'  {label}: {count}件'),
+        )
+        total = sum(entry['count'] for entry in manifest['models'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(manifest['models'])}モデル・{total}件をエクスポートしました"
+            f"（{time.perf_counter() - started:.1f}秒）: {options['directory']}"
+        ))
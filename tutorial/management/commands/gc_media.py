@@ -0,0 +1,176 @@
+import os
+import posixpath
+import re
+import time
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from tutorial.models import StudyGuide, StudyGuideAttachment
+from tutorial.storage import CONTENT_ADDRESSED_NAME_RE, blob_dir, content_addressed_storage
+
+# 内容アドレスのストレージに保存するディレクトリ（--import-existing / --delete-legacy の対象）
+UPLOAD_DIRS = ('study_guide_zips', 'study_guide_images')
+
+
+def _media_url_re():
+    return re.compile(re.escape(settings.MEDIA_URL) + r'''([^"'\s<>)?#]+)''')
+
+
+class Command(BaseCommand):
+    help = '内容アドレスのメディアストレージから、どこからも参照されていないファイルと実体を削除'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='削除せずに対象だけを表示')
+        parser.add_argument(
+            '--import-existing', action='store_true',
+            help='従来の名前（functions_study_aRLSC3i.zip など）で保存された添付・ガイド画像を取り込んで重複排除する',
+        )
+        parser.add_argument(
+            '--delete-legacy', action='store_true',
+            help=f'{", ".join(UPLOAD_DIRS)} 内の参照されていない従来の名前のファイルも削除する',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.storage = content_addressed_storage
+        self.root = self.storage.path('')
+        self.freed = 0
+
+        if options['import_existing']:
+            self.import_existing()
+
+        referenced = self.referenced_names()
+        # 保存直後のファイルは、ガイドの編集中などでまだ参照が保存されていないことがある
+        self.cutoff = time.time() - getattr(settings, 'TUTORIAL_BLOB_GC_GRACE_SECONDS', 3600)
+        removed_inodes = {}
+        names_removed = 0
+        legacy_removed = 0
+        for name, path in self.walk(exclude=blob_dir()):
+            if name in referenced:
+                continue
+            if CONTENT_ADDRESSED_NAME_RE.match(name):
+                stat = os.stat(path)
+                if stat.st_mtime > self.cutoff:
+                    continue
+                inode = (stat.st_dev, stat.st_ino)
+                removed_inodes[inode] = removed_inodes.get(inode, 0) + 1
+                names_removed += 1
+                self.remove(path, name, freed=0 if stat.st_nlink > 1 else stat.st_size)
+            elif options['delete_legacy'] and name.split('/', 1)[0] in UPLOAD_DIRS:
+                legacy_removed += 1
+                self.remove(path, name, freed=os.stat(path).st_size)
+
+        blobs_removed = self.collect_blobs(removed_inodes)
+        if not self.dry_run:
+            self.remove_empty_dirs()
+
+        prefix = '（dry-run）' if self.dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}未参照の名前 {names_removed} 件・従来のファイル {legacy_removed} 件・'
+            f'実体 {blobs_removed} 件を削除（{self.freed / 1024:.1f} KB）'
+        ))
+
+    # ==================== 参照 ====================
+
+    def referenced_names(self):
+        """DB から参照されているストレージ上の名前（添付ファイルとガイド本文中の画像）"""
+        names = set(
+            StudyGuideAttachment.objects.exclude(file='').values_list('file', flat=True)
+        )
+        media_url_re = _media_url_re()
+        for content in StudyGuide.objects.values_list('content', flat=True):
+            names.update(unquote(match) for match in media_url_re.findall(content or ''))
+        return names
+
+    def import_existing(self):
+        """従来の名前のファイルを内容アドレスの名前に保存し直し、参照を書き換える"""
+        imported = 0
+        for attachment in StudyGuideAttachment.objects.exclude(file=''):
+            name = attachment.file.name
+            new_name = self.import_file(name)
+            if new_name:
+                imported += 1
+                if not self.dry_run:
+                    attachment.file.name = new_name
+                    attachment.save(update_fields=['file'])
+
+        media_url_re = _media_url_re()
+        for guide in StudyGuide.objects.all():
+            content = guide.content or ''
+            replacements = {}
+            for match in set(media_url_re.findall(content)):
+                name = unquote(match)
+                if name.split('/', 1)[0] not in UPLOAD_DIRS:
+                    continue
+                new_name = self.import_file(name)
+                if new_name:
+                    replacements[settings.MEDIA_URL + match] = self.storage.url(new_name)
+            imported += len(replacements)
+            if replacements and not self.dry_run:
+                for old, new in replacements.items():
+                    content = content.replace(old, new)
+                guide.content = content
+                guide.save(update_fields=['content', 'updated_at'])
+
+        self.stdout.write(f'{"（dry-run）" if self.dry_run else ""}従来の名前の参照を {imported} 件取り込みました')
+
+    def import_file(self, name):
+        """
+        name を内容アドレスのストレージに保存して新しい名前を返す（対象外・見つからない場合は None）
+        dry-run では保存せずに name をそのまま返す
+        """
+        if CONTENT_ADDRESSED_NAME_RE.match(name) or not self.storage.exists(name):
+            return None
+        if self.dry_run:
+            self.stdout.write(f'  取り込み: {name}')
+            return name
+        directory, filename = posixpath.split(name)
+        with self.storage.open(name, 'rb') as f:
+            return self.storage.save(posixpath.join(directory, filename), File(f, name=filename))
+
+    # ==================== 削除 ====================
+
+    def walk(self, exclude):
+        """ストレージ内のファイルを (名前, パス) で列挙する（exclude ディレクトリは除く）"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            relative = os.path.relpath(dirpath, self.root).replace(os.sep, '/')
+            if relative == '.':
+                relative = ''
+                dirnames[:] = [d for d in dirnames if d != exclude]
+            for filename in filenames:
+                yield posixpath.join(relative, filename), os.path.join(dirpath, filename)
+
+    def remove(self, path, name, freed):
+        self.stdout.write(f'  削除: {name}')
+        self.freed += freed
+        if not self.dry_run:
+            os.unlink(path)
+
+    def collect_blobs(self, removed_inodes):
+        """どの名前からもリンクされていない実体と、残った一時ファイルを削除する"""
+        root = self.storage.path(blob_dir())
+        removed = 0
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                if stat.st_mtime > self.cutoff:
+                    continue
+                # dry-run では名前を削除していないので、削除予定の名前のリンクを差し引いて判定する
+                links = stat.st_nlink
+                if self.dry_run:
+                    links -= removed_inodes.get((stat.st_dev, stat.st_ino), 0)
+                if filename.endswith('.upload') or links <= 1:
+                    removed += 1
+                    self.remove(path, os.path.relpath(path, self.root), freed=stat.st_size)
+        return removed
+
+    def remove_empty_dirs(self):
+        """空になった <upload_to>/<SHA-256>/ と実体のディレクトリを削除する（最上位のディレクトリは残す）"""
+        for dirpath, dirnames, filenames in os.walk(self.root, topdown=False):
+            relative = os.path.relpath(dirpath, self.root)
+            if os.sep in relative and not os.listdir(dirpath):
+                os.rmdir(dirpath)
@@ -0,0 +1,315 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from tutorial.dataio import explicit_timestamps
+from tutorial.models import (
+    Chapter, ChapterStudyTime, Question, Choice, UserProgress, WrongAnswer,
+    ChapterResult, UserProfile, Badge, UserBadge, BuildingBlock, ArchitectureSlot,
+    UserArchitecture
+)
+from tutorial.wrong_answers import history_limit
+
+WORDS = [
+    'model', 'view', 'template', 'url', 'form', 'queryset', 'migration', 'admin',
+    'middleware', 'signal', 'cache', 'session', 'request', 'response', 'field',
+]
+
+
+class BatchWriter:
+    """一定件数ごとに bulk_create で書き込むバッファ"""
+
+    def __init__(self, model, batch_size, timestamp_fields=(), keep=False):
+        self.model = model
+        self.batch_size = batch_size
+        self.timestamp_fields = timestamp_fields
+        self.keep = keep
+        self.pending = []
+        self.created = []
+        self.total = 0
+
+    def add(self, obj):
+        self.pending.append(obj)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.timestamp_fields:
+            with explicit_timestamps(self.model, *self.timestamp_fields):
+                created = self.model.objects.bulk_create(self.pending, batch_size=self.batch_size)
+        else:
+            created = self.model.objects.bulk_create(self.pending, batch_size=self.batch_size)
+        self.total += len(created)
+        if self.keep:
+            # 主キーを後続の生成で使う
+            self.created += created
+        self.pending = []
+
+
+class Command(BaseCommand):
+    help = '性能検証用の合成データ（ユーザー・チャプター・問題・学習履歴など）を一括生成'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='生成するユーザー数')
+        parser.add_argument('--chapters', type=int, default=100, help='生成するチャプター数')
+        parser.add_argument('--questions-per-chapter', type=int, default=15, help='チャプターあたりの問題数')
+        parser.add_argument('--max-blanks', type=int, default=4, help='複数空欄問題の最大空欄数')
+        parser.add_argument('--sessions-per-user', type=int, default=60, help='ユーザーあたりの学習セッション数')
+        parser.add_argument('--months', type=int, default=6, help='学習履歴を分散させる期間（月）')
+        parser.add_argument('--progress-per-user', type=int, default=20, help='ユーザーあたりの進捗チャプター数')
+        parser.add_argument('--wrong-answers-per-user', type=int, default=40, help='ユーザーあたりの誤答回数（同じ問題への誤答は 1 行に集約）')
+        parser.add_argument('--results-per-user', type=int, default=20, help='ユーザーあたりのチャプター結果数')
+        parser.add_argument('--badges', type=int, default=10, help='生成するバッジ数')
+        parser.add_argument('--architectures-per-user', type=int, default=2, help='ユーザーあたりの追加アーキテクチャ図数')
+        parser.add_argument('--batch-size', type=int, default=5000, help='bulk_create のバッチサイズ')
+        parser.add_argument('--prefix', default='synth', help='生成するユーザー名・タイトルの接頭辞')
+        parser.add_argument('--password', default='synth-pass', help='生成ユーザーのパスワード')
+        parser.add_argument('--seed', type=int, default=42, help='乱数シード（同じ値で同じデータを生成）')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            chapter_ids = self._create_chapters(options)
+            questions = self._create_questions(options, chapter_ids)
+            badge_ids = self._create_badges(options)
+
+        self._create_users(options, chapter_ids, questions, badge_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'合成データの生成が完了しました（{time.perf_counter() - started:.1f}秒）'
+        ))
+
+    def _report(self, label, count):
+        self.stdout.write(f'  {label}: {count}件')
+
+    # ==================== コンテンツ ====================
+
+    def _create_chapters(self, options):
+        start_order = (Chapter.objects.order_by('-order').values_list('order', flat=True).first() or 0) + 1
+        writer = BatchWriter(Chapter, self.batch_size, keep=True)
+        for i in range(options['chapters']):
+            writer.add(Chapter(
+                title=f"{options['prefix']} チャプター {start_order + i}",
+                description='合成データ用のチャプター',
+                order=start_order + i,
+            ))
+        writer.flush()
+        self._report('チャプター', writer.total)
+        return [chapter.id for chapter in writer.created]
+
+    def _create_questions(self, options, chapter_ids):
+        """問題と選択肢を生成し、{チャプターID: [(問題ID, 問題タイプ)]} を返す"""
+        question_writer = BatchWriter(Question, self.batch_size, keep=True)
+        specs = []
+        for chapter_id in chapter_ids:
+            for order in range(options['questions_per_chapter']):
+                question_type = self.rng.choice(['choice', 'fill', 'multi_fill'])
+                blanks = self.rng.randint(2, max(options['max_blanks'], 2)) if question_type == 'multi_fill' else 1
+                specs.append((question_type, blanks))
+                question_writer.add(Question(
+                    chapter_id=chapter_id,
+                    question_type=question_type,
+                    question_text=f'合成問題 {order + 1}: ' + ' ____ '.join(self.rng.sample(WORDS, blanks + 1)),
+                    order=order,
+                    explanation='合成データ用の解説',
+                    difficulty=self.rng.choice(['easy', 'medium', 'hard']),
+                ))
+
+        question_writer.flush()
+
+        choice_writer = BatchWriter(Choice, self.batch_size)
+        questions = {}
+        for question, (question_type, blanks) in zip(question_writer.created, specs):
+            questions.setdefault(question.chapter_id, []).append((question.id, question_type))
+            if question_type == 'choice':
+                correct = self.rng.randrange(4)
+                for order, word in enumerate(self.rng.sample(WORDS, 4)):
+                    choice_writer.add(Choice(
+                        question_id=question.id, choice_text=word, is_correct=order == correct, order=order,
+                    ))
+            else:
+                # 空欄ごとに 1〜2 個の正解（別解）を用意する
+                for blank_index in range(blanks):
+                    for order, word in enumerate(self.rng.sample(WORDS, self.rng.randint(1, 2))):
+                        choice_writer.add(Choice(
+                            question_id=question.id, choice_text=word, is_correct=True,
+                            order=order, blank_index=blank_index,
+                        ))
+        choice_writer.flush()
+
+        self._report('問題', question_writer.total)
+        self._report('選択肢／解答', choice_writer.total)
+        return questions
+
+    def _create_badges(self, options):
+        writer = BatchWriter(Badge, self.batch_size, keep=True)
+        for i in range(options['badges']):
+            writer.add(Badge(
+                name=f"{options['prefix']} バッジ {i + 1}",
+                description='合成データ用のバッジ',
+                badge_type=self.rng.choice(['level', 'achievement', 'special']),
+                required_experience=i * 100,
+                required_chapters=i,
+                order=1000 + i,
+            ))
+        writer.flush()
+        self._report('バッジ', writer.total)
+        return [badge.id for badge in writer.created]
+
+    # ==================== ユーザーと学習履歴 ====================
+
+    def _create_users(self, options, chapter_ids, questions, badge_ids):
+        prefix = options['prefix']
+        offset = User.objects.filter(username__startswith=f'{prefix}_').count()
+        # パスワードのハッシュ化は遅いので全ユーザーで共有する
+        password_hash = make_password(options['password'])
+
+        slot_ids = list(ArchitectureSlot.objects.values_list('id', flat=True))
+        block_ids = list(BuildingBlock.objects.values_list('id', flat=True))
+
+        writers = {
+            'profiles': BatchWriter(UserProfile, self.batch_size),
+            'architectures': BatchWriter(UserArchitecture, self.batch_size),
+            'sessions': BatchWriter(ChapterStudyTime, self.batch_size),
+            'progress': BatchWriter(UserProgress, self.batch_size),
+            'wrong_answers': BatchWriter(WrongAnswer, self.batch_size, ('created_at',)),
+            'results': BatchWriter(ChapterResult, self.batch_size, ('created_at',)),
+            'badges': BatchWriter(UserBadge, self.batch_size, ('unlocked_at',)),
+        }
+
+        remaining = options['users']
+        while remaining > 0:
+            chunk = min(remaining, self.batch_size)
+            with transaction.atomic():
+                # bulk_create は post_save を送らないため、プロファイルとアーキテクチャ図もここで作る
+                users = User.objects.bulk_create([
+                    User(
+                        username=f'{prefix}_{offset + i}',
+                        password=password_hash,
+                        date_joined=self.now - timedelta(days=self.rng.randint(0, options['months'] * 30)),
+                    )
+                    for i in range(chunk)
+                ])
+                for user in users:
+                    self._populate_user(user, options, chapter_ids, questions, badge_ids, slot_ids, block_ids, writers)
+                for writer in writers.values():
+                    writer.flush()
+            offset += chunk
+            remaining -= chunk
+            self.stdout.write(f'  ユーザー: {options["users"] - remaining}/{options["users"]}')
+
+        labels = {
+            'profiles': 'ユーザープロファイル', 'architectures': 'アーキテクチャ図',
+            'sessions': '学習セッション', 'progress': '進捗', 'wrong_answers': '誤答',
+            'results': 'チャプター結果', 'badges': 'ユーザーバッジ',
+        }
+        for key, writer in writers.items():
+            self._report(labels[key], writer.total)
+
+    def _random_time(self, months):
+        return self.now - timedelta(seconds=self.rng.randint(0, months * 30 * 24 * 3600))
+
+    def _populate_user(self, user, options, chapter_ids, questions, badge_ids, slot_ids, block_ids, writers):
+        rng = self.rng
+        months = options['months']
+
+        studied = rng.sample(chapter_ids, min(options['progress_per_user'], len(chapter_ids)))
+        completed = [chapter_id for chapter_id in studied if rng.random() < 0.7]
+        experience = sum(rng.choice([10, 15, 20]) for _ in completed)
+
+        profile = UserProfile(
+            user_id=user.id,
+            experience=experience,
+            total_chapters_completed=len(completed),
+            chapters_with_experience=','.join(str(chapter_id) for chapter_id in completed),
+        )
+        profile.level = profile.calculate_level()
+        writers['profiles'].add(profile)
+
+        for i in range(options['architectures_per_user'] + 1):
+            assignments = {}
+            if slot_ids and block_ids:
+                for slot_id in rng.sample(slot_ids, rng.randint(0, len(slot_ids))):
+                    assignments[str(slot_id)] = rng.choice(block_ids)
+            writers['architectures'].add(UserArchitecture(
+                user_id=user.id,
+                name='マイアーキテクチャ図' if i == 0 else f'アーキテクチャ図 {i}',
+                slot_assignments=assignments,
+            ))
+
+        for chapter_id in studied:
+            done = chapter_id in completed
+            writers['progress'].add(UserProgress(
+                user_id=user.id,
+                chapter_id=chapter_id,
+                completed=done,
+                score=rng.randint(60, 100) if done else rng.randint(0, 59),
+                studied_guide=rng.random() < 0.5,
+                experience_awarded=done,
+                completed_at=self._random_time(months) if done else None,
+            ))
+
+        # 学習セッション（1割のユーザーは最後のセッションが進行中）
+        for i in range(options['sessions_per_user']):
+            start = self._random_time(months)
+            seconds = rng.randint(30, 3600)
+            active = i == 0 and rng.random() < 0.1
+            writers['sessions'].add(ChapterStudyTime(
+                user_id=user.id,
+                chapter_id=studied[i % len(studied)] if studied else rng.choice(chapter_ids),
+                start_time=start,
+                end_time=None if active else start + timedelta(seconds=seconds),
+                total_seconds=0 if active else seconds,
+            ))
+
+        candidates = [q for chapter_id in studied for q in questions.get(chapter_id, [])]
+        candidates = [q for chapter_id in studied for q in questions.get(chapter_id, [])]
+        attempts = {}
+        for _ in range(options['wrong_answers_per_user'] if candidates else 0):
+            question_id, question_type = rng.choice(candidates)
+            attempts.setdefault(question_id, []).append((self._random_time(months), rng.choice(WORDS)))
+        for question_id, rows in attempts.items():
+            rows.sort()
+            recent = []
+            for _, answer in reversed(rows):
+                if answer not in recent:
+                    recent.append(answer)
+            writers['wrong_answers'].add(WrongAnswer(
+                user_id=user.id,
+                question_id=question_id,
+                wrong_answer=rows[-1][1],
+                correct_answer=rng.choice(WORDS),
+                recent_wrong_answers=recent[:history_limit()],
+                attempt_count=len(rows),
+                created_at=rows[0][0],
+                last_wrong_at=rows[-1][0],
+            ))
+
+        for _ in range(options['results_per_user'] if studied else 0):
+            total = options['questions_per_chapter'] or 1
+            correct = rng.randint(0, total)
+            writers['results'].add(ChapterResult(
+                user_id=user.id,
+                chapter_id=rng.choice(studied),
+                correct_count=correct,
+                total_count=total,
+                accuracy=int(correct / total * 100),
+                created_at=self._random_time(months),
+            ))
+
+        for badge_id in rng.sample(badge_ids, rng.randint(0, len(badge_ids))):
+            writers['badges'].add(UserBadge(
+                user_id=user.id, badge_id=badge_id, unlocked_at=self._random_time(months),
+            ))
@@ -0,0 +1,61 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from tutorial import search
+from tutorial.dataio import DEFAULT_EXCLUDES, MANIFEST_NAME, import_models
+
+
+class Command(BaseCommand):
+    help = 'export_content で出力した JSON Lines を bulk_create で一括インポート（シグナルは発火しない）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='export_content の出力ディレクトリ')
+        parser.add_argument(
+            'labels', nargs='*',
+            help='インポートする対象（app_label または app_label.modelname、省略時はすべて）',
+        )
+        parser.add_argument(
+            '-e', '--exclude', action='append', default=[],
+            help='除外するアプリまたはモデル（複数指定可）',
+        )
+        parser.add_argument(
+            '--include-logs', action='store_true',
+            help=f"既定で除外している {', '.join(DEFAULT_EXCLUDES)} もインポートする",
+        )
+        parser.add_argument('--batch-size', type=int, default=2000, help='bulk_create の件数')
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='主キーなどが重複する行をスキップする（既存データへの追加用）',
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.exists(os.path.join(options['directory'], MANIFEST_NAME)):
+            raise CommandError(f"{MANIFEST_NAME} が見つかりません: {options['directory']}")
+
+        excludes = list(options['exclude'])
+        if not options['include_logs']:
+            excludes += DEFAULT_EXCLUDES
+
+        started = time.perf_counter()
+        try:
+            counts = import_models(
+                options['directory'], labels=options['labels'] or None, excludes=excludes,
+                batch_size=options['batch_size'], ignore_conflicts=options['ignore_conflicts'],
+                progress=lambda label, count: self.stdout.write(f'  {label}: {count}件'),
+            )
+        except IntegrityError as e:
+            raise CommandError(
+                f'インポートに失敗しました（変更はロールバックされました）: {e}\n'
+                '既存データと重複する場合は --ignore-conflicts を指定してください'
+            )
+
+        # bulk_create はシグナルを発火しないため、全文検索インデックスはまとめて作り直す
+        search.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(counts)}モデル・{sum(counts.values())}件をインポートしました'
+            f'（{time.perf_counter() - started:.1f}秒）'
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tutorial.question_import import PARSERS, QuestionImportError, build_plan, detect_format, parse
+
+
+class Command(BaseCommand):
+    help = 'CSV / Markdown の問題ファイルを検証し、問題と選択肢を一括でインポート（形式は tutorial/question_import.py を参照）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='インポートするファイル（.csv / .md）')
+        parser.add_argument('--format', choices=sorted(PARSERS), help='ファイル形式（省略時は拡張子で判定）')
+        parser.add_argument('--dry-run', action='store_true', help='書き込まずに追加・更新・削除の差分だけを表示')
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='ファイルに含まれるチャプターの、ファイルに無い問題を削除する（誤答・解答履歴も削除される）',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='bulk_create / bulk_update の件数')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(f"ファイルを読み込めません: {options['path']} ({e})")
+
+        try:
+            records = parse(text, options['format'] or detect_format(options['path']))
+            plan = build_plan(records, prune=options['prune'])
+        except QuestionImportError as e:
+            for error in e.errors:
+                self.stderr.write(f'  {error}')
+            raise CommandError(f'{len(e.errors)} 件のエラーがあるためインポートしませんでした')
+
+        if options['dry_run'] or options['verbosity'] >= 2:
+            for line in plan.diff_lines():
+                self.stdout.write(line)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'（dry-run）{plan.summary()}'))
+            return
+        if not plan.has_changes():
+            self.stdout.write(self.style.SUCCESS(f'変更はありません（{plan.summary()}）'))
+            return
+
+        plan.apply(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'インポートしました: {plan.summary()}'))
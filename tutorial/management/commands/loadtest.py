@@ -0,0 +1,357 @@
+import http.cookiejar
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tutorial.perf import summarize
+
+# chapter_detail の HTML から学習セッションと問題を読み取る
+SESSION_ID_RE = re.compile(r'\bsessionId: (\d+|null),')
+QUESTION_RE = re.compile(r'id="question-(\d+)"\s+data-question-type="(\w+)"')
+CHOICE_RE = re.compile(r'data-choice-id="(\d+)"')
+CHAPTER_LINK_RE = re.compile(r'href="/chapter/(\d+)/"')
+
+# 実際のフロントエンドと同じ自動保存間隔（秒）
+HEARTBEAT_INTERVAL = 30
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """リダイレクトを追わず、3xx をそのまま返す（エンドポイント単位で計測するため）"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Recorder:
+    """ステージ・エンドポイントごとのレイテンシとエラーを集計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage = None
+        self.samples = {}
+        self.errors = {}
+        self.parse_failures = {}
+
+    def record(self, endpoint, latency_ms, ok):
+        with self._lock:
+            key = (self.stage, endpoint)
+            self.samples.setdefault(key, []).append(latency_ms)
+            if not ok:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def parse_failed(self, what):
+        """ページから必要な値を読み取れなかった（テンプレートの変更で正規表現が合わなくなった）"""
+        with self._lock:
+            key = (self.stage, what)
+            self.parse_failures[key] = self.parse_failures.get(key, 0) + 1
+
+
+class Learner(threading.Thread):
+    """
+    1人の学習者をシミュレートするスレッド
+    ログイン → chapter_detail → 30秒ごとの update_study_time と submit_answer →
+    end_chapter_study → wrong_answers_book → level_profile を繰り返す
+    ハートビートは idle_ratio の割合で active=false（操作なし）として送る
+    """
+
+    def __init__(self, base_url, username, password, chapters, recorder, session_seconds, think_time,
+                 idle_ratio=0.0):
+        super().__init__(daemon=True)
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.chapters = chapters
+        self.recorder = recorder
+        self.session_seconds = session_seconds
+        self.think_time = think_time
+        self.idle_ratio = idle_ratio
+        self.stop_event = threading.Event()
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect
+        )
+
+    # ---------- HTTP ----------
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, endpoint, path, data=None, json_body=None, expect_json=False):
+        """リクエストを送り、(ステータス, 本文) を返す。計測結果は recorder に記録"""
+        headers = {'Referer': self.base_url + '/'}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if body is not None:
+            headers['X-CSRFToken'] = self._csrf_token()
+
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers)
+        started = time.perf_counter()
+        status, content = 0, b''
+        try:
+            with self.opener.open(req, timeout=60) as resp:
+                status, content = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, content = e.code, e.read()
+        except (urllib.error.URLError, OSError):
+            status = 0
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        ok = 200 <= status < 400
+        if ok and expect_json:
+            try:
+                ok = json.loads(content).get('success', True) is not False
+            except ValueError:
+                ok = False
+        self.recorder.record(endpoint, latency_ms, ok)
+        return status, content.decode('utf-8', errors='replace')
+
+    # ---------- シナリオ ----------
+
+    def login(self):
+        self.request('login_form', '/login/')
+        status, _ = self.request('login', '/login/', data={
+            'username': self.username,
+            'password': self.password,
+            'csrfmiddlewaretoken': self._csrf_token(),
+        })
+        return status == 302
+
+    def _answer_for(self, html, question_id, question_type):
+        block = html.split(f'id="question-{question_id}"', 1)[-1].split('class="question-item', 1)[0]
+        if question_type == 'choice':
+            choices = CHOICE_RE.findall(block)
+            return random.choice(choices) if choices else None
+        if question_type == 'multi_fill':
+            blanks = len(set(re.findall(rf'id="blank-{question_id}-(\d+)"', block))) or 1
+            return ','.join(f'answer{i}' for i in range(blanks))
+        return 'answer'
+
+    def study_chapter(self, chapter_id):
+        status, html = self.request('chapter_detail', f'/chapter/{chapter_id}/')
+        if status != 200:
+            return
+
+        match = SESSION_ID_RE.search(html)
+        if match is None:
+            self.recorder.parse_failed('session_id')
+        session_id = int(match.group(1)) if match and match.group(1) != 'null' else None
+        if session_id is None:
+            _, body = self.request(
+                'start_chapter_study', f'/chapter/{chapter_id}/start-study/', json_body={}, expect_json=True
+            )
+            try:
+                session_id = json.loads(body).get('study_session_id')
+            except ValueError:
+                session_id = None
+
+        questions = QUESTION_RE.findall(html)
+        if not questions and 'question-item' in html:
+            self.recorder.parse_failed('questions')
+        random.shuffle(questions)
+
+        # 回答は学習時間内に均等に散らし、30秒ごとにハートビートを送る
+        answer_times = [
+            self.session_seconds * (idx + 1) / (len(questions) + 1) for idx in range(len(questions))
+        ]
+        started = time.monotonic()
+        next_heartbeat = HEARTBEAT_INTERVAL
+        pending = list(zip(answer_times, questions))
+
+        while not self.stop_event.is_set():
+            elapsed = time.monotonic() - started
+            if elapsed >= self.session_seconds:
+                break
+
+            if elapsed >= next_heartbeat and session_id:
+                self.request(
+                    'update_study_time', f'/chapter/{chapter_id}/update-study-time/',
+                    json_body={
+                        'study_session_id': session_id,
+                        'is_auto_save': True,
+                        'active': random.random() >= self.idle_ratio,
+                    },
+                    expect_json=True,
+                )
+                next_heartbeat += HEARTBEAT_INTERVAL
+
+            while pending and pending[0][0] <= elapsed:
+                _, (question_id, question_type) = pending.pop(0)
+                answer = self._answer_for(html, question_id, question_type)
+                if answer is not None:
+                    self.request(
+                        'submit_answer', f'/question/{question_id}/submit/',
+                        data={'answer': answer}, expect_json=True,
+                    )
+
+            wake_at = min([next_heartbeat, self.session_seconds] + [t for t, _ in pending[:1]])
+            self.stop_event.wait(max(wake_at - (time.monotonic() - started), 0.05))
+
+        # 停止要求が来ても学習セッションは閉じておく
+        self.request(
+            'end_chapter_study', f'/chapter/{chapter_id}/end-study/',
+            json_body={'study_session_id': session_id},
+            expect_json=True,
+        )
+
+    def run(self):
+        if not self.login():
+            return
+        while not self.stop_event.is_set():
+            self.study_chapter(random.choice(self.chapters))
+            if self.stop_event.is_set():
+                break
+            self.request('wrong_answers_book', '/wrong-answers/')
+            self.request('level_profile', '/profile/levels/')
+            self.stop_event.wait(self.think_time)
+
+
+def parse_stages(value):
+    """'10:60,25:120' を [(並行数, 秒数), ...] に変換"""
+    stages = []
+    for item in value.split(','):
+        try:
+            users, seconds = item.split(':')
+            stages.append((int(users), float(seconds)))
+        except ValueError:
+            raise CommandError(f'ステージの形式が不正です: {item}（例: 10:60,25:120）')
+    return stages
+
+
+class Command(BaseCommand):
+    help = '学習者のセッションを再現して負荷をかけ、エンドポイントごとのスループットとレイテンシを計測'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='対象サーバーの URL')
+        parser.add_argument(
+            '--stages', default='5:120,10:120,25:120',
+            help='同時学習者数と継続秒数のステージ（例: 5:120,10:120,25:120）',
+        )
+        parser.add_argument('--user-prefix', default='loadtest', help='テストユーザー名の接頭辞')
+        parser.add_argument('--password', default='loadtest-pass', help='テストユーザーのパスワード')
+        parser.add_argument('--create-users', action='store_true', help='不足しているテストユーザーを作成')
+        parser.add_argument('--chapters', help='対象チャプター ID（カンマ区切り、省略時はホームから取得）')
+        parser.add_argument('--session-seconds', type=float, default=300, help='1チャプターの学習時間（秒）')
+        parser.add_argument('--think-time', type=float, default=5, help='チャプター間の待ち時間（秒）')
+        parser.add_argument(
+            '--idle-ratio', type=float, default=0.2,
+            help='操作なし（active=false）として送るハートビートの割合（0〜1）',
+        )
+        parser.add_argument('--output', metavar='PATH', help='結果を JSON で保存')
+
+    def handle(self, *args, **options):
+        stages = parse_stages(options['stages'])
+        max_users = max(users for users, _ in stages)
+        usernames = [f"{options['user_prefix']}_{i}" for i in range(max_users)]
+
+        if options['create_users']:
+            created = self._create_users(usernames, options['password'])
+            self.stdout.write(f'テストユーザーを作成しました: {created}人')
+
+        recorder = Recorder()
+        chapters = self._resolve_chapters(options, usernames[0], recorder)
+
+        learners = []
+        results = {}
+        try:
+            for index, (users, seconds) in enumerate(stages):
+                stage_name = f'stage{index + 1}_{users}users'
+                recorder.stage = stage_name
+
+                # 並行数を増やす（減らす場合は余分な学習者を止める）
+                while len(learners) < users:
+                    learner = Learner(
+                        options['base_url'], usernames[len(learners)], options['password'], chapters,
+                        recorder, options['session_seconds'], options['think_time'], options['idle_ratio'],
+                    )
+                    learner.start()
+                    learners.append(learner)
+                while len(learners) > users:
+                    learners.pop().stop_event.set()
+
+                self.stdout.write(f'{stage_name}: {users}人で {seconds:.0f}秒 実行中...')
+                time.sleep(seconds)
+                results[stage_name] = self._report(recorder, stage_name, seconds)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('中断しました'))
+        finally:
+            for learner in learners:
+                learner.stop_event.set()
+            for learner in learners:
+                learner.join(timeout=30)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"結果を保存しました: {options['output']}"))
+
+    def _create_users(self, usernames, password):
+        # パスワードのハッシュ化は遅いので一度だけ行う
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        password_hash = make_password(password)
+        created = 0
+        for username in usernames:
+            if username not in existing:
+                User.objects.create(username=username, password=password_hash)
+                created += 1
+        return created
+
+    def _resolve_chapters(self, options, username, recorder):
+        if options['chapters']:
+            return [int(c) for c in options['chapters'].split(',')]
+
+        probe = Learner(options['base_url'], username, options['password'], [], Recorder(), 0, 0)
+        if not probe.login():
+            raise CommandError(
+                f'{username} でログインできません（--create-users でテストユーザーを作成してください）'
+            )
+        _, html = probe.request('home', '/')
+        chapters = sorted({int(c) for c in CHAPTER_LINK_RE.findall(html)})
+        if not chapters:
+            raise CommandError('ホームページからチャプターを取得できません（--chapters で指定してください）')
+        return chapters
+
+    def _report(self, recorder, stage_name, seconds):
+        stage_results = {}
+        self.stdout.write(
+            f"{'endpoint':<22}{'count':>7}{'req/s':>8}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}"
+        )
+        for (stage, endpoint), samples in sorted(recorder.samples.items(), key=lambda kv: str(kv[0])):
+            if stage != stage_name:
+                continue
+            stats = summarize(samples)
+            errors = recorder.errors.get((stage, endpoint), 0)
+            stats['throughput'] = stats['count'] / seconds if seconds else 0.0
+            stats['error_rate'] = errors / stats['count'] if stats['count'] else 0.0
+            stage_results[endpoint] = stats
+            self.stdout.write(
+                f"{endpoint:<22}{stats['count']:>7}{stats['throughput']:>8.2f}"
+                f"{stats['error_rate'] * 100:>6.1f}%"
+                f"{stats['p50']:>7.0f}ms{stats['p95']:>7.0f}ms{stats['p99']:>7.0f}ms"
+            )
+
+        # 読み取りに失敗したページがあれば計測が実際のブラウザと異なるので目立たせる
+        failures = {what: count for (stage, what), count in recorder.parse_failures.items() if stage == stage_name}
+        if failures:
+            stage_results['parse_failures'] = failures
+            self.stdout.write(self.style.ERROR(
+                'chapter_detail から読み取れませんでした（テンプレートの変更に loadtest の正規表現を合わせてください）: '
+                + ', '.join(f'{what} {count}回' for what, count in sorted(failures.items()))
+            ))
+        return stage_results
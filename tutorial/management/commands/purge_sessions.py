@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from tutorial.sessions import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = '期限切れのログインセッションを小分けの DELETE で削除（clearsessions の代わり）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='1 回の DELETE で削除する件数')
+
+    def handle(self, *args, **options):
+        purged = purge_expired_sessions(chunk_size=options['chunk_size'])
+        if purged:
+            self.stdout.write(self.style.SUCCESS(f'期限切れのセッションを {purged} 件削除しました'))
+        else:
+            self.stdout.write('期限切れのセッションはありません')
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tutorial import search
+
+
+class Command(BaseCommand):
+    help = '問題・学習ガイド・積木の全文検索インデックス（FTS5）を作り直す'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.WARNING('全文検索インデックスは SQLite でのみ利用できます'))
+            return
+        started = time.perf_counter()
+        counts = search.rebuild()
+        summary = '・'.join(f'{kind} {count}件' for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'全文検索インデックスを作り直しました: {summary}（{time.perf_counter() - started:.1f}秒）'
+        ))
@@ -0,0 +1,64 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from tutorial.backup import (
+    BackupError, create_snapshot, discard_verified, list_snapshots, restore_snapshot, verify_snapshot
+)
+from tutorial.management.commands.backup_db import sqlite_database_path
+
+
+class Command(BaseCommand):
+    help = 'backup_db のスナップショットを検証してデータベースに復元'
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', nargs='?', default='latest', help='スナップショットのパス（デフォルト: 最新）')
+        parser.add_argument(
+            '--dir', default=str(settings.TUTORIAL_BACKUP_DIR),
+            help=f'スナップショットのディレクトリ（デフォルト: {settings.TUTORIAL_BACKUP_DIR}）',
+        )
+        parser.add_argument('--verify-only', action='store_true', help='検証のみ行い、復元しない')
+        parser.add_argument('--no-safety-backup', action='store_true', help='復元前に現在のデータベースを退避しない')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive', help='確認しない')
+
+    def handle(self, *args, **options):
+        db_path = sqlite_database_path()
+
+        snapshot = options['snapshot']
+        if snapshot == 'latest':
+            snapshots = list_snapshots(options['dir'])
+            if not snapshots:
+                raise CommandError(f"スナップショットがありません: {options['dir']}")
+            snapshot = snapshots[0]
+        if not os.path.exists(snapshot):
+            raise CommandError(f'スナップショットが見つかりません: {snapshot}')
+
+        if options['verify_only']:
+            try:
+                raw_path = verify_snapshot(snapshot, options['dir'])
+            except BackupError as e:
+                raise CommandError(str(e))
+            discard_verified(raw_path)
+            self.stdout.write(self.style.SUCCESS(f'検証に成功しました: {snapshot}'))
+            return
+
+        if options['interactive']:
+            answer = input(f'{db_path} を {snapshot} の内容で置き換えます。よろしいですか？ [yes/no]: ')
+            if answer.strip().lower() != 'yes':
+                self.stdout.write('中止しました')
+                return
+
+        if not options['no_safety_backup']:
+            safety = create_snapshot(db_path, os.path.join(options['dir'], 'pre-restore'))
+            self.stdout.write(f'現在のデータベースを退避しました: {safety}')
+
+        # Django 側の接続を閉じてから書き戻す
+        connections.close_all()
+        try:
+            restore_snapshot(snapshot, db_path)
+        except BackupError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'復元しました: {snapshot}'))
@@ -0,0 +1,113 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from tutorial import tasks
+from tutorial.metrics import registry as metrics_registry
+
+# 定期ジョブの登録を確認する間隔（秒）
+SCHEDULE_INTERVAL = 30
+
+
+class Command(BaseCommand):
+    help = 'バックグラウンドジョブ（tutorial.tasks）を実行するワーカーを起動'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'TUTORIAL_JOB_WORKERS', 2),
+            help='ワーカープロセス数',
+        )
+        parser.add_argument('--batch', type=int, default=10, help='1 回に取り出すジョブ数')
+        parser.add_argument('--poll', type=float, default=1.0, help='ジョブが無いときの待機秒数')
+        parser.add_argument('--once', action='store_true', help='実行可能なジョブが無くなったら終了')
+        parser.add_argument(
+            '--purge-days', type=int, default=7,
+            help='完了してからこの日数が経ったジョブを起動時に削除（0 で削除しない）',
+        )
+
+    def handle(self, *args, **options):
+        requeued = tasks.requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f'実行中のまま残っていたジョブを {requeued} 件戻しました')
+        if options['purge_days']:
+            purged = tasks.purge_finished_jobs(options['purge_days'])
+            if purged:
+                self.stdout.write(f'完了済みジョブを {purged} 件削除しました')
+
+        if options['workers'] <= 1:
+            processed = self.work(options)
+            self.stdout.write(self.style.SUCCESS(f'{processed} 件のジョブを実行しました'))
+            return
+
+        # fork 前に接続を閉じ、子プロセスがそれぞれ接続を開くようにする
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=self.work, args=(options, i == 0), name=f'run_jobs-{i}')
+            for i in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"{options['workers']} 個のワーカーを起動しました")
+
+        def forward(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for process in processes:
+            process.join()
+
+    def work(self, options, schedule=True):
+        """
+        ジョブを取り出して実行するループ。実行した件数を返す
+        schedule が真のワーカーだけが定期ジョブをキューに追加する
+        """
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        worker = tasks.worker_id()
+        lock_timeout = getattr(settings, 'TUTORIAL_JOB_LOCK_TIMEOUT', 300)
+        last_requeue = time.monotonic()
+        last_schedule = 0.0
+        processed = 0
+
+        while not stopping:
+            close_old_connections()
+            if time.monotonic() - last_requeue > lock_timeout:
+                tasks.requeue_stale_jobs(lock_timeout)
+                last_requeue = time.monotonic()
+            if schedule and not options['once'] and time.monotonic() - last_schedule > SCHEDULE_INTERVAL:
+                tasks.schedule_periodic_jobs()
+                last_schedule = time.monotonic()
+
+            jobs = tasks.claim_jobs(worker, options['batch'])
+            if not jobs:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+                continue
+
+            for index, job in enumerate(jobs):
+                if stopping:
+                    # 停止要求を受けたら未実行のジョブをすぐ他のワーカーに渡す
+                    tasks.release_jobs(jobs[index:])
+                    break
+                tasks.run_job(job)
+                processed += 1
+
+        close_old_connections()
+        metrics_registry.flush()
+        return processed
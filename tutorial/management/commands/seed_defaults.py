@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from tutorial.seeding import seed_all
+
+
+class Command(BaseCommand):
+    help = 'デフォルトの架構図・スロット・アーキテクチャテンプレートを投入（冪等）'
+
+    def handle(self, *args, **options):
+        result = seed_all()
+
+        if result['diagram_created']:
+            self.stdout.write('架構図テンプレートを作成しました')
+        self.stdout.write(f"追加したコンポーネント: {result['components_created']} 件")
+        self.stdout.write(f"追加したスロット: {result['slots_created']} 件")
+        if result['template_created']:
+            self.stdout.write('デフォルトアーキテクチャテンプレートを作成しました')
+
+        self.stdout.write(self.style.SUCCESS('デフォルトデータの投入が完了しました'))
@@ -10,9 +10,9 @@ class Command(BaseCommand):
         ArchitectureSlot.objects.all().delete()
         self.stdout.write('Deleted existing architecture slots')
         
-        # Create new slots from views.py function
-        from tutorial.views import create_default_slots
-        create_default_slots()
+        # Create new slots from the declarative seeding spec
+        from tutorial.seeding import seed_default_slots
+        seed_default_slots()
         
         self.stdout.write(
             self.style.SUCCESS('Successfully updated architecture slots to match image structure')
@@ -0,0 +1,450 @@
+# metrics.py - ビュー単位のレイテンシ・DB 時間・キャッシュヒット率の計測
+"""
+リクエストごとに URL 名（urlpatterns の name）をラベルとして
+リクエスト数・レイテンシのヒストグラム・DB クエリ数と DB 時間を記録し、
+キャッシュのヒット／ミスやバックグラウンド処理の件数を名前ごとに数える。
+
+gunicorn の各ワーカーは自分の集計値を TUTORIAL_METRICS_DIR（既定は
+/dev/shm 配下）に「pid-起動時刻.json」のファイルとして定期的に（と終了時に）
+書き出し、metrics_view がそれらを合算して Prometheus のテキスト形式で返す。
+書き出すのはリクエストかカウンタを記録したプロセスだけで、migrate などの
+管理コマンドやテストのプロセスはファイルを作らない。
+ワーカー間でロックや共有カウンタを持たないため、計測が他のワーカーを
+待たせることはない。
+
+終了したワーカー（pid が存在しない、または同じ pid で新しいプロセスが
+起動している）のファイルは、collect() が retained.json の累計に加算してから
+削除する。再起動を繰り返してもファイルは増え続けず、カウンタも減らない。
+"""
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+# レイテンシのヒストグラム境界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNRESOLVED_VIEW = '<unresolved>'
+# 終了したワーカーの集計値を合算しておくファイル
+RETAINED_FILE = 'retained.json'
+
+
+def _metrics_dir():
+    default = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    path = getattr(settings, 'TUTORIAL_METRICS_DIR', None) or os.path.join(default, 'tutorial_metrics')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _new_view_stats():
+    return {
+        'count': 0,
+        'errors': 0,
+        'latency_sum': 0.0,
+        'buckets': [0] * len(LATENCY_BUCKETS),
+        'db_queries': 0,
+        'db_time': 0.0,
+    }
+
+
+class MetricsRegistry:
+    """プロセス内の集計値。定期的に pid ごとのファイルへ書き出す"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._cache = {}
+        self._counters = {}
+        self._pid = os.getpid()
+        self._started = time.time_ns()
+        self._last_flush = 0.0
+        # リクエストかカウンタを記録したか（記録していないプロセスはファイルを書き出さない）
+        self._recorded = False
+
+    def _check_fork(self):
+        # fork 後の子プロセスは親の集計値を引き継がない
+        if self._pid != os.getpid():
+            self._views = {}
+            self._cache = {}
+            self._counters = {}
+            self._pid = os.getpid()
+            self._started = time.time_ns()
+            self._last_flush = 0.0
+            self._recorded = False
+
+    def observe_request(self, view, latency, db_queries, db_time, error=False):
+        with self._lock:
+            self._check_fork()
+            self._recorded = True
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = _new_view_stats()
+            stats['count'] += 1
+            stats['latency_sum'] += latency
+            stats['db_queries'] += db_queries
+            stats['db_time'] += db_time
+            if error:
+                stats['errors'] += 1
+            for idx, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    stats['buckets'][idx] += 1
+                    break
+        self.maybe_flush()
+
+    def observe_cache(self, name, hit):
+        with self._lock:
+            self._check_fork()
+            stats = self._cache.setdefault(name, {'hits': 0, 'misses': 0})
+            stats['hits' if hit else 'misses'] += 1
+
+    def observe_count(self, name, amount):
+        if not amount:
+            return
+        with self._lock:
+            self._check_fork()
+            self._recorded = True
+            self._counters[name] = self._counters.get(name, 0) + amount
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                'pid': self._pid,
+                'started': self._started,
+                'views': {name: dict(stats, buckets=list(stats['buckets'])) for name, stats in self._views.items()},
+                'cache': {name: dict(stats) for name, stats in self._cache.items()},
+                'counters': dict(self._counters),
+            }
+
+    def maybe_flush(self):
+        interval = getattr(settings, 'TUTORIAL_METRICS_FLUSH_INTERVAL', 5)
+        now = time.monotonic()
+        if now - self._last_flush < interval:
+            return
+        self._last_flush = now
+        self.flush()
+
+    def flush(self):
+        """集計値をプロセスごとのファイルへアトミックに書き出す（リクエストもカウンタも記録していなければ何もしない）"""
+        data = self.snapshot()
+        if not self._recorded:
+            return
+        directory = _metrics_dir()
+        _write_json(directory, f"{data['pid']}-{data['started']}.json", data)
+
+
+def _write_json(directory, filename, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, os.path.join(directory, filename))
+
+
+registry = MetricsRegistry()
+# 最後の書き出し以降の集計値を、ワーカーの終了時（max_requests による再起動を含む）に残す
+atexit.register(registry.flush)
+
+
+def record_cache(name, hit):
+    """キャッシュのヒット／ミスを記録（name はキャッシュ用途ごとの名前）"""
+    registry.observe_cache(name, hit)
+
+
+def record_count(name, amount=1):
+    """処理件数などのカウンタを加算（バックグラウンドジョブからも使う）"""
+    registry.observe_count(name, amount)
+
+
+class _QueryTimer:
+    """リクエスト中のクエリ数と DB 時間の集計"""
+
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0.0
+
+
+# 現在のリクエストの計測器。ContextVar なので sync_to_async 経由で別スレッドの
+# 接続が実行したクエリ（非同期ビューの ORM 呼び出し）も同じリクエストに計上される
+_current_timer = ContextVar('tutorial_query_timer', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.count += 1
+        timer.elapsed += time.perf_counter() - start
+
+
+def _install_query_timer(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(_install_query_timer, dispatch_uid='tutorial_metrics_query_timer')
+
+
+class MetricsMiddleware:
+    """リクエストごとのレイテンシと DB 時間を URL 名で集計するミドルウェア（同期・非同期両対応）"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _finish(self, request, timer, start, error):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or UNRESOLVED_VIEW
+        registry.observe_request(
+            view, time.perf_counter() - start, timer.count, timer.elapsed, error=error
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timer = _QueryTimer()
+        token = _current_timer.set(timer)
+        start = time.perf_counter()
+        error = False
+        try:
+            response = self.get_response(request)
+            error = response.status_code >= 500
+            return response
+        except Exception:
+            error = True
+            raise
+        finally:
+            _current_timer.reset(token)
+            self._finish(request, timer, start, error)
+
+    async def __acall__(self, request):
+        timer = _QueryTimer()
+        token = _current_timer.set(timer)
+        start = time.perf_counter()
+        error = False
+        try:
+            response = await self.get_response(request)
+            error = response.status_code >= 500
+            return response
+        except Exception:
+            error = True
+            raise
+        finally:
+            _current_timer.reset(token)
+            self._finish(request, timer, start, error)
+
+
+# ==================== Prometheus エクスポート ====================
+
+def _empty_totals():
+    return {'views': {}, 'cache': {}, 'counters': {}}
+
+
+def _merge(totals, data):
+    """data（1 ワーカーのファイルまたは累計）の集計値を totals に加算する"""
+    for name, stats in data.get('views', {}).items():
+        total = totals['views'].setdefault(name, _new_view_stats())
+        for key in ('count', 'errors', 'latency_sum', 'db_queries', 'db_time'):
+            total[key] += stats.get(key, 0)
+        for idx, value in enumerate(stats.get('buckets', [])[:len(LATENCY_BUCKETS)]):
+            total['buckets'][idx] += value
+
+    for name, stats in data.get('cache', {}).items():
+        total = totals['cache'].setdefault(name, {'hits': 0, 'misses': 0})
+        total['hits'] += stats.get('hits', 0)
+        total['misses'] += stats.get('misses', 0)
+
+    for name, value in data.get('counters', {}).items():
+        totals['counters'][name] = totals['counters'].get(name, 0) + value
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _worker_files(directory):
+    """ワーカーのファイル名を {(pid, 起動時刻): ファイル名} で返す（起動時刻の無い旧形式の pid.json は 0）"""
+    files = {}
+    for filename in os.listdir(directory):
+        stem, ext = os.path.splitext(filename)
+        pid, _, started = stem.partition('-')
+        if ext != '.json' or not pid.isdigit() or not (started.isdigit() or started == ''):
+            continue
+        files[(int(pid), int(started or 0))] = filename
+    return files
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _directory_lock(directory, operation):
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        fcntl.flock(lock, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def retire_dead_workers(directory=None):
+    """
+    終了したワーカーのファイルを retained.json の累計に加算して削除し、削除した数を返す
+    pid が存在しないか、同じ pid でより新しく起動したプロセスのファイルがあれば終了したとみなす
+    """
+    directory = directory or _metrics_dir()
+    files = _worker_files(directory)
+    latest = {}
+    for pid, started in files:
+        latest[pid] = max(latest.get(pid, started), started)
+    dead = [
+        filename for (pid, started), filename in files.items()
+        if started < latest[pid] or not _pid_alive(pid)
+    ]
+    if not dead:
+        return 0
+
+    # 同時に実行された collect() が同じファイルを二重に加算しないよう、ロックを取って行う
+    with _directory_lock(directory, fcntl.LOCK_EX):
+        retained = _read_json(os.path.join(directory, RETAINED_FILE)) or _empty_totals()
+        retired = []
+        for filename in dead:
+            data = _read_json(os.path.join(directory, filename))
+            if data is not None:
+                _merge(retained, data)
+                retired.append(filename)
+        _write_json(directory, RETAINED_FILE, retained)
+        for filename in retired:
+            os.remove(os.path.join(directory, filename))
+    return len(retired)
+
+
+def collect():
+    """全ワーカーのファイル・終了したワーカーの累計・自プロセスの最新値を合算"""
+    registry.flush()
+    directory = _metrics_dir()
+    retire_dead_workers(directory)
+    totals = _empty_totals()
+    # 加算と削除の途中のファイルを読まないよう、共有ロックを取って読む
+    with _directory_lock(directory, fcntl.LOCK_SH):
+        for filename in [RETAINED_FILE] + sorted(_worker_files(directory).values()):
+            data = _read_json(os.path.join(directory, filename))
+            if data is not None:
+                _merge(totals, data)
+    return totals['views'], totals['cache'], totals['counters']
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(views, cache_stats, counters=None):
+    lines = [
+        '# HELP tutorial_requests_total Requests handled per view.',
+        '# TYPE tutorial_requests_total counter',
+    ]
+    for name in sorted(views):
+        lines.append(f'tutorial_requests_total{{view="{_label(name)}"}} {views[name]["count"]}')
+
+    lines += [
+        '# HELP tutorial_request_errors_total Requests that raised or returned 5xx per view.',
+        '# TYPE tutorial_request_errors_total counter',
+    ]
+    for name in sorted(views):
+        lines.append(f'tutorial_request_errors_total{{view="{_label(name)}"}} {views[name]["errors"]}')
+
+    lines += [
+        '# HELP tutorial_request_latency_seconds Request latency per view.',
+        '# TYPE tutorial_request_latency_seconds histogram',
+    ]
+    for name in sorted(views):
+        stats, label = views[name], _label(name)
+        cumulative = 0
+        for bound, value in zip(LATENCY_BUCKETS, stats['buckets']):
+            cumulative += value
+            lines.append(f'tutorial_request_latency_seconds_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'tutorial_request_latency_seconds_bucket{{view="{label}",le="+Inf"}} {stats["count"]}')
+        lines.append(f'tutorial_request_latency_seconds_sum{{view="{label}"}} {stats["latency_sum"]:.6f}')
+        lines.append(f'tutorial_request_latency_seconds_count{{view="{label}"}} {stats["count"]}')
+
+    lines += [
+        '# HELP tutorial_db_queries_total Database queries executed per view.',
+        '# TYPE tutorial_db_queries_total counter',
+    ]
+    for name in sorted(views):
+        lines.append(f'tutorial_db_queries_total{{view="{_label(name)}"}} {views[name]["db_queries"]}')
+
+    lines += [
+        '# HELP tutorial_db_seconds_total Time spent in database queries per view.',
+        '# TYPE tutorial_db_seconds_total counter',
+    ]
+    for name in sorted(views):
+        lines.append(f'tutorial_db_seconds_total{{view="{_label(name)}"}} {views[name]["db_time"]:.6f}')
+
+    lines += [
+        '# HELP tutorial_cache_requests_total Cache lookups per cache name and result.',
+        '# TYPE tutorial_cache_requests_total counter',
+    ]
+    for name in sorted(cache_stats):
+        stats, label = cache_stats[name], _label(name)
+        lines.append(f'tutorial_cache_requests_total{{cache="{label}",result="hit"}} {stats["hits"]}')
+        lines.append(f'tutorial_cache_requests_total{{cache="{label}",result="miss"}} {stats["misses"]}')
+
+    lines += [
+        '# HELP tutorial_cache_hit_ratio Cache hit ratio per cache name.',
+        '# TYPE tutorial_cache_hit_ratio gauge',
+    ]
+    for name in sorted(cache_stats):
+        stats = cache_stats[name]
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0.0
+        lines.append(f'tutorial_cache_hit_ratio{{cache="{_label(name)}"}} {ratio:.4f}')
+
+    lines += [
+        '# HELP tutorial_events_total Events counted by background processing (e.g. study sessions closed).',
+        '# TYPE tutorial_events_total counter',
+    ]
+    for name in sorted(counters or {}):
+        lines.append(f'tutorial_events_total{{event="{_label(name)}"}} {counters[name]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+@staff_member_required
+def metrics_view(request):
+    """Prometheus テキスト形式のメトリクス（スタッフのみ）"""
+    views, cache_stats, counters = collect()
+    return HttpResponse(
+        render_prometheus(views, cache_stats, counters),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
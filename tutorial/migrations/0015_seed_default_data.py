@@ -0,0 +1,166 @@
+from django.db import migrations
+
+# このマイグレーションの時点のデフォルトデータ。tutorial.seeding の定義を後から
+# 変更しても、適用済み・未適用の環境で投入される内容が変わらないようにここに固定する
+# （以降のデフォルトデータの変更は `manage.py seed_defaults` で投入する）
+
+DEFAULT_DIAGRAM = {
+    'name': "物品管理系统架构图",
+    'description': '基于Django的物品管理系统标准架构',
+    'layers': [
+        {'name': 'HTTP层',   'color': '#3B82F6', 'order': 0, 'x': 100, 'y': 200, 'size': 160},
+        {'name': 'URL路由层', 'color': '#10B981', 'order': 1, 'x': 320, 'y': 200, 'size': 160},
+        {'name': '视图层',   'color': '#8B5CF6', 'order': 2, 'x': 540, 'y': 200, 'size': 160},
+        {'name': '表单层',   'color': '#EC4899', 'order': 3, 'x': 760, 'y': 200, 'size': 160},
+        {'name': '模型层',   'color': '#EF4444', 'order': 4, 'x': 980, 'y': 200, 'size': 160},
+        {'name': '模板层',   'color': '#06B6D4', 'order': 5, 'x': 1200,'y': 200, 'size': 160},
+    ],
+    'connections': [
+        {'from': 'http_request', 'to': 'url_router', 'type': 'solid'},
+        {'from': 'url_items', 'to': 'item_list_view', 'type': 'solid'},
+        {'from': 'url_add', 'to': 'item_create_view', 'type': 'solid'},
+        {'from': 'url_detect', 'to': 'item_delete_view', 'type': 'solid'},
+        {'from': 'item_list_view', 'to': 'item_model', 'type': 'solid'},
+        {'from': 'item_create_view', 'to': 'item_form', 'type': 'solid'},
+        {'from': 'item_delete_view', 'to': 'item_model', 'type': 'solid'},
+        {'from': 'item_form', 'to': 'item_model', 'type': 'solid'},
+        {'from': 'item_list_view', 'to': 'item_list_template', 'type': 'dashed'},
+        {'from': 'item_create_view', 'to': 'item_form_template', 'type': 'dashed'},
+    ],
+}
+
+DEFAULT_DIAGRAM_COMPONENTS = [
+    # HTTP层
+    {'name': 'HTTP请求', 'type': 'http_request', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#3B82F6', 'layer': 'HTTP层', 'allowed_types': ['url'], 'order': 0},
+
+    # URL路由层
+    {'name': 'URL路由器', 'type': 'url_router', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['url'], 'order': 0},
+    {'name': '/items/', 'type': 'url_items', 'x': 200, 'y': 10, 'width': 100, 'height': 40, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['view'], 'order': 1},
+    {'name': '/items/add/', 'type': 'url_add', 'x': 330, 'y': 10, 'width': 100, 'height': 40, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['view'], 'order': 2},
+    {'name': '/items/detect/', 'type': 'url_detect', 'x': 460, 'y': 10, 'width': 100, 'height': 40, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['view'], 'order': 3},
+
+    # 视图层
+    {'name': 'ItemListView', 'type': 'item_list_view', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#8B5CF6', 'layer': '视图层', 'allowed_types': ['view'], 'order': 0},
+    {'name': 'ItemCreateView', 'type': 'item_create_view', 'x': 200, 'y': 10, 'width': 120, 'height': 60, 'color': '#8B5CF6', 'layer': '视图层', 'allowed_types': ['view'], 'order': 1},
+    {'name': 'ItemDeleteView', 'type': 'item_delete_view', 'x': 350, 'y': 10, 'width': 120, 'height': 60, 'color': '#8B5CF6', 'layer': '视图层', 'allowed_types': ['view'], 'order': 2},
+
+    # 表单层
+    {'name': 'ItemForm', 'type': 'item_form', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#EC4899', 'layer': '表单层', 'allowed_types': ['form'], 'order': 0},
+
+    # 模型层
+    {'name': 'Item模型', 'type': 'item_model', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#EF4444', 'layer': '模型层', 'allowed_types': ['data_model'], 'order': 0},
+
+    # 模板层
+    {'name': 'item_list.html', 'type': 'item_list_template', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#06B6D4', 'layer': '模板层', 'allowed_types': ['template'], 'order': 0},
+    {'name': '表单模板', 'type': 'item_form_template', 'x': 200, 'y': 10, 'width': 120, 'height': 60, 'color': '#06B6D4', 'layer': '模板层', 'allowed_types': ['template'], 'order': 1},
+]
+
+DEFAULT_SLOTS = [
+    {
+        'name': 'データモデル層',
+        'description': 'データモデルとデータベース構造を定義',
+        'allowed_block_types': ['data_model'],
+        'x_position': 100,
+        'y_position': 100,
+        'border_color': '#4C56B3',
+        'background_color': '#F0F9FF',
+        'required': False,
+        'order': 1
+    },
+    {
+        'name': 'ビジネスロジック層',
+        'description': 'ビジネスロジックと計算を処理',
+        'allowed_block_types': ['view'],
+        'x_position': 400,
+        'y_position': 100,
+        'border_color': '#059669',
+        'background_color': '#F0FDF4',
+        'required': False,
+        'order': 2
+    },
+    {
+        'name': 'ビューレイヤー',
+        'description': 'HTTPリクエストとレスポンスを処理',
+        'allowed_block_types': ['view'],
+        'x_position': 100,
+        'y_position': 300,
+        'border_color': '#DC2626',
+        'background_color': '#FEF2F2',
+        'required': False,
+        'order': 3
+    },
+    {
+        'name': 'URL層',
+        'description': 'URLルーティングを定義',
+        'allowed_block_types': ['url'],
+        'x_position': 400,
+        'y_position': 300,
+        'border_color': '#0891B2',
+        'background_color': '#F0FDFA',
+        'required': False,
+        'order': 4
+    },
+    {
+        'name': 'テンプレート層',
+        'description': 'フロントエンドテンプレートを定義',
+        'allowed_block_types': ['template'],
+        'x_position': 700,
+        'y_position': 300,
+        'border_color': '#DB2777',
+        'background_color': '#FDF2F8',
+        'required': False,
+        'order': 5
+    },
+]
+
+
+def seed_defaults(apps, schema_editor):
+    Template = apps.get_model('tutorial', 'ArchitectureDiagramTemplate')
+    Component = apps.get_model('tutorial', 'DiagramComponent')
+    Slot = apps.get_model('tutorial', 'ArchitectureSlot')
+
+    # 架構図テンプレートとコンポーネント（既存のものは変更しない）
+    diagram = Template.objects.filter(name=DEFAULT_DIAGRAM['name']).first()
+    if diagram is None:
+        diagram = Template.objects.create(
+            name=DEFAULT_DIAGRAM['name'],
+            description=DEFAULT_DIAGRAM['description'],
+            layers=[dict(layer) for layer in DEFAULT_DIAGRAM['layers']],
+            connections=[dict(conn) for conn in DEFAULT_DIAGRAM['connections']],
+        )
+    existing_types = set(Component.objects.filter(diagram=diagram).values_list('component_type', flat=True))
+    Component.objects.bulk_create([
+        Component(
+            diagram=diagram,
+            name=comp['name'],
+            component_type=comp['type'],
+            position_x=comp['x'],
+            position_y=comp['y'],
+            width=comp['width'],
+            height=comp['height'],
+            color=comp['color'],
+            allowed_block_types=list(comp['allowed_types']),
+            layer=comp['layer'],
+            order=comp['order'],
+        )
+        for comp in DEFAULT_DIAGRAM_COMPONENTS
+        if comp['type'] not in existing_types
+    ])
+
+    # 任意スロット（一つも無い場合のみ）
+    if not Slot.objects.filter(required=False).exists():
+        Slot.objects.bulk_create([
+            Slot(**dict(slot_data, allowed_block_types=list(slot_data['allowed_block_types'])))
+            for slot_data in DEFAULT_SLOTS
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorial', '0014_badge_required_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_defaults, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorial', '0015_seed_default_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='architecturediagramtemplate',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='版本号'),
+        ),
+    ]
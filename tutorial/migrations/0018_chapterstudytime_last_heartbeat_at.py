@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorial', '0017_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapterstudytime',
+            name='last_heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最終ハートビート日時'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorial', '0018_chapterstudytime_last_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studyguideattachment',
+            name='download_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='ダウンロード数'),
+        ),
+    ]
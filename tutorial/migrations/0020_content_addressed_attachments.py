@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:57
+
+import tutorial.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorial', '0019_studyguideattachment_download_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studyguideattachment',
+            name='file',
+            field=models.FileField(max_length=255, storage=tutorial.storage.ContentAddressedStorage(), upload_to='study_guide_zips/', verbose_name='添付ファイル（ZIPなど）'),
+        ),
+    ]
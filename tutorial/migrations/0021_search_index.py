@@ -0,0 +1,99 @@
+import html
+import re
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# このマイグレーションの時点の検索インデックスの定義。tutorial.search を後から
+# 変更しても、このマイグレーションが作るテーブルと内容が変わらないようにここに固定する
+# （定義を変えた場合は新しいマイグレーションで作り直すか `manage.py rebuild_search_index` を実行する）
+TABLE = 'tutorial_search'
+KINDS = {'question': 1, 'guide': 2, 'block': 3}
+BATCH_SIZE = 500
+
+CREATE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+    title, body, code, private,
+    kind UNINDEXED, object_id UNINDEXED, chapter_id UNINDEXED, visible UNINDEXED,
+    tokenize = 'trigram'
+)
+"""
+INSERT_SQL = (
+    f'INSERT INTO {TABLE} (rowid, title, body, code, private, kind, object_id, chapter_id, visible) '
+    'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)'
+)
+
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.S | re.I)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _rowid(kind, object_id):
+    return object_id * len(KINDS) + KINDS[kind]
+
+
+def _html_to_text(value):
+    text = strip_tags(_SCRIPT_STYLE_RE.sub(' ', value or ''))
+    return _WHITESPACE_RE.sub(' ', html.unescape(text)).strip()
+
+
+def _question_row(question):
+    private = '\n'.join(part for part in (question.explanation, question.hint) if part)
+    return (
+        _rowid('question', question.id), question.question_text, '', question.code_snippet or '', private,
+        'question', question.id, question.chapter_id, int(question.is_active and question.chapter.is_active),
+    )
+
+
+def _guide_row(guide):
+    return (
+        _rowid('guide', guide.id), guide.chapter.title, _html_to_text(guide.content), '', '',
+        'guide', guide.id, guide.chapter_id, int(guide.is_published and guide.chapter.is_active),
+    )
+
+
+def _block_row(block):
+    return (
+        _rowid('block', block.id), block.name, block.description, block.code_snippet, '',
+        'block', block.id, None, int(block.is_active),
+    )
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    sources = [
+        (apps.get_model('tutorial', 'Question').objects.select_related('chapter'), _question_row),
+        (apps.get_model('tutorial', 'StudyGuide').objects.select_related('chapter'), _guide_row),
+        (apps.get_model('tutorial', 'BuildingBlock').objects.all(), _block_row),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_SQL)
+        cursor.execute(f'DELETE FROM {TABLE}')
+        for queryset, build_row in sources:
+            rows = []
+            for obj in queryset.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+                rows.append(build_row(obj))
+                if len(rows) >= BATCH_SIZE:
+                    cursor.executemany(INSERT_SQL, rows)
+                    rows = []
+            if rows:
+                cursor.executemany(INSERT_SQL, rows)
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorial', '0020_content_addressed_attachments'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
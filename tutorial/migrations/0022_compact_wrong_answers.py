@@ -0,0 +1,99 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:10
+
+import itertools
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+# 集約時に残す最近の誤答の件数（このマイグレーションの時点の TUTORIAL_WRONG_ANSWER_HISTORY の既定値）
+HISTORY_LIMIT = 5
+USERS_PER_BATCH = 200
+BATCH_SIZE = 500
+FOLDED_FIELDS = ['attempt_count', 'created_at', 'last_wrong_at', 'wrong_answer', 'correct_answer', 'recent_wrong_answers']
+
+
+def _fold_group(WrongAnswer, group):
+    """同じ (user, question) の行（古い順）を、最も古い行に集計した 1 行にする"""
+    first, last = group[0], group[-1]
+    recent = []
+    for row in reversed(group):
+        if row[4] not in recent:
+            recent.append(row[4])
+        if len(recent) >= HISTORY_LIMIT:
+            break
+    return WrongAnswer(
+        id=first[0], user_id=first[1], question_id=first[2], attempt_count=len(group),
+        created_at=first[3], last_wrong_at=last[3], wrong_answer=last[4],
+        correct_answer=last[5], recent_wrong_answers=recent,
+    )
+
+
+def fold_wrong_answers(apps, schema_editor):
+    """
+    1 回 1 行の履歴を (user, question) ごとの 1 行に集約してから一意制約を付ける
+    最も古い行を残し、回数・最初／最後の日時・最後の誤答と正解・最近の誤答を書き込む。
+    SQLite では読み込み中のカーソルと同じテーブルへの書き込みを混ぜられないため、
+    ユーザー USERS_PER_BATCH 人分ずつ読み込んでから書き込む
+    """
+    WrongAnswer = apps.get_model('tutorial', 'WrongAnswer')
+    user_ids = list(WrongAnswer.objects.order_by('user_id').values_list('user_id', flat=True).distinct())
+    for start in range(0, len(user_ids), USERS_PER_BATCH):
+        rows = WrongAnswer.objects.filter(user_id__in=user_ids[start:start + USERS_PER_BATCH]).order_by(
+            'user_id', 'question_id', 'created_at', 'id'
+        ).values_list('id', 'user_id', 'question_id', 'created_at', 'wrong_answer', 'correct_answer')
+
+        survivors, duplicate_ids = [], []
+        for _, group in itertools.groupby(rows, key=lambda row: (row[1], row[2])):
+            group = list(group)
+            survivors.append(_fold_group(WrongAnswer, group))
+            duplicate_ids.extend(row[0] for row in group[1:])
+
+        WrongAnswer.objects.bulk_update(survivors, FOLDED_FIELDS, batch_size=BATCH_SIZE)
+        for chunk in range(0, len(duplicate_ids), BATCH_SIZE):
+            WrongAnswer.objects.filter(id__in=duplicate_ids[chunk:chunk + BATCH_SIZE]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorial', '0021_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='wronganswer',
+            options={'ordering': ['-last_wrong_at'], 'verbose_name': '間違い記録', 'verbose_name_plural': '間違い記録'},
+        ),
+        migrations.AddField(
+            model_name='wronganswer',
+            name='attempt_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='間違えた回数'),
+        ),
+        migrations.AddField(
+            model_name='wronganswer',
+            name='last_wrong_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='最終記録時間'),
+        ),
+        migrations.AddField(
+            model_name='wronganswer',
+            name='recent_wrong_answers',
+            field=models.JSONField(blank=True, default=list, verbose_name='最近の間違った回答'),
+        ),
+        migrations.AlterField(
+            model_name='wronganswer',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='初回記録時間'),
+        ),
+        migrations.AlterField(
+            model_name='wronganswer',
+            name='wrong_answer',
+            field=models.TextField(verbose_name='最後の間違った回答'),
+        ),
+        migrations.RunPython(fold_wrong_answers, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='wronganswer',
+            unique_together={('user', 'question')},
+        ),
+    ]
@@ -1,11 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
 from tinymce.models import HTMLField
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from django.utils import timezone
+from django.conf import settings
 import logging
 
+from .storage import content_addressed_storage
+
 logger = logging.getLogger(__name__)
 
 class Chapter(models.Model):
@@ -34,6 +35,7 @@ class ChapterStudyTime(models.Model):
     start_time = models.DateTimeField(verbose_name="学習開始時間")
     end_time = models.DateTimeField(null=True, blank=True, verbose_name="学習終了時間")
     total_seconds = models.IntegerField(default=0, verbose_name="総学習時間（秒）")
+    last_heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="最終ハートビート日時")
     
     class Meta:
         verbose_name = "学習時間記録"
@@ -52,7 +54,10 @@ class ChapterStudyTime(models.Model):
 
     def save(self, *args, **kwargs):
         # 修复时间计算逻辑
-        if self.start_time and self.end_time:
+        if self.end_time and self.last_heartbeat_at:
+            # ハートビートで積算したアクティブ時間をそのまま使う（tutorial.study_time）
+            self.total_seconds = max(self.total_seconds or 0, 1)
+        elif self.start_time and self.end_time:
             try:
                 # 确保时区一致
                 if timezone.is_naive(self.start_time):
@@ -67,7 +72,8 @@ class ChapterStudyTime(models.Model):
                 if calculated_seconds <= 0 and hasattr(self, '_frontend_seconds'):
                     self.total_seconds = max(self._frontend_seconds, 1)
                 else:
-                    self.total_seconds = max(calculated_seconds, 1)
+                    max_seconds = getattr(settings, 'TUTORIAL_STUDY_SESSION_MAX_SECONDS', 4 * 3600)
+                    self.total_seconds = min(max(calculated_seconds, 1), max_seconds)
                     
             except Exception as e:
                 logger.error(f"学习时间计算错误: {e}")
@@ -129,6 +135,8 @@ class StudyGuideAttachment(models.Model):
     
     file = models.FileField(
         upload_to='study_guide_zips/',
+        storage=content_addressed_storage,
+        max_length=255,
         verbose_name="添付ファイル（ZIPなど）"
     )
     
@@ -138,6 +146,9 @@ class StudyGuideAttachment(models.Model):
         verbose_name="リンク表示名（例：サンプルコードZIP）"
     )
 
+    # ダウンロードのたびに行を更新せず、tutorial.downloads がまとめて加算する
+    download_count = models.PositiveIntegerField(default=0, verbose_name="ダウンロード数")
+
     class Meta:
         verbose_name = "学習ガイド添付"
         verbose_name_plural = "学習ガイド添付"
@@ -188,18 +199,16 @@ class Question(models.Model):
                     is_correct=True
                 ).values_list('blank_index', flat=True).distinct()
                 count = len(blank_indices)
-                print(f"[DEBUG] 问题 {self.id} 多空填空题空格数量: {count}")
+                logger.debug("多空填空题空格数量", extra={'question_id': self.id, 'blank_count': count})
                 return max(count, 1)  # 至少返回1
             elif self.question_type == 'fill':
                 # 对于单空填空题，返回1
-                print(f"[DEBUG] 问题 {self.id} 单空填空题，空格数量: 1")
                 return 1
             else:
                 # 对于选择题，返回0
-                print(f"[DEBUG] 问题 {self.id} 选择题，空格数量: 0")
                 return 0
         except Exception as e:
-            print(f"[ERROR] 获取问题 {self.id} 空格数量失败: {e}")
+            logger.error(f"获取问题 {self.id} 空格数量失败: {e}")
             # 出错时返回默认值
             if self.question_type in ['fill', 'multi_fill']:
                 return 1
@@ -219,9 +228,9 @@ class Question(models.Model):
                     correct_answers[choice.blank_index] = []
                 correct_answers[choice.blank_index].append(choice.choice_text)
             
-            print(f"[DEBUG] 问题 {self.id} 各空位正确答案: {correct_answers}")
+            logger.debug("各空位正确答案", extra={'question_id': self.id, 'correct_answers': correct_answers})
         except Exception as e:
-            print(f"[ERROR] 获取问题 {self.id} 各空位正确答案失败: {e}")
+            logger.error(f"获取问题 {self.id} 各空位正确答案失败: {e}")
         
         return correct_answers
 
@@ -308,7 +317,9 @@ class Question(models.Model):
     def get_statistics(self):
         """获取问题的统计信息"""
         from .models import WrongAnswer
-        wrong_count = WrongAnswer.objects.filter(question=self).count()
+        wrong_count = WrongAnswer.objects.filter(question=self).aggregate(
+            total=models.Sum('attempt_count')
+        )['total'] or 0
         
         return {
             'wrong_count': wrong_count,
@@ -380,16 +391,26 @@ class UserProgress(models.Model):
         super().save(*args, **kwargs)
 
 class WrongAnswer(models.Model):
+    """間違い記録（ユーザー・問題ごとに 1 行。tutorial.wrong_answers で更新する）"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="ユーザー")
     question = models.ForeignKey(Question, on_delete=models.CASCADE, verbose_name="問題")
-    wrong_answer = models.TextField(verbose_name="間違った回答")
+    wrong_answer = models.TextField(verbose_name="最後の間違った回答")
     correct_answer = models.TextField(verbose_name="正しい回答")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="記録時間")
+    # 重複を除いた最近の誤答（新しい順、TUTORIAL_WRONG_ANSWER_HISTORY 件まで）
+    recent_wrong_answers = models.JSONField(default=list, blank=True, verbose_name="最近の間違った回答")
+    attempt_count = models.PositiveIntegerField(default=1, verbose_name="間違えた回数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="初回記録時間")
+    last_wrong_at = models.DateTimeField(default=timezone.now, verbose_name="最終記録時間")
     
     class Meta:
         verbose_name = "間違い記録"
         verbose_name_plural = "間違い記録"
-        ordering = ['-created_at']
+        ordering = ['-last_wrong_at']
+        unique_together = ('user', 'question')
+
+    def earlier_wrong_answers(self):
+        """最後の誤答より前の最近の誤答（新しい順）"""
+        return [answer for answer in self.recent_wrong_answers if answer != self.wrong_answer]
 
     def __str__(self):
         return f"{self.user.username} - {self.question.chapter.title}"
@@ -701,54 +722,46 @@ class Badge(models.Model):
         
         try:
             profile = user.userprofile
-            print(f"  バッジ '{self.name}' アンロック条件チェック:")
-            print(f"    - ユーザー経験値: {profile.experience}, 必要: {self.required_experience}")
-            print(f"    - ユーザーレベル: {profile.level}, 必要: {self.required_level}")
-            print(f"    - ユーザーチャプター: {profile.total_chapters_completed}, 必要: {self.required_chapters}")
-            
+            unmet = []
+
             # 経験値条件チェック
-            if self.required_experience > 0:
-                if profile.experience < self.required_experience:
-                    print(f"    - ❌ 経験値不足")
-                    return False
-                else:
-                    print(f"    - ✅ 経験値条件達成")
-            
+            if self.required_experience > 0 and profile.experience < self.required_experience:
+                unmet.append('experience')
+
             # レベル条件チェック
-            if self.required_level > 0:
-                if profile.level < self.required_level:
-                    print(f"    - ❌ レベル不足")
-                    return False
-                else:
-                    print(f"    - ✅ レベル条件達成")
-            
+            if not unmet and self.required_level > 0 and profile.level < self.required_level:
+                unmet.append('level')
+
             # チャプター条件チェック
-            if self.required_chapters > 0:
-                if profile.total_chapters_completed < self.required_chapters:
-                    print(f"    - ❌ チャプター不足")
-                    return False
-                else:
-                    print(f"    - ✅ チャプター条件達成")
+            if not unmet and self.required_chapters > 0 and profile.total_chapters_completed < self.required_chapters:
+                unmet.append('chapters')
 
-            if self.required_score > 0:
+            if not unmet and self.required_score > 0:
                 # このユーザーのチャプターごとのスコアの最大値を取得
                 max_score = UserProgress.objects.filter(
                     user=user
                 ).aggregate(max=models.Max('score'))['max'] or 0
 
-                print(f"    - ユーザー最高スコア: {max_score}, 必要スコア: {self.required_score}")
-
                 if max_score < self.required_score:
-                    print(f"    - ❌ スコア不足")
-                    return False
-                else:
-                    print(f"    - ✅ スコア条件達成")
-            
-            print(f"    - 🎉 すべての条件達成、バッジアンロック！")
-            return True
+                    unmet.append('score')
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "バッジアンロック条件チェック",
+                    extra={
+                        'badge': self.name,
+                        'user_id': user.id,
+                        'experience': profile.experience,
+                        'level': profile.level,
+                        'chapters_completed': profile.total_chapters_completed,
+                        'unlocked': not unmet,
+                        'unmet': unmet,
+                    }
+                )
+            return not unmet
             
         except Exception as e:
-            print(f"❌ バッジアンロック状態チェック失敗: {e}")
+            logger.error(f"バッジアンロック状態チェック失敗: {e}")
             return False
 
 class UserBadge(models.Model):
@@ -838,7 +851,27 @@ class BuildingBlock(models.Model):
             return is_unlocked
             
         except Exception as e:
-            print(f"積木アンロック状態チェック失敗: {e}")
+            logger.error(f"積木アンロック状態チェック失敗: {e}")
+            return False
+
+    async def ais_unlocked_for_user(self, user):
+        """is_unlocked_for_user の非同期版"""
+        if not user.is_authenticated:
+            return False
+        
+        if self.manually_unlocked:
+            return True
+        
+        try:
+            completed_chapters = UserProgress.objects.filter(
+                user=user, 
+                completed=True
+            ).values_list('chapter_id', flat=True)
+            
+            return await self.chapters.filter(id__in=completed_chapters).aexists()
+            
+        except Exception as e:
+            logger.error(f"積木アンロック状態チェック失敗: {e}")
             return False
 
 class ArchitectureSlot(models.Model):
@@ -883,6 +916,7 @@ class ArchitectureDiagramTemplate(models.Model):
     layers = models.JSONField(default=list, verbose_name="层级配置")
     connections = models.JSONField(default=list, verbose_name="连接配置")
     is_default = models.BooleanField(default=False, verbose_name="默认模板")
+    version = models.PositiveIntegerField(default=1, verbose_name="版本号")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -892,6 +926,20 @@ class ArchitectureDiagramTemplate(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # 通过 save() 修改已有模板时也递增版本号，使缓存与乐观锁能感知到变化。
+        # 在数据库中用 F() 递增：即使管理后台持有过期的实例，也不会写回已被
+        # update_layer_layout 的比较并交换使用过的版本号
+        bump = bool(self.pk)
+        if bump:
+            self.version = models.F('version') + 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'version'}
+        super().save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=['version'])
+
 class ArchitectureDiagram(models.Model):
     """架构图主模型"""
     name = models.CharField(max_length=100, verbose_name="架构图名称")
@@ -1031,106 +1079,62 @@ class ArchitectureTemplate(models.Model):
     def __str__(self):
         return self.name
 
-# ==================== シグナルハンドラー ====================
+# ==================== バックグラウンドジョブ ====================
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    """ユーザープロファイルを作成"""
-    if created:
-        try:
-            UserProfile.objects.create(user=instance)
-            # デフォルトアーキテクチャ図を作成
-            UserArchitecture.objects.create(user=instance)
-        except Exception as e:
-            logger.error(f"ユーザープロファイル作成失敗: {e}")
+class Job(models.Model):
+    """バックグラウンドで実行する処理（tutorial.tasks.enqueue で登録し、run_jobs で実行）"""
+    STATUS_CHOICES = [
+        ('pending', '待機中'),
+        ('running', '実行中'),
+        ('done', '完了'),
+        ('failed', '失敗'),
+    ]
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """ユーザープロファイルを保存"""
-    try:
-        if hasattr(instance, 'userprofile'):
-            instance.userprofile.save()
-        else:
-            UserProfile.objects.create(user=instance)
-    except Exception as e:
-        logger.error(f"ユーザープロファイル保存失敗: {e}")
+    name = models.CharField(max_length=200, verbose_name="処理名")
+    payload = models.JSONField(default=dict, verbose_name="引数")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="状態")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="試行回数")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="最大試行回数")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="実行予定日時")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="実行ワーカー")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="実行開始日時")
+    last_error = models.TextField(blank=True, verbose_name="最後のエラー")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="登録日時")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="終了日時")
 
-@receiver(post_save, sender=UserProgress)
-def update_user_profile_on_progress(sender, instance, created, **kwargs):
-    """進捗更新時にユーザープロファイルを更新 - 修正版"""
-    try:
-        # チャプターが完了し、経験値がまだ授与されていない場合のみ処理
-        if instance.completed and not instance.experience_awarded:
-            # ユーザープロファイルを取得または作成
-            profile, _ = UserProfile.objects.get_or_create(user=instance.user)
-            
-            # このチャプターですでに経験値を獲得したかチェック
-            if not profile.has_experience_for_chapter(instance.chapter.id):
-                # 難易度に応じて異なる経験値を授与
-                experience_points = calculate_experience_for_chapter(instance.chapter)
-                
-                # 経験値を追加
-                profile.experience += experience_points
-                profile.add_chapter_experience(instance.chapter.id)
-                
-                # レベルを再計算
-                old_level = profile.level
-                profile.level = profile.calculate_level()
-                
-                # 経験値授与済みとしてマーク
-                instance.experience_awarded = True
-                instance.save(update_fields=['experience_awarded'])
-                
-                # ユーザープロファイルを保存
-                profile.save()
-                
-                # 条件を満たすバッジをチェックして授与
-                new_badges = profile.check_and_award_badges()
-                
-                # ログ記録
-                level_up_message = ""
-                if profile.level > old_level:
-                    level_up_message = f" レベルが Lv.{profile.level} にアップ！"
-                
-                badge_message = ""
-                if new_badges:
-                    badge_names = [badge.name for badge in new_badges]
-                    badge_message = f" 新しいバッジ獲得: {', '.join(badge_names)}"
-                
-                logger.info(
-                    f"ユーザー {instance.user.username} チャプター {instance.chapter.title} 完了 "
-                    f"{experience_points} EXP 獲得{level_up_message}{badge_message}"
-                )
-    
-    except Exception as e:
-        logger.error(f"ユーザープロファイル更新失敗: {e}")
+    class Meta:
+        verbose_name = "バックグラウンドジョブ"
+        verbose_name_plural = "バックグラウンドジョブ"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='tutorial_job_status_run_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.get_status_display()})"
 
 def calculate_experience_for_chapter(chapter):
     """チャプターに基づいて経験値を計算"""
     # 基本経験値
     base_exp = 50
-    
-    # チャプター内の問題数と難易度に基づいて経験値を調整
-    questions = chapter.question_set.filter(is_active=True)
-    
-    if questions.exists():
-        # 難易度ボーナス
-        difficulty_bonus = {
-            'easy': 0,
-            'medium': 10,
-            'hard': 25
-        }
-        
-        total_bonus = sum(
-            difficulty_bonus.get(q.difficulty, 0) 
-            for q in questions
-        )
-        
+
+    # チャプター内の問題数と難易度に基づいて経験値を調整（1 回の集計クエリで取得）
+    # 難易度ボーナス: easy 0 / medium 10 / hard 25
+    stats = chapter.question_set.filter(is_active=True).aggregate(
+        count=models.Count('id'),
+        bonus=models.Sum(models.Case(
+            models.When(difficulty='medium', then=models.Value(10)),
+            models.When(difficulty='hard', then=models.Value(25)),
+            default=models.Value(0),
+        )),
+    )
+
+    if stats['count']:
         # 問題数ボーナス（問題ごとに+5経験値）
-        count_bonus = min(questions.count() * 5, 50)
-        
-        return base_exp + total_bonus + count_bonus
-    
+        count_bonus = min(stats['count'] * 5, 50)
+
+        return base_exp + stats['bonus'] + count_bonus
+
     return base_exp
 
 # ==================== UserProfile 追加メソッド ====================
@@ -1153,13 +1157,12 @@ def check_and_award_badges(self):
                 # ユーザーバッジレコードを作成
                 user_badge = UserBadge.objects.create(user=self.user, badge=badge)
                 new_badges.append(badge)
-                print(f"🎉 バッジ授与: {badge.name} ユーザー {self.user.username}")
+                logger.info("バッジ授与", extra={'badge': badge.name, 'user_id': self.user_id})
     
         return new_badges
     
     except Exception as e:
         logger.error(f"バッジチェック失敗: {e}")
-        print(f"❌ バッジチェックエラー: {e}")
         return []
 
 def get_badge_progress(self, badge):
@@ -1201,7 +1204,7 @@ def get_badge_progress(self, badge):
         return progress_data
     
     except Exception as e:
-        print(f"❌ バッジ進捗取得失敗: {e}")
+        logger.error(f"バッジ進捗取得失敗: {e}")
         return {}
 
 def get_unlocked_badges(self):
@@ -1224,8 +1227,3 @@ def get_user_statistics(user):
         'wrong_answers': WrongAnswer.objects.filter(user=user).count(),
         'total_blocks': BuildingBlock.objects.filter(is_active=True).count(),
     }
-
-# シグナル接続を確実にする
-post_save.connect(create_user_profile, sender=User)
-post_save.connect(save_user_profile, sender=User)
-post_save.connect(update_user_profile_on_progress, sender=UserProgress)
\ No newline at end of file
@@ -0,0 +1,84 @@
+# perf.py - ベンチマーク用の共通ユーティリティ
+"""
+ベンチマーク系の管理コマンドが共有する統計処理とベースライン管理
+
+ベースラインは JSON ファイルに {ケース名: {指標名: 値}} の形で保存し、
+compare_to_baseline() で閾値を超える悪化を検出する。
+"""
+import json
+import math
+import os
+import statistics
+
+
+def percentile(samples, pct):
+    """サンプルのパーセンタイル値（線形補間）を返す"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return float(ordered[0])
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return float(ordered[int(rank)])
+    weight = rank - lower
+    return ordered[lower] * (1 - weight) + ordered[upper] * weight
+
+
+def summarize(samples):
+    """サンプル列の件数・平均・p50/p95/p99・最小・最大をまとめて返す"""
+    if not samples:
+        return {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'min': 0.0, 'max': 0.0}
+    return {
+        'count': len(samples),
+        'mean': statistics.fmean(samples),
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'min': float(min(samples)),
+        'max': float(max(samples)),
+    }
+
+
+def load_baseline(path):
+    """ベースライン JSON を読み込む（存在しなければ空の dict）"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    """ベースライン JSON を保存する"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def compare_to_baseline(results, baseline, threshold, metrics):
+    """
+    結果をベースラインと比較し、閾値（割合）を超えて悪化した指標を返す
+    metrics: 比較対象の指標名（値が大きいほど悪い指標のみ）
+    戻り値: [(ケース名, 指標名, ベースライン値, 今回の値, 変化率)]
+    """
+    regressions = []
+    for case, values in results.items():
+        base_values = baseline.get(case)
+        if not base_values:
+            continue
+        for metric in metrics:
+            base = base_values.get(metric)
+            current = values.get(metric)
+            if base is None or current is None:
+                continue
+            if base == 0:
+                if current > 0:
+                    regressions.append((case, metric, base, current, float('inf')))
+                continue
+            change = (current - base) / base
+            if change > threshold:
+                regressions.append((case, metric, base, current, change))
+    return regressions
@@ -0,0 +1,657 @@
+# question_import.py - 問題・選択肢の一括インポート
+"""
+CSV / Markdown で書いた問題を検証し、差分を確認してから一括で書き込む。
+
+管理画面（問題一覧の「問題をインポート」）と `manage.py import_questions`
+の両方から使う。
+
+処理の流れ:
+1. parse() でファイルをレコード（dict）のリストにする。
+2. build_plan() でチャプターと既存の問題・選択肢をまとめて読み込み、
+   すべてのレコードをメモリ上で検証する。エラーが 1 件でもあれば
+   QuestionImportError（行番号付きのメッセージのリスト）を送出し、何も書き込まない。
+3. ImportPlan.diff_lines() で追加・更新・削除の内容を確認する（dry-run）。
+4. ImportPlan.apply() で 1 トランザクションの中で bulk_create / bulk_update
+   する。選択肢が変わった問題は、既存の選択肢と対応付けて変わった行だけを
+   更新・追加・削除する（選択問題の解答は選択肢の ID を保存しているため、
+   変わっていない選択肢の ID は変えない）。
+
+既存の問題との対応付け:
+- id があればその問題を更新する。
+- id が無ければ、同じチャプターで問題文が同じ問題を更新する（無ければ追加）。
+- prune=True の場合、ファイルに含まれるチャプターの問題のうち、どのレコードにも
+  対応しなかった問題を削除する（誤答・解答履歴もカスケードで削除される）。
+
+bulk_create / bulk_update はシグナルを発火しないため、書き込み後に content
+キャッシュの名前空間をまとめて無効化し、全文検索インデックスを更新する。
+
+CSV の列（1 行目はヘッダー、順不同）:
+    chapter        チャプター ID またはタイトル（必須）
+    id             更新する問題の ID（省略可）
+    question_type  choice / fill / multi_fill（必須）
+    question_text  問題文（必須）
+    code_snippet, explanation, hint
+    difficulty     easy / medium / hard（省略時 medium）
+    order          表示順（省略時 0）
+    is_active      1 / 0、true / false など（省略時 有効）
+    choices        選択問題の選択肢。| 区切りで、正解の先頭に * を付ける
+                   例: *print|echo|puts
+    blank_1, blank_2, ...
+                   穴埋め問題の空欄ごとの正解。別解は | 区切り
+                   （fill は blank_1 のみ）
+区切り文字そのものは \\| 、先頭の * は \\* と書く。
+
+Markdown:
+    # チャプター ID またはタイトル
+
+    ## multi_fill
+    id: 12
+    difficulty: easy
+    hint: ヒント
+
+    問題文（複数行可）
+
+    ```python
+    コードスニペット
+    ```
+
+    - 1: render | Render
+    - 2: path
+
+    リストの後ろの文章は解説になる。
+
+選択問題は `- [x] 正解` / `- [ ] 不正解`、fill は `- 正解 | 別解` と書く。
+"""
+import csv
+import difflib
+import io
+import os
+import re
+
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from . import cache as tutorial_cache
+from . import search
+from .models import Chapter, Choice, Question
+
+QUESTION_FIELDS = (
+    'chapter_id', 'question_type', 'question_text', 'code_snippet', 'explanation',
+    'hint', 'difficulty', 'order', 'is_active',
+)
+QUESTION_TYPES = dict(Question.QUESTION_TYPES)
+DIFFICULTIES = dict(Question.DIFFICULTY_LEVELS)
+CHOICE_TEXT_MAX_LENGTH = Choice._meta.get_field('choice_text').max_length
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on', 'はい', '有効')
+FALSE_VALUES = ('0', 'false', 'no', 'n', 'off', 'いいえ', '無効')
+
+_BLANK_COLUMN_RE = re.compile(r'^blank_(\d+)$')
+_META_RE = re.compile(r'^(id|difficulty|order|hint|is_active|active)\s*[:：]\s*(.*)$')
+_CHOICE_ITEM_RE = re.compile(r'^[-*]\s+\[([ xX])\]\s+(.*)$')
+_BLANK_ITEM_RE = re.compile(r'^[-*]\s+(?:(\d+)\s*[:：]\s*)?(.*)$')
+
+
+class QuestionImportError(Exception):
+    """インポートするファイルの検証エラー（errors は行番号付きのメッセージのリスト）"""
+
+    def __init__(self, errors):
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+
+
+# ==================== 解析 ====================
+
+def split_values(value, markers=False):
+    """
+    | 区切りの値を分割する（\\| は区切りにしない）。各要素は (テキスト, 正解の印があったか)
+    markers=True の場合だけ先頭の * を正解の印として取り除く（*args のような答えを壊さないため）
+    """
+    items = []
+    current = []
+    starred = False
+    i = 0
+    value = value or ''
+    while i < len(value):
+        char = value[i]
+        if char == '\\' and i + 1 < len(value):
+            current.append(value[i + 1])
+            i += 2
+            continue
+        if char == '|':
+            items.append((''.join(current).strip(), starred))
+            current, starred = [], False
+        elif markers and char == '*' and not ''.join(current).strip():
+            starred = True
+        else:
+            current.append(char)
+        i += 1
+    items.append((''.join(current).strip(), starred))
+    return [(text, star) for text, star in items if text]
+
+
+def _new_record(line, chapter):
+    return {
+        'line': line, 'chapter': chapter, 'id': '', 'question_type': '', 'question_text': '',
+        'code_snippet': '', 'explanation': '', 'hint': '', 'difficulty': '', 'order': '',
+        'is_active': '', 'choices': [], 'blanks': {}, 'errors': [],
+    }
+
+
+def parse_csv(text):
+    """CSV をレコードのリストにする"""
+    reader = csv.DictReader(io.StringIO(text.lstrip('﻿')))
+    if not reader.fieldnames:
+        raise QuestionImportError(['ヘッダー行がありません'])
+    fieldnames = [name.strip() for name in reader.fieldnames]
+    reader.fieldnames = fieldnames
+    missing = [name for name in ('chapter', 'question_type', 'question_text') if name not in fieldnames]
+    if missing:
+        raise QuestionImportError([f"必須の列がありません: {', '.join(missing)}"])
+
+    records = []
+    line = reader.line_num
+    for row in reader:
+        record = _new_record(line + 1, (row.get('chapter') or '').strip())
+        line = reader.line_num
+        if not any((value or '').strip() for value in row.values() if isinstance(value, str)):
+            continue
+        for key in ('id', 'question_type', 'question_text', 'code_snippet', 'explanation',
+                    'hint', 'difficulty', 'order', 'is_active'):
+            record[key] = (row.get(key) or '').strip()
+        if row.get('choices'):
+            record['choices'] = split_values(row['choices'], markers=True)
+        for key, value in row.items():
+            match = _BLANK_COLUMN_RE.match(key or '')
+            if match and (value or '').strip():
+                record['blanks'][int(match.group(1)) - 1] = [text for text, _ in split_values(value)]
+        records.append(record)
+    return records
+
+
+def parse_markdown(text):
+    """Markdown をレコードのリストにする"""
+    records = []
+    chapter = ''
+    record = None
+    state = 'meta'  # meta → text → list → explanation
+    text_lines = []
+    code_lines = None
+    fence = ''
+
+    def finish():
+        if record is None:
+            return
+        record['question_text'] = '\n'.join(text_lines).strip()
+        record['explanation'] = record['explanation'].strip()
+
+    for number, raw in enumerate(text.lstrip('﻿').splitlines(), start=1):
+        line = raw.rstrip()
+        stripped = line.strip()
+
+        # コードブロックの中
+        if code_lines is not None:
+            if stripped.startswith(fence):
+                if record['code_snippet']:
+                    record['errors'].append(f'{number}行目: コードブロックは 1 問につき 1 つです')
+                record['code_snippet'] = '\n'.join(code_lines)
+                code_lines = None
+            else:
+                code_lines.append(raw)
+            continue
+
+        if line.startswith('# '):
+            finish()
+            record = None
+            chapter = line[2:].strip()
+            continue
+        if line.startswith('## '):
+            finish()
+            record = _new_record(number, chapter)
+            record['question_type'] = line[3:].strip()
+            records.append(record)
+            state, text_lines = 'meta', []
+            if not chapter:
+                record['errors'].append(f'{number}行目: 問題の前にチャプター（# 見出し）がありません')
+            continue
+        if record is None:
+            if stripped:
+                raise QuestionImportError([f'{number}行目: 問題（## 見出し）の外に内容があります'])
+            continue
+
+        if stripped.startswith(('```', '~~~')) and state in ('meta', 'text'):
+            fence = stripped[:3]
+            code_lines = []
+            state = 'text'
+            continue
+
+        if state == 'meta':
+            match = _META_RE.match(stripped)
+            if match:
+                key = 'is_active' if match.group(1) == 'active' else match.group(1)
+                record[key] = match.group(2).strip()
+                continue
+            if not stripped:
+                continue
+            state = 'text'
+
+        if state in ('text', 'list') and stripped[:2] in ('- ', '* '):
+            state = 'list'
+            choice = _CHOICE_ITEM_RE.match(stripped)
+            if choice:
+                record['choices'].append((choice.group(2).strip(), choice.group(1) != ' '))
+                continue
+            blank = _BLANK_ITEM_RE.match(stripped)
+            index = int(blank.group(1)) - 1 if blank.group(1) else 0
+            if index in record['blanks']:
+                record['errors'].append(f'{number}行目: 空欄 {index + 1} が重複しています')
+            record['blanks'][index] = [text for text, _ in split_values(blank.group(2))]
+            continue
+
+        if state == 'text':
+            text_lines.append(line)
+        else:
+            state = 'explanation'
+            record['explanation'] += line + '\n'
+
+    if code_lines is not None:
+        raise QuestionImportError(['コードブロックが閉じられていません'])
+    finish()
+    return records
+
+
+PARSERS = {'csv': parse_csv, 'md': parse_markdown}
+
+
+def detect_format(filename):
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.md', '.markdown', '.txt'):
+        return 'md'
+    raise QuestionImportError([f'対応していないファイル形式です: {filename}（.csv / .md）'])
+
+
+def parse(text, fmt):
+    return PARSERS[fmt](text)
+
+
+# ==================== 検証 ====================
+
+def _parse_bool(value):
+    value = value.strip().lower()
+    if not value or value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(value)
+
+
+def _clean_choices(record, errors, where):
+    """レコードの選択肢／正解を (blank_index, choice_text, is_correct) のリストにする"""
+    question_type = record['question_type']
+    if question_type == 'choice':
+        if record['blanks']:
+            errors.append(f'{where}: 選択問題に空欄の正解は指定できません')
+        choices = [(0, text, correct) for text, correct in record['choices']]
+        if len(choices) < 2:
+            errors.append(f'{where}: 選択問題には選択肢が 2 つ以上必要です')
+        if not any(correct for _, _, correct in choices):
+            errors.append(f'{where}: 正解の選択肢（* または [x]）がありません')
+    else:
+        if record['choices']:
+            errors.append(f'{where}: 穴埋め問題に選択肢は指定できません')
+        blanks = record['blanks']
+        expected = list(range(len(blanks)))
+        if not blanks:
+            errors.append(f'{where}: 正解がありません')
+        elif sorted(blanks) != expected:
+            errors.append(f'{where}: 空欄の番号は 1 から連続させてください（{", ".join(str(i + 1) for i in sorted(blanks))}）')
+        elif question_type == 'fill' and len(blanks) != 1:
+            errors.append(f'{where}: fill は空欄 1 つです（複数の空欄は multi_fill）')
+        for index in sorted(blanks):
+            if not blanks[index]:
+                errors.append(f'{where}: 空欄 {index + 1} の正解が空です')
+        # 同じ空欄の重複した別解は 1 つにまとめる
+        choices = [(index, text, True) for index in sorted(blanks) for text in dict.fromkeys(blanks[index])]
+
+    for _, text, _ in choices:
+        if len(text) > CHOICE_TEXT_MAX_LENGTH:
+            errors.append(f'{where}: 選択肢／答えは {CHOICE_TEXT_MAX_LENGTH} 文字以内です: {text[:30]}…')
+    return choices
+
+
+def _clean_record(record, chapters, errors):
+    """レコードを問題のフィールドの dict に変換する（エラーは errors に追加）"""
+    where = f"{record['line']}行目"
+    errors.extend(record['errors'])
+    errors_before = len(errors) - len(record['errors'])
+    values = {}
+
+    chapter = chapters.get(record['chapter'])
+    if chapter is None:
+        errors.append(f"{where}: チャプターが見つかりません: {record['chapter'] or '（空）'}")
+    elif chapter is _AMBIGUOUS:
+        errors.append(f"{where}: 同じタイトルのチャプターが複数あります。ID で指定してください: {record['chapter']}")
+    else:
+        values['chapter_id'] = chapter.id
+
+    if record['question_type'] not in QUESTION_TYPES:
+        errors.append(f"{where}: 問題タイプは {' / '.join(QUESTION_TYPES)} のいずれかです: {record['question_type'] or '（空）'}")
+    values['question_type'] = record['question_type']
+
+    if not record['question_text']:
+        errors.append(f'{where}: 問題文がありません')
+    values['question_text'] = record['question_text']
+    values['code_snippet'] = record['code_snippet'] or None
+    values['explanation'] = record['explanation']
+    values['hint'] = record['hint']
+
+    values['difficulty'] = record['difficulty'] or 'medium'
+    if values['difficulty'] not in DIFFICULTIES:
+        errors.append(f"{where}: 難易度は {' / '.join(DIFFICULTIES)} のいずれかです: {values['difficulty']}")
+
+    try:
+        values['order'] = int(record['order'] or 0)
+    except ValueError:
+        errors.append(f"{where}: 表示順は整数です: {record['order']}")
+    try:
+        values['is_active'] = _parse_bool(record['is_active'])
+    except ValueError:
+        errors.append(f"{where}: 有効かどうかは 1 / 0 などで指定してください: {record['is_active']}")
+
+    if record['id']:
+        try:
+            values['id'] = int(record['id'])
+        except ValueError:
+            errors.append(f"{where}: id は整数です: {record['id']}")
+
+    values['choices'] = _clean_choices(record, errors, where) if values['question_type'] in QUESTION_TYPES else []
+    values['valid'] = len(errors) == errors_before
+    return values
+
+
+_AMBIGUOUS = object()
+
+
+def _load_chapters(records):
+    """レコードのチャプター指定（ID またはタイトル）→ Chapter。タイトルが重複する場合は _AMBIGUOUS"""
+    keys = {record['chapter'] for record in records if record['chapter']}
+    ids = {int(key) for key in keys if key.isdigit()}
+    titles = keys - {str(i) for i in ids}
+    chapters = {}
+    for chapter in Chapter.objects.filter(id__in=ids):
+        chapters[str(chapter.id)] = chapter
+    for chapter in Chapter.objects.filter(title__in=titles):
+        chapters[chapter.title] = _AMBIGUOUS if chapter.title in chapters else chapter
+    return chapters
+
+
+def _existing_choices(question):
+    return [(c.blank_index, c.choice_text, c.is_correct) for c in question.choice_set.all()]
+
+
+def _numbered(choices):
+    """(blank_index, choice_text, is_correct) に空欄ごとの表示順（0 から）を付ける"""
+    orders = {}
+    numbered = []
+    for index, text, correct in choices:
+        orders[index] = orders.get(index, -1) + 1
+        numbered.append((index, text, correct, orders[index]))
+    return numbered
+
+
+def _match_choices(existing, choices):
+    """
+    既存の選択肢（Choice のリスト）と新しい選択肢を対応付け、
+    (更新する (Choice, text, is_correct, order), 追加する (blank_index, text, is_correct, order), 削除する Choice)
+    を返す（dry-run の差分表示が既存の値を使うため、ここでは Choice を書き換えない）
+    同じ空欄で同じテキストの選択肢を優先して対応付け、残りは同じ空欄の中で順に対応付ける
+    （テキストだけを直した選択肢も ID を保つ）
+    """
+    remaining = list(existing)
+    pairs = []
+    unmatched = []
+    for item in _numbered(choices):
+        index, text = item[0], item[1]
+        choice = next((c for c in remaining if c.blank_index == index and c.choice_text == text), None)
+        if choice is None:
+            unmatched.append(item)
+        else:
+            remaining.remove(choice)
+            pairs.append((choice, item))
+    inserts = []
+    for item in unmatched:
+        choice = next((c for c in remaining if c.blank_index == item[0]), None)
+        if choice is None:
+            inserts.append(item)
+        else:
+            remaining.remove(choice)
+            pairs.append((choice, item))
+
+    updates = [
+        (choice, text, correct, order)
+        for choice, (_, text, correct, order) in pairs
+        if (choice.choice_text, choice.is_correct, choice.order) != (text, correct, order)
+    ]
+    return updates, inserts, remaining
+
+
+def build_plan(records, prune=False):
+    """レコードを検証し、既存のデータとの差分（ImportPlan）を作る。エラーがあれば QuestionImportError"""
+    if not records:
+        raise QuestionImportError(['問題が 1 件もありません'])
+
+    errors = []
+    chapters = _load_chapters(records)
+    cleaned = [(record, _clean_record(record, chapters, errors)) for record in records]
+
+    chapter_ids = {values['chapter_id'] for _, values in cleaned if 'chapter_id' in values}
+    question_ids = {values['id'] for _, values in cleaned if 'id' in values}
+    existing = {
+        question.id: question
+        for question in Question.objects.filter(
+            Q(chapter_id__in=chapter_ids) | Q(id__in=question_ids)
+        ).select_related('chapter').prefetch_related(
+            Prefetch('choice_set', queryset=Choice.objects.order_by('blank_index', 'order', 'id'))
+        )
+    }
+
+    by_text = {}
+    for question in existing.values():
+        by_text.setdefault((question.chapter_id, question.question_text.strip()), []).append(question)
+
+    plan = ImportPlan(chapters={c.id: c for c in chapters.values() if c is not _AMBIGUOUS})
+    matched = {}
+    for record, values in cleaned:
+        if not values['valid']:
+            continue
+        where = f"{record['line']}行目"
+        if 'id' in values:
+            question = existing.get(values['id'])
+            if question is None:
+                errors.append(f"{where}: id={values['id']} の問題がありません")
+                continue
+        else:
+            candidates = by_text.get((values.get('chapter_id'), values['question_text']), [])
+            if len(candidates) > 1:
+                errors.append(f'{where}: 同じ問題文の問題が複数あります。id で指定してください')
+                continue
+            question = candidates[0] if candidates else None
+
+        if question is not None:
+            if question.id in matched:
+                errors.append(f"{where}: {matched[question.id]}行目と同じ問題（id={question.id}）を指しています")
+                continue
+            matched[question.id] = record['line']
+        plan.add(question, values)
+
+    if errors:
+        raise QuestionImportError(errors)
+
+    if prune:
+        plan.deletes = sorted(
+            (q for q in existing.values() if q.chapter_id in chapter_ids and q.id not in matched),
+            key=lambda q: (q.chapter_id, q.order, q.id),
+        )
+    return plan
+
+
+# ==================== 差分と書き込み ====================
+
+def _preview(text, length=40):
+    text = ' '.join((text or '').split())
+    return text if len(text) <= length else text[:length] + '…'
+
+
+def _choice_lines(question_type, choices):
+    if question_type == 'choice':
+        return [f"{'*' if correct else ' '} {text}" for _, text, correct in choices]
+    return [f'空欄{index + 1}: {text}' for index, text, _ in choices]
+
+
+class ImportPlan:
+    """インポートで行う追加・更新・削除"""
+
+    def __init__(self, chapters):
+        self.chapters = chapters
+        self.inserts = []   # values
+        self.updates = []   # (question, values, changed_fields, choices_changed)
+        self.deletes = []   # question
+        self.unchanged = 0
+        self.choice_changes = {}  # 問題 ID → (更新する Choice, 追加する選択肢, 削除する Choice)
+
+    def add(self, question, values):
+        if question is None:
+            self.inserts.append(values)
+            return
+        changed = [
+            field for field in QUESTION_FIELDS
+            if (getattr(question, field) or '') != (values[field] or '')
+        ]
+        choices_changed = _existing_choices(question) != values['choices']
+        if choices_changed:
+            self.choice_changes[question.id] = _match_choices(question.choice_set.all(), values['choices'])
+        if changed or choices_changed:
+            self.updates.append((question, values, changed, choices_changed))
+        else:
+            self.unchanged += 1
+
+    def counts(self):
+        changes = self.choice_changes.values()
+        return {
+            'questions_inserted': len(self.inserts),
+            'questions_updated': len(self.updates),
+            'questions_deleted': len(self.deletes),
+            'questions_unchanged': self.unchanged,
+            'choices_inserted': (
+                sum(len(values['choices']) for values in self.inserts)
+                + sum(len(inserts) for _, inserts, _ in changes)
+            ),
+            'choices_updated': sum(len(updates) for updates, _, _ in changes),
+            'choices_deleted': (
+                sum(len(deletes) for _, _, deletes in changes)
+                + sum(len(q.choice_set.all()) for q in self.deletes)
+            ),
+        }
+
+    def summary(self):
+        counts = self.counts()
+        return (
+            f"問題: 追加 {counts['questions_inserted']}・更新 {counts['questions_updated']}・"
+            f"削除 {counts['questions_deleted']}・変更なし {counts['questions_unchanged']} / "
+            f"選択肢: 追加 {counts['choices_inserted']}・更新 {counts['choices_updated']}・"
+            f"削除 {counts['choices_deleted']}"
+        )
+
+    def _chapter_title(self, chapter_id):
+        chapter = self.chapters.get(chapter_id)
+        return chapter.title if chapter else f'#{chapter_id}'
+
+    def diff_lines(self):
+        """追加（+）・更新（~）・削除（-）を人が読める行のリストにする"""
+        lines = []
+        for values in self.inserts:
+            lines.append(
+                f"+ [{self._chapter_title(values['chapter_id'])}] {values['question_type']}: "
+                f"{_preview(values['question_text'])}"
+            )
+            lines.extend(f'    + {line}' for line in _choice_lines(values['question_type'], values['choices']))
+        for question, values, changed, choices_changed in self.updates:
+            lines.append(f"~ #{question.id} [{question.chapter.title}] {_preview(question.question_text)}")
+            for field in changed:
+                old, new = getattr(question, field), values[field]
+                if field == 'chapter_id':
+                    old, new = question.chapter.title, self._chapter_title(new)
+                lines.append(f'    {field}: {_preview(str(old or ""))!r} → {_preview(str(new or ""))!r}')
+            if choices_changed:
+                diff = difflib.unified_diff(
+                    _choice_lines(question.question_type, _existing_choices(question)),
+                    _choice_lines(values['question_type'], values['choices']),
+                    lineterm='', n=0,
+                )
+                lines.extend(
+                    f'    {line[0]} {line[1:]}' for line in diff if line[:1] in '+-' and line[:3] not in ('---', '+++')
+                )
+        for question in self.deletes:
+            lines.append(f"- #{question.id} [{question.chapter.title}] {_preview(question.question_text)}")
+        return lines
+
+    def has_changes(self):
+        return bool(self.inserts or self.updates or self.deletes)
+
+    @transaction.atomic
+    def apply(self, batch_size=500):
+        """1 トランザクションで書き込み、件数を返す"""
+        counts = self.counts()
+        now = timezone.now()
+
+        new_questions = [
+            Question(**{field: values[field] for field in QUESTION_FIELDS}) for values in self.inserts
+        ]
+        Question.objects.bulk_create(new_questions, batch_size=batch_size)
+
+        updated = []
+        update_fields = set()
+        new_choices = [
+            Choice(question=question, blank_index=index, choice_text=text, is_correct=correct, order=order)
+            for question, values in zip(new_questions, self.inserts)
+            for index, text, correct, order in _numbered(values['choices'])
+        ]
+        changed_choices = []
+        removed_choice_ids = []
+        for question, values, changed, _ in self.updates:
+            for field in changed:
+                setattr(question, field, values[field])
+            update_fields.update(changed)
+            # 問題フラグメントのキャッシュキーに使うため、選択肢だけの変更でも更新する
+            question.updated_at = now
+            updated.append(question)
+            # 選択肢は変わった行だけを書き換え、変わっていない選択肢の ID（解答に保存されている）を保つ
+            choice_updates, choice_inserts, choice_deletes = self.choice_changes.get(question.id, ([], [], []))
+            for choice, text, correct, order in choice_updates:
+                choice.choice_text, choice.is_correct, choice.order = text, correct, order
+                changed_choices.append(choice)
+            new_choices.extend(
+                Choice(question=question, blank_index=index, choice_text=text, is_correct=correct, order=order)
+                for index, text, correct, order in choice_inserts
+            )
+            removed_choice_ids.extend(choice.id for choice in choice_deletes)
+        if updated:
+            Question.objects.bulk_update(updated, sorted(update_fields) + ['updated_at'], batch_size=batch_size)
+
+        if removed_choice_ids:
+            Choice.objects.filter(id__in=removed_choice_ids).delete()
+        Choice.objects.bulk_update(changed_choices, ['choice_text', 'is_correct', 'order'], batch_size=batch_size)
+        Choice.objects.bulk_create(new_choices, batch_size=batch_size)
+
+        if self.deletes:
+            Question.objects.filter(id__in=[q.id for q in self.deletes]).delete()
+
+        search.index_questions(
+            Question.objects.filter(id__in=[q.id for q in new_questions + updated]).select_related('chapter')
+        )
+
+        transaction.on_commit(lambda: tutorial_cache.bump(tutorial_cache.CONTENT))
+        return counts
@@ -0,0 +1,297 @@
+# search.py - 問題・学習ガイド・積木の全文検索
+"""
+SQLite FTS5 の仮想テーブル tutorial_search で教材を全文検索する。
+
+- トークナイザーは trigram（3 文字単位）。日本語のように単語を空白で
+  区切らない文章でも部分一致で検索でき、大文字・小文字は区別しない。
+  3 文字未満の検索語はインデックスで引けないため、同じテーブルに対する
+  LIKE で絞り込む（元のテーブルの HTML やコードを走査するよりは小さい）。
+- 1 行が 1 つの教材。rowid は (種類, ID) から決まるので、更新は
+  rowid での DELETE と INSERT だけで済む。
+    title    問題文 / チャプタータイトル / 積木名
+    body     HTML を除いた学習ガイド本文 / 積木の説明
+    code     問題・積木のコードスニペット
+    private  問題の解説とヒント（管理画面の検索だけが対象。学習者の検索では
+             答えが分かってしまうため一致させず、スニペットにも出さない）
+  kind / object_id / chapter_id / visible はインデックス化しない列で、
+  visible は学習者に公開されているか（有効・公開中・チャプターが有効）。
+- インデックスは signals.py の保存・削除シグナルで更新する。シグナルを
+  発火しない一括書き込み（question_import / import_content）は書き込み後に
+  index_questions() / rebuild() を呼ぶ。`manage.py rebuild_search_index`
+  で作り直せる。
+"""
+import html
+import re
+
+from django.apps import apps as global_apps
+from django.db import connection
+from django.utils.html import escape, strip_tags
+
+TABLE = 'tutorial_search'
+
+QUESTION = 'question'
+GUIDE = 'guide'
+BLOCK = 'block'
+KINDS = {QUESTION: 1, GUIDE: 2, BLOCK: 3}
+
+# 学習者の検索で一致させる列と、bm25 の列ごとの重み（title, body, code, private の順）
+PUBLIC_COLUMNS = ('title', 'body', 'code')
+RANK_WEIGHTS = (10.0, 1.0, 2.0, 1.0)
+
+# 検索語の数と長さの上限（MATCH 式が極端に大きくならないように）
+MAX_TERMS = 8
+MAX_TERM_LENGTH = 64
+
+SNIPPET_TOKENS = 40
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.S | re.I)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+CREATE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+    title, body, code, private,
+    kind UNINDEXED, object_id UNINDEXED, chapter_id UNINDEXED, visible UNINDEXED,
+    tokenize = 'trigram'
+)
+"""
+INSERT_SQL = (
+    f'INSERT INTO {TABLE} (rowid, title, body, code, private, kind, object_id, chapter_id, visible) '
+    'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)'
+)
+
+
+def is_available(conn=None):
+    return (conn or connection).vendor == 'sqlite'
+
+
+def _rowid(kind, object_id):
+    return object_id * len(KINDS) + KINDS[kind]
+
+
+# ==================== 文書 ====================
+
+def html_to_text(value):
+    """HTML からタグを除き、実体参照を戻して空白をまとめる"""
+    text = strip_tags(_SCRIPT_STYLE_RE.sub(' ', value or ''))
+    return _WHITESPACE_RE.sub(' ', html.unescape(text)).strip()
+
+
+def question_document(question):
+    private = '\n'.join(part for part in (question.explanation, question.hint) if part)
+    return (
+        _rowid(QUESTION, question.id), question.question_text, '', question.code_snippet or '', private,
+        QUESTION, question.id, question.chapter_id, question.is_active and question.chapter.is_active,
+    )
+
+
+def guide_document(guide):
+    return (
+        _rowid(GUIDE, guide.id), guide.chapter.title, html_to_text(guide.content), '', '',
+        GUIDE, guide.id, guide.chapter_id, guide.is_published and guide.chapter.is_active,
+    )
+
+
+def block_document(block):
+    return (
+        _rowid(BLOCK, block.id), block.name, block.description, block.code_snippet, '',
+        BLOCK, block.id, None, block.is_active,
+    )
+
+
+DOCUMENT_BUILDERS = {QUESTION: question_document, GUIDE: guide_document, BLOCK: block_document}
+
+
+# ==================== 更新 ====================
+
+def _write(rows, delete_rowids=()):
+    if not is_available():
+        return
+    rowids = list(delete_rowids) + [row[0] for row in rows]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rowids), 500):
+            chunk = rowids[start:start + 500]
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        if rows:
+            cursor.executemany(INSERT_SQL, [row[:-1] + (int(bool(row[-1])),) for row in rows])
+
+
+def index_objects(kind, objects):
+    """教材をインデックスに追加（既にあれば置き換え）する。問題・ガイドは chapter を参照する"""
+    _write([DOCUMENT_BUILDERS[kind](obj) for obj in objects])
+
+
+def index_questions(questions):
+    index_objects(QUESTION, questions)
+
+
+def remove(kind, object_ids):
+    _write([], [_rowid(kind, object_id) for object_id in object_ids])
+
+
+def reindex_chapter(chapter):
+    """チャプターのタイトル・有効状態の変更を、そのチャプターの問題とガイドに反映する"""
+    from .models import StudyGuide
+
+    questions = list(chapter.question_set.all())
+    guides = list(StudyGuide.objects.filter(chapter=chapter))
+    for obj in questions + guides:
+        obj.chapter = chapter
+    index_objects(QUESTION, questions)
+    index_objects(GUIDE, guides)
+
+
+def create_table(conn=None):
+    conn = conn or connection
+    if is_available(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_SQL)
+
+
+def drop_table(conn=None):
+    conn = conn or connection
+    if is_available(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def rebuild(apps=global_apps, batch_size=500):
+    """インデックスを作り直し、種類ごとの件数を返す"""
+    if not is_available():
+        return {}
+    querysets = {
+        QUESTION: apps.get_model('tutorial', 'Question').objects.select_related('chapter'),
+        GUIDE: apps.get_model('tutorial', 'StudyGuide').objects.select_related('chapter'),
+        BLOCK: apps.get_model('tutorial', 'BuildingBlock').objects.all(),
+    }
+    create_table()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    counts = {}
+    for kind, queryset in querysets.items():
+        rows = []
+        counts[kind] = 0
+        for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+            rows.append(DOCUMENT_BUILDERS[kind](obj))
+            if len(rows) >= batch_size:
+                _write(rows)
+                counts[kind] += len(rows)
+                rows = []
+        _write(rows)
+        counts[kind] += len(rows)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+    return counts
+
+
+# ==================== 検索 ====================
+
+def parse_terms(query):
+    """検索文字列を空白で区切った検索語のリストにする"""
+    return [term[:MAX_TERM_LENGTH] for term in (query or '').split()][:MAX_TERMS]
+
+
+def _like_pattern(term):
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _where(terms, columns):
+    """
+    検索語の WHERE 句を作る（SQL, パラメーター, MATCH を使うか）
+    3 文字以上の検索語は MATCH、3 文字未満は LIKE。すべての検索語を含む行が一致する
+    """
+    clauses, params = [], []
+    phrases = ['"' + term.replace('"', '""') + '"' for term in terms if len(term) >= 3]
+    if phrases:
+        match = ' AND '.join(phrases)
+        if columns:
+            match = '{%s} : (%s)' % (' '.join(columns), match)
+        clauses.append(f'{TABLE} MATCH %s')
+        params.append(match)
+    for term in terms:
+        if len(term) < 3:
+            clauses.append('(' + ' OR '.join(f"{column} LIKE %s ESCAPE '\\'" for column in columns) + ')')
+            params.extend([_like_pattern(term)] * len(columns))
+    return ' AND '.join(clauses), params, bool(phrases)
+
+
+def matching_ids_sql(kind, query):
+    """管理画面の検索用: 一致する教材の ID を返すサブクエリ（SQL, パラメーター）。検索語が無ければ None"""
+    terms = parse_terms(query)
+    if not terms:
+        return None
+    where, params, _ = _where(terms, PUBLIC_COLUMNS + ('private',))
+    return f'SELECT object_id FROM {TABLE} WHERE {where} AND kind = %s', params + [kind]
+
+
+def _highlight(text):
+    """スニペットを HTML エスケープし、一致箇所を <mark> にする"""
+    return escape(text).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def _fallback_snippet(row, terms, length=80):
+    """MATCH を使わない（短い検索語だけの）場合のスニペットを Python で作る"""
+    lowered_terms = [term.lower() for term in terms]
+    for text in row:
+        text = text or ''
+        lowered = text.lower()
+        positions = [lowered.find(term) for term in lowered_terms if term in lowered]
+        if not positions:
+            continue
+        start = max(min(positions) - length // 3, 0)
+        excerpt = text[start:start + length]
+        for term in sorted(set(lowered_terms), key=len, reverse=True):
+            excerpt = re.sub(
+                re.escape(term), lambda m: _MARK_START + m.group(0) + _MARK_END, excerpt, flags=re.I
+            )
+        return ('…' if start else '') + excerpt + ('…' if start + length < len(text) else '')
+    return (row[0] or '')[:length]
+
+
+def search(query, kinds=None, limit=20, public=True):
+    """
+    教材を検索し、関連度順の結果を返す
+    public=True（学習者向け）では公開中の教材だけを、解説・ヒントを除いた列で検索する
+    戻り値: [{'kind', 'id', 'chapter_id', 'title', 'snippet'（<mark> 付きの HTML）}]
+    """
+    terms = parse_terms(query)
+    if not terms or not is_available():
+        return []
+    columns = PUBLIC_COLUMNS if public else PUBLIC_COLUMNS + ('private',)
+    where, params, use_match = _where(terms, columns)
+    if public:
+        where += ' AND visible = 1'
+    if kinds:
+        where += f" AND kind IN ({', '.join(['%s'] * len(kinds))})"
+        params += list(kinds)
+
+    if use_match:
+        weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+        sql = (
+            f"SELECT kind, object_id, chapter_id, title, "
+            f"snippet({TABLE}, -1, %s, %s, '…', {SNIPPET_TOKENS}) "
+            f"FROM {TABLE} WHERE {where} ORDER BY bm25({TABLE}, {weights}) LIMIT %s"
+        )
+        params = [_MARK_START, _MARK_END] + params + [limit]
+    else:
+        sql = (
+            f"SELECT kind, object_id, chapter_id, title, {', '.join(columns)} "
+            f"FROM {TABLE} WHERE {where} ORDER BY kind, object_id LIMIT %s"
+        )
+        params = params + [limit]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    results = []
+    for row in rows:
+        snippet = row[4] if use_match else _fallback_snippet(row[3:], terms)
+        results.append({
+            'kind': row[0],
+            'id': row[1],
+            'chapter_id': row[2],
+            'title': row[3],
+            'snippet': _highlight(snippet),
+        })
+    return results
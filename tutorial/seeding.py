@@ -0,0 +1,238 @@
+# seeding.py - デフォルトデータの宣言的定義と投入処理
+"""
+デフォルトの架構図テンプレート・コンポーネント・アーキテクチャスロット・
+アーキテクチャテンプレートを宣言的な定義（SPEC）から冪等に投入する。
+
+リクエスト処理中やアプリ起動時（AppConfig.ready）に書き込みを行わないよう、
+投入は `manage.py seed_defaults` からのみ実行する（新しい環境への初回の投入は
+マイグレーション 0015 が、その時点の定義のコピーで行う）。
+"""
+from django.apps import apps as global_apps
+from django.db import transaction
+
+DEFAULT_DIAGRAM_NAME = "物品管理系统架构图"
+
+# ==================== 架构图模板 ====================
+
+DEFAULT_DIAGRAM = {
+    'name': DEFAULT_DIAGRAM_NAME,
+    'description': '基于Django的物品管理系统标准架构',
+    'layers': [
+        {'name': 'HTTP层',   'color': '#3B82F6', 'order': 0, 'x': 100, 'y': 200, 'size': 160},
+        {'name': 'URL路由层', 'color': '#10B981', 'order': 1, 'x': 320, 'y': 200, 'size': 160},
+        {'name': '视图层',   'color': '#8B5CF6', 'order': 2, 'x': 540, 'y': 200, 'size': 160},
+        {'name': '表单层',   'color': '#EC4899', 'order': 3, 'x': 760, 'y': 200, 'size': 160},
+        {'name': '模型层',   'color': '#EF4444', 'order': 4, 'x': 980, 'y': 200, 'size': 160},
+        {'name': '模板层',   'color': '#06B6D4', 'order': 5, 'x': 1200,'y': 200, 'size': 160},
+    ],
+    'connections': [
+        {'from': 'http_request', 'to': 'url_router', 'type': 'solid'},
+        {'from': 'url_items', 'to': 'item_list_view', 'type': 'solid'},
+        {'from': 'url_add', 'to': 'item_create_view', 'type': 'solid'},
+        {'from': 'url_detect', 'to': 'item_delete_view', 'type': 'solid'},
+        {'from': 'item_list_view', 'to': 'item_model', 'type': 'solid'},
+        {'from': 'item_create_view', 'to': 'item_form', 'type': 'solid'},
+        {'from': 'item_delete_view', 'to': 'item_model', 'type': 'solid'},
+        {'from': 'item_form', 'to': 'item_model', 'type': 'solid'},
+        {'from': 'item_list_view', 'to': 'item_list_template', 'type': 'dashed'},
+        {'from': 'item_create_view', 'to': 'item_form_template', 'type': 'dashed'},
+    ],
+}
+
+DEFAULT_DIAGRAM_COMPONENTS = [
+    # HTTP层
+    {'name': 'HTTP请求', 'type': 'http_request', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#3B82F6', 'layer': 'HTTP层', 'allowed_types': ['url'], 'order': 0},
+
+    # URL路由层
+    {'name': 'URL路由器', 'type': 'url_router', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['url'], 'order': 0},
+    {'name': '/items/', 'type': 'url_items', 'x': 200, 'y': 10, 'width': 100, 'height': 40, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['view'], 'order': 1},
+    {'name': '/items/add/', 'type': 'url_add', 'x': 330, 'y': 10, 'width': 100, 'height': 40, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['view'], 'order': 2},
+    {'name': '/items/detect/', 'type': 'url_detect', 'x': 460, 'y': 10, 'width': 100, 'height': 40, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['view'], 'order': 3},
+
+    # 视图层
+    {'name': 'ItemListView', 'type': 'item_list_view', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#8B5CF6', 'layer': '视图层', 'allowed_types': ['view'], 'order': 0},
+    {'name': 'ItemCreateView', 'type': 'item_create_view', 'x': 200, 'y': 10, 'width': 120, 'height': 60, 'color': '#8B5CF6', 'layer': '视图层', 'allowed_types': ['view'], 'order': 1},
+    {'name': 'ItemDeleteView', 'type': 'item_delete_view', 'x': 350, 'y': 10, 'width': 120, 'height': 60, 'color': '#8B5CF6', 'layer': '视图层', 'allowed_types': ['view'], 'order': 2},
+
+    # 表单层
+    {'name': 'ItemForm', 'type': 'item_form', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#EC4899', 'layer': '表单层', 'allowed_types': ['form'], 'order': 0},
+
+    # 模型层
+    {'name': 'Item模型', 'type': 'item_model', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#EF4444', 'layer': '模型层', 'allowed_types': ['data_model'], 'order': 0},
+
+    # 模板层
+    {'name': 'item_list.html', 'type': 'item_list_template', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#06B6D4', 'layer': '模板层', 'allowed_types': ['template'], 'order': 0},
+    {'name': '表单模板', 'type': 'item_form_template', 'x': 200, 'y': 10, 'width': 120, 'height': 60, 'color': '#06B6D4', 'layer': '模板层', 'allowed_types': ['template'], 'order': 1},
+]
+
+# ==================== アーキテクチャスロット ====================
+
+DEFAULT_SLOTS = [
+    {
+        'name': 'データモデル層',
+        'description': 'データモデルとデータベース構造を定義',
+        'allowed_block_types': ['data_model'],
+        'x_position': 100,
+        'y_position': 100,
+        'border_color': '#4C56B3',
+        'background_color': '#F0F9FF',
+        'required': False,
+        'order': 1
+    },
+    {
+        'name': 'ビジネスロジック層',
+        'description': 'ビジネスロジックと計算を処理',
+        'allowed_block_types': ['view'],
+        'x_position': 400,
+        'y_position': 100,
+        'border_color': '#059669',
+        'background_color': '#F0FDF4',
+        'required': False,
+        'order': 2
+    },
+    {
+        'name': 'ビューレイヤー',
+        'description': 'HTTPリクエストとレスポンスを処理',
+        'allowed_block_types': ['view'],
+        'x_position': 100,
+        'y_position': 300,
+        'border_color': '#DC2626',
+        'background_color': '#FEF2F2',
+        'required': False,
+        'order': 3
+    },
+    {
+        'name': 'URL層',
+        'description': 'URLルーティングを定義',
+        'allowed_block_types': ['url'],
+        'x_position': 400,
+        'y_position': 300,
+        'border_color': '#0891B2',
+        'background_color': '#F0FDFA',
+        'required': False,
+        'order': 4
+    },
+    {
+        'name': 'テンプレート層',
+        'description': 'フロントエンドテンプレートを定義',
+        'allowed_block_types': ['template'],
+        'x_position': 700,
+        'y_position': 300,
+        'border_color': '#DB2777',
+        'background_color': '#FDF2F8',
+        'required': False,
+        'order': 5
+    },
+]
+
+# ==================== アーキテクチャテンプレート ====================
+
+DEFAULT_ARCHITECTURE_TEMPLATE = {
+    'name': '記物本システム標準アーキテクチャ',
+    'description': '标准的Django Web应用程序分层架构',
+    'is_default': True,
+    'is_active': True,
+}
+
+# ==================== 投入処理 ====================
+
+def _model(apps, name):
+    return apps.get_model('tutorial', name)
+
+
+def seed_default_diagram(apps=global_apps):
+    """
+    デフォルト架構図テンプレートとコンポーネントを投入（冪等）
+    既存のテンプレート・コンポーネントは変更しない
+    戻り値: (テンプレートを作成したか, 追加したコンポーネント数)
+    """
+    Template = _model(apps, 'ArchitectureDiagramTemplate')
+    Component = _model(apps, 'DiagramComponent')
+
+    with transaction.atomic():
+        diagram = Template.objects.filter(name=DEFAULT_DIAGRAM['name']).first()
+        created = diagram is None
+        if created:
+            diagram = Template.objects.create(
+                name=DEFAULT_DIAGRAM['name'],
+                description=DEFAULT_DIAGRAM['description'],
+                layers=[dict(layer) for layer in DEFAULT_DIAGRAM['layers']],
+                connections=[dict(conn) for conn in DEFAULT_DIAGRAM['connections']],
+            )
+
+        existing_types = set(
+            Component.objects.filter(diagram=diagram).values_list('component_type', flat=True)
+        )
+        new_components = [
+            Component(
+                diagram=diagram,
+                name=comp['name'],
+                component_type=comp['type'],
+                position_x=comp['x'],
+                position_y=comp['y'],
+                width=comp['width'],
+                height=comp['height'],
+                color=comp['color'],
+                allowed_block_types=list(comp['allowed_types']),
+                layer=comp['layer'],
+                order=comp['order'],
+            )
+            for comp in DEFAULT_DIAGRAM_COMPONENTS
+            if comp['type'] not in existing_types
+        ]
+        Component.objects.bulk_create(new_components)
+
+    # bulk_create はシグナルを送らないため、ここでキャッシュを破棄する
+    from .diagram import invalidate_diagram_cache
+    invalidate_diagram_cache(diagram.name)
+
+    return created, len(new_components)
+
+
+def seed_default_slots(apps=global_apps):
+    """
+    デフォルトのアーキテクチャスロットを投入（冪等）
+    任意スロットが一つも無い場合のみ作成する
+    戻り値: 作成したスロット数
+    """
+    Slot = _model(apps, 'ArchitectureSlot')
+
+    with transaction.atomic():
+        if Slot.objects.filter(required=False).exists():
+            return 0
+        slots = Slot.objects.bulk_create(
+            [Slot(**dict(slot_data, allowed_block_types=list(slot_data['allowed_block_types'])))
+             for slot_data in DEFAULT_SLOTS]
+        )
+
+    from .diagram import invalidate_slots_cache
+    invalidate_slots_cache()
+    return len(slots)
+
+
+def seed_default_architecture_template(apps=global_apps):
+    """
+    デフォルトのアーキテクチャテンプレートを投入（冪等）
+    is_default のテンプレートが無い場合のみ作成する
+    戻り値: 作成したかどうか
+    """
+    ArchitectureTemplate = _model(apps, 'ArchitectureTemplate')
+
+    with transaction.atomic():
+        if ArchitectureTemplate.objects.filter(is_default=True).exists():
+            return False
+        ArchitectureTemplate.objects.create(**DEFAULT_ARCHITECTURE_TEMPLATE)
+    return True
+
+
+def seed_all(apps=global_apps):
+    """すべてのデフォルトデータを投入し、結果をまとめて返す"""
+    diagram_created, components_created = seed_default_diagram(apps)
+    slots_created = seed_default_slots(apps)
+    template_created = seed_default_architecture_template(apps)
+    return {
+        'diagram_created': diagram_created,
+        'components_created': components_created,
+        'slots_created': slots_created,
+        'template_created': template_created,
+    }
@@ -0,0 +1,32 @@
+# sessions.py - ログインセッション（django_session）の掃除
+"""
+期限切れのセッション行を chunk_size 件ずつ DELETE する。
+
+Django 標準の clearsessions は期限切れの行を DELETE 1 文で消すため、行数が
+多いと SQLite の書き込みロックを長く握り、学習時間のハートビートなどの
+書き込みを待たせる。ここでは session_key を chunk_size 件ずつ取り出して
+消し、1 回のトランザクションを短くする。
+signed_cookies エンジンでは行は作られないが、切り替える前の行は残るので
+同じように削除できる。
+"""
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+from .metrics import record_count
+
+
+def purge_expired_sessions(chunk_size=500, now=None):
+    """期限切れのセッションを削除し、件数を返す"""
+    now = now or timezone.now()
+    purged = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:chunk_size]
+        )
+        if not keys:
+            break
+        deleted, _ = Session.objects.filter(session_key__in=keys).delete()
+        purged += deleted
+
+    record_count('sessions_purged', purged)
+    return purged
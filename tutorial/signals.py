@@ -1,96 +1,146 @@
-# apps.py - 修正版本
-from django.apps import AppConfig
+# signals.py - シグナルハンドラー
+"""
+tutorial アプリのシグナルハンドラー
+TutorialConfig.ready() から import されることで登録される
+"""
+import logging
 
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
 
-class TutorialConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'tutorial'
-    verbose_name = '学習管理システム'
+from . import cache as tutorial_cache
+from . import search
+from .diagram import invalidate_diagram_cache, invalidate_slots_cache
+from .models import (
+    UserProfile, UserProgress, UserArchitecture, ArchitectureDiagramTemplate,
+    DiagramComponent, ArchitectureSlot, ArchitectureTemplate, Chapter, StudyGuide,
+    StudyGuideAttachment, Question, Choice, BuildingBlock, Badge, UserBadge,
+    UserQuestionAnswer, WrongAnswer, ChapterResult
+)
+from .tasks import award_chapter_completion, enqueue
 
-    def ready(self):
-        """
-        应用启动时执行的初始化代码
-        注册信号处理器和其他初始化逻辑
-        """
-        # 导入信号处理器
-        try:
-            import tutorial.signals
-            print("✅ 信号处理器导入成功")
-        except ImportError as e:
-            print(f"⚠️ 信号处理器导入失败: {e}")
-        except Exception as e:
-            print(f"⚠️ 信号处理器初始化异常: {e}")
-        
-        # 延迟导入模型方法以避免循环导入
+logger = logging.getLogger(__name__)
+
+SEARCH_KINDS = {Question: search.QUESTION, StudyGuide: search.GUIDE, BuildingBlock: search.BLOCK}
+
+# ==================== ユーザープロファイル ====================
+
+@receiver(post_save, sender=User, dispatch_uid="tutorial_create_user_profile")
+def create_user_profile(sender, instance, created, **kwargs):
+    """ユーザープロファイルを作成"""
+    if created:
         try:
-            # 检查数据库表是否存在
-            from django.db import connection
-            tables = connection.introspection.table_names()
-            
-            # 只有在必要表存在时才尝试导入模型方法
-            needed_tables = ['tutorial_chapter', 'tutorial_userprogress']
-            if all(table in tables for table in needed_tables):
-                from .models import get_user_statistics
-                # 动态添加方法到User模型
-                from django.contrib.auth import get_user_model
-                User = get_user_model()
-                
-                if not hasattr(User, 'get_statistics'):
-                    User.add_to_class('get_statistics', get_user_statistics)
-                    print("✅ 用户统计方法添加成功")
-            else:
-                print("⏳ 数据库表未就绪，跳过模型方法初始化")
-                
+            UserProfile.objects.create(user=instance)
+            # デフォルトアーキテクチャ図を作成
+            UserArchitecture.objects.create(user=instance)
         except Exception as e:
-            print(f"⚠️ 模型方法初始化失败: {e}")
+            logger.error(f"ユーザープロファイル作成失敗: {e}")
 
-        # 初始化默认数据（可选）
-        self.initialize_default_data()
+@receiver(post_save, sender=User, dispatch_uid="tutorial_save_user_profile")
+def save_user_profile(sender, instance, **kwargs):
+    """ユーザープロファイルを保存"""
+    try:
+        if hasattr(instance, 'userprofile'):
+            instance.userprofile.save()
+        else:
+            UserProfile.objects.create(user=instance)
+    except Exception as e:
+        logger.error(f"ユーザープロファイル保存失敗: {e}")
 
-    def initialize_default_data(self):
-        """
-        初始化默认数据
-        """
+@receiver(post_save, sender=UserProgress, dispatch_uid="tutorial_update_user_profile_on_progress")
+def update_user_profile_on_progress(sender, instance, created, **kwargs):
+    """
+    進捗更新時にユーザープロファイルを更新
+    経験値・レベル・バッジの計算はバックグラウンドジョブ（award_chapter_completion）で行う
+    """
+    # チャプターが完了し、経験値がまだ授与されていない場合のみ処理
+    if instance.completed and not instance.experience_awarded:
         try:
-            from django.db import connection
-            tables = connection.introspection.table_names()
-            
-            # 检查必要表是否存在
-            needed_tables = [
-                'tutorial_chapter',
-                'tutorial_studyguide', 
-                'tutorial_question',
-                'tutorial_choice',
-                'tutorial_userprogress',
-                'tutorial_architecturetemplate'
-            ]
-            
-            # 如果必要表不存在，跳过初始化
-            if not all(table in tables for table in needed_tables):
-                print("⏳ 数据库表未就绪，跳过默认数据初始化")
-                return
-            
-            # 检查是否已经有默认模板
-            from .models import ArchitectureTemplate
-            if not ArchitectureTemplate.objects.filter(is_default=True).exists():
-                print("🔄 创建默认架构图模板...")
-                default_template = ArchitectureTemplate.objects.create(
-                    name='記物本システム標準アーキテクチャ',
-                    description='标准的Django Web应用程序分层架构',
-                    layout_type='hierarchical',
-                    width=800,
-                    height=600,
-                    background_color='#f8f9fa',
-                    is_default=True,
-                    is_active=True
-                )
-                print(f"✅ 默认模板创建成功: {default_template.name}")
-                
-                # 创建默认插槽
-                from tutorial.signals import create_default_slots
-                create_default_slots(default_template)
-                
-            print("✅ 默认数据初始化完成")
-            
+            enqueue(award_chapter_completion, instance.id)
         except Exception as e:
-            print(f"⚠️ 默认数据初始化失败: {e}")
\ No newline at end of file
+            logger.error(f"経験値授与ジョブの登録失敗: {e}")
+
+# ==================== キャッシュ破棄 ====================
+
+@receiver([post_save, post_delete], sender=ArchitectureDiagramTemplate)
+def invalidate_diagram_template_cache(sender, instance, **kwargs):
+    """架構図テンプレート変更時にキャッシュを破棄"""
+    invalidate_diagram_cache(instance.name)
+
+@receiver([post_save, post_delete], sender=DiagramComponent)
+def invalidate_diagram_component_cache(sender, instance, **kwargs):
+    """架構図コンポーネント変更時に所属テンプレートのキャッシュを破棄"""
+    name = ArchitectureDiagramTemplate.objects.filter(
+        id=instance.diagram_id
+    ).values_list('name', flat=True).first()
+    if name:
+        invalidate_diagram_cache(name)
+
+@receiver([post_save, post_delete], sender=ArchitectureSlot)
+def invalidate_architecture_slot_cache(sender, instance, **kwargs):
+    """アーキテクチャスロット変更時にキャッシュを破棄"""
+    invalidate_slots_cache()
+
+# ==================== キャッシュのバージョン更新 ====================
+
+CONTENT_MODELS = (
+    Chapter, StudyGuide, StudyGuideAttachment, Question, Choice, BuildingBlock,
+    Badge, ArchitectureSlot, ArchitectureTemplate,
+)
+USER_MODELS = (
+    UserProgress, UserQuestionAnswer, WrongAnswer, ChapterResult, UserBadge,
+    UserArchitecture, UserProfile,
+)
+
+def bump_content_cache(sender, **kwargs):
+    """教材データの変更で content 名前空間を無効化"""
+    tutorial_cache.bump(tutorial_cache.CONTENT)
+
+def bump_user_cache(sender, instance, **kwargs):
+    """ユーザーデータの変更でそのユーザーの user 名前空間を無効化"""
+    tutorial_cache.bump(tutorial_cache.USER, instance.user_id)
+    if sender is UserProfile:
+        tutorial_cache.bump(tutorial_cache.LEADERBOARD)
+
+for _model in CONTENT_MODELS:
+    post_save.connect(bump_content_cache, sender=_model, dispatch_uid=f"tutorial_cache_content_save_{_model.__name__}")
+    post_delete.connect(bump_content_cache, sender=_model, dispatch_uid=f"tutorial_cache_content_delete_{_model.__name__}")
+m2m_changed.connect(bump_content_cache, sender=BuildingBlock.chapters.through, dispatch_uid="tutorial_cache_content_block_chapters")
+
+for _model in USER_MODELS:
+    post_save.connect(bump_user_cache, sender=_model, dispatch_uid=f"tutorial_cache_user_save_{_model.__name__}")
+    post_delete.connect(bump_user_cache, sender=_model, dispatch_uid=f"tutorial_cache_user_delete_{_model.__name__}")
+
+@receiver([post_save, post_delete], sender=Choice)
+def touch_question_on_choice_change(sender, instance, **kwargs):
+    """
+    選択肢の変更で問題の updated_at を更新する
+    chapter_detail の問題フラグメントは問題の updated_at をキーにキャッシュしている
+    """
+    Question.objects.filter(id=instance.question_id).update(updated_at=timezone.now())
+
+# ==================== 全文検索 ====================
+
+@receiver(post_save, sender=Question, dispatch_uid="tutorial_search_index_question")
+@receiver(post_save, sender=StudyGuide, dispatch_uid="tutorial_search_index_guide")
+@receiver(post_save, sender=BuildingBlock, dispatch_uid="tutorial_search_index_block")
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """教材の保存で全文検索インデックスの行を置き換える（loaddata の raw 保存では何もしない）"""
+    if raw:
+        return
+    search.index_objects(SEARCH_KINDS[sender], [instance])
+
+@receiver(post_delete, sender=Question, dispatch_uid="tutorial_search_remove_question")
+@receiver(post_delete, sender=StudyGuide, dispatch_uid="tutorial_search_remove_guide")
+@receiver(post_delete, sender=BuildingBlock, dispatch_uid="tutorial_search_remove_block")
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove(SEARCH_KINDS[sender], [instance.id])
+
+@receiver(post_save, sender=Chapter, dispatch_uid="tutorial_search_reindex_chapter")
+def reindex_chapter_search(sender, instance, created, raw=False, **kwargs):
+    """チャプターのタイトル・有効状態は問題とガイドの行に含まれるため、まとめて更新する"""
+    if raw or created:
+        return
+    search.reindex_chapter(instance)
@@ -0,0 +1,103 @@
+# storage.py - 添付ファイル・ガイド画像のストレージ
+"""
+アップロードされたファイルを SHA-256 で重複排除して保存するストレージ。
+
+- 実体は <MEDIA_ROOT>/<TUTORIAL_BLOB_DIR>/<先頭2文字>/<SHA-256> に 1 つだけ置く。
+- モデルに保存する名前は <upload_to>/<SHA-256>/<元のファイル名>。実体への
+  ハードリンクなので、同じ内容を別の名前で上げてもディスクは増えず、
+  同じ名前・同じ内容の再アップロードでは既存の名前をそのまま返す
+  （Django 既定の _aRLSC3i のような接尾辞付きのコピーを作らない）。
+- 実体のリンク数（st_nlink）が参照カウントになる。delete() は名前だけを
+  消し、どこからもリンクされなくなった実体（st_nlink == 1）は gc_media
+  コマンドで削除する（更新から TUTORIAL_BLOB_GC_GRACE_SECONDS 秒以内の実体は
+  保存中の可能性があるので残す）。
+- ハードリンクを作れないファイルシステムではコピーにフォールバックする。
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+# <upload_to>/<SHA-256>/<ファイル名>
+CONTENT_ADDRESSED_NAME_RE = re.compile(r'^(?P<directory>.+)/(?P<digest>[0-9a-f]{64})/(?P<filename>[^/]+)$')
+
+# ファイル名部分の最大長（名前全体が FileField の max_length に収まるように）
+MAX_FILENAME_LENGTH = 100
+
+
+def blob_dir():
+    return getattr(settings, 'TUTORIAL_BLOB_DIR', 'blobs')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """SHA-256 で重複排除し、実体をハードリンクで共有する FileSystemStorage"""
+
+    def blob_name(self, digest):
+        return posixpath.join(blob_dir(), digest[:2], digest)
+
+    def get_available_name(self, name, max_length=None):
+        # 保存先は内容のハッシュで決まるため、ここでは名前を変えない
+        return name
+
+    def _save(self, name, content):
+        digest, blob_path = self._store_blob(content)
+
+        directory, filename = posixpath.split(name)
+        stem, ext = os.path.splitext(self.get_valid_name(filename))
+        filename = stem[:MAX_FILENAME_LENGTH - len(ext)] + ext
+        name = posixpath.join(directory, digest, filename)
+
+        path = self.path(name)
+        if os.path.exists(path):
+            return name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(blob_path, path)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            logger.warning(f"ハードリンクを作成できないためコピーします: {name} ({e})")
+            shutil.copyfile(blob_path, path)
+        return name
+
+    def _store_blob(self, content):
+        """内容を一時ファイルに書きながらハッシュを計算し、実体として保存する"""
+        upload_dir = self.path(blob_dir())
+        os.makedirs(upload_dir, exist_ok=True)
+        sha256 = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    f.write(chunk)
+            digest = sha256.hexdigest()
+            blob_path = self.path(self.blob_name(digest))
+            if os.path.exists(blob_path):
+                os.unlink(tmp_path)
+                # gc_media は最近更新された実体を消さないので、リンクを作るまでの間に消されない
+                os.utime(blob_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+                os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return digest, blob_path
+
+
+content_addressed_storage = ContentAddressedStorage()
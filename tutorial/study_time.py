@@ -0,0 +1,188 @@
+# study_time.py - 学習時間（ChapterStudyTime）の集計処理
+"""
+学習時間はハートビートごとに加算する（アクティブ時間の積算）
+
+- クライアントは約 30 秒ごとに active フラグ付きのハートビートを送る。
+  サーバーはセッションの last_heartbeat_at（無ければ start_time）からの
+  経過秒数を、active かつ TUTORIAL_STUDY_IDLE_CUTOFF_SECONDS 以下の場合だけ
+  total_seconds に加算する。間隔が空きすぎた区間（タブを開いたまま放置、
+  スリープなど）は数えない。加算は UPDATE 1 文で行うため、同時に届いた
+  ハートビートで二重に数えることはない。
+- セッション終了（end_chapter_study / sendBeacon）は最後の区間を同じ規則で
+  加算してから閉じる。
+- 終了通知が届かなかったセッションは keyset ページング（id 順）で chunk_size
+  件ずつ UPDATE 1 文で閉じる。ハートビートのあるセッションは積算済みの値を
+  そのまま使い、ハートビートの無い古いセッションだけ start_time からの
+  経過秒数（max_seconds が上限）で記録する。
+"""
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.db.models.lookups import LessThanOrEqual
+from django.utils import timezone
+
+from .metrics import record_count
+from .models import ChapterStudyTime
+
+
+class SecondsSince(models.Func):
+    """SecondsSince(now, 'start_time'): start_time から now までの経過秒数（整数）"""
+    output_field = models.IntegerField()
+    arity = 2
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="CAST(ROUND((julianday(%(expressions)s)) * 86400) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="CAST(EXTRACT(EPOCH FROM (%(expressions)s)) AS INTEGER)",
+            arg_joiner=" - ",
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="TIMESTAMPDIFF(SECOND, %(expressions)s)",
+            arg_joiner=", ",
+            **extra_context
+        )
+
+
+def max_session_seconds():
+    return getattr(settings, 'TUTORIAL_STUDY_SESSION_MAX_SECONDS', 4 * 3600)
+
+
+def idle_cutoff_seconds():
+    return getattr(settings, 'TUTORIAL_STUDY_IDLE_CUTOFF_SECONDS', 90)
+
+
+def _now_value(now):
+    return models.Value(now, output_field=models.DateTimeField())
+
+
+def parse_active(value):
+    """ハートビートの active フラグ（JSON の真偽値・フォームの文字列）を解釈。未指定はアクティブ"""
+    if isinstance(value, str):
+        return value.strip().lower() not in ('false', '0', 'no', 'off', '')
+    return value is None or bool(value)
+
+
+def active_interval(now, cutoff=None):
+    """
+    前回のハートビート（無ければ start_time）から now までの秒数。
+    cutoff 秒を超える区間はアイドルとみなして 0 を返す式
+    """
+    cutoff = idle_cutoff_seconds() if cutoff is None else cutoff
+    interval = SecondsSince(_now_value(now), Coalesce('last_heartbeat_at', 'start_time'))
+    return models.Case(
+        models.When(LessThanOrEqual(interval, cutoff), then=Greatest(interval, 0)),
+        default=0,
+    )
+
+
+def _session_queryset(session_id, user, chapter_id):
+    return ChapterStudyTime.objects.filter(
+        id=session_id, user=user, chapter_id=chapter_id, end_time__isnull=True
+    )
+
+
+def _heartbeat_queryset(session_id, user, chapter_id, now):
+    # 遅れて届いた古いハートビートは無視する（last_heartbeat_at を巻き戻さない）
+    return _session_queryset(session_id, user, chapter_id).filter(
+        models.Q(last_heartbeat_at__isnull=True) | models.Q(last_heartbeat_at__lt=now)
+    )
+
+
+def _heartbeat_fields(now, active):
+    fields = {'last_heartbeat_at': now}
+    if active:
+        fields['total_seconds'] = models.F('total_seconds') + active_interval(now)
+    return fields
+
+
+def _close_fields(now, active):
+    total_seconds = models.F('total_seconds')
+    if active:
+        total_seconds = total_seconds + active_interval(now)
+    return {'end_time': now, 'last_heartbeat_at': now, 'total_seconds': Greatest(total_seconds, 1)}
+
+
+def record_heartbeat(session_id, user, chapter_id, active=True, now=None):
+    """ハートビートを記録し、更新したら True を返す（終了済み・存在しないセッションは False）"""
+    now = now or timezone.now()
+    return bool(_heartbeat_queryset(session_id, user, chapter_id, now).update(**_heartbeat_fields(now, active)))
+
+
+async def arecord_heartbeat(session_id, user, chapter_id, active=True, now=None):
+    """record_heartbeat の非同期版"""
+    now = now or timezone.now()
+    return bool(await _heartbeat_queryset(session_id, user, chapter_id, now).aupdate(**_heartbeat_fields(now, active)))
+
+
+def finish_session(session_id, user, chapter_id, active=True, now=None):
+    """
+    最後の区間を加算してセッションを閉じ、閉じたら True を返す
+    end_time が未設定の場合だけ更新するため、終了通知が重複しても 1 回しか閉じない
+    """
+    now = now or timezone.now()
+    return bool(_session_queryset(session_id, user, chapter_id).update(**_close_fields(now, active)))
+
+
+def close_sessions(queryset, now=None, max_seconds=None, chunk_size=500):
+    """
+    queryset に含まれる未終了セッションを閉じ、閉じた件数を返す
+    ハートビートのあるセッション: total_seconds = max(積算値, 1)
+    ハートビートの無いセッション: total_seconds = max(min(経過秒数, max_seconds), 既存の値, 1)
+    """
+    now = now or timezone.now()
+    max_seconds = max_seconds or max_session_seconds()
+    queryset = queryset.filter(end_time__isnull=True)
+
+    total_seconds = models.Case(
+        models.When(last_heartbeat_at__isnull=False, then=Greatest(models.F('total_seconds'), 1)),
+        default=Greatest(
+            Least(SecondsSince(_now_value(now), 'start_time'), max_seconds),
+            models.F('total_seconds'),
+            1,
+        ),
+    )
+
+    closed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        with transaction.atomic():
+            # 取得後に他のリクエストが閉じたセッションは対象外にする
+            closed += ChapterStudyTime.objects.filter(id__in=ids, end_time__isnull=True).update(
+                end_time=now, total_seconds=total_seconds
+            )
+
+    record_count('study_sessions_closed', closed)
+    return closed
+
+
+def sweep_stale_sessions(stale_hours=None, max_seconds=None, chunk_size=500):
+    """
+    最後のハートビート（無ければ start_time）から stale_hours 時間以上経った
+    未終了セッションを閉じ、件数を返す
+    """
+    stale_hours = stale_hours or getattr(settings, 'TUTORIAL_STUDY_SESSION_STALE_HOURS', 24)
+    now = timezone.now()
+    stale = ChapterStudyTime.objects.alias(
+        last_seen=Coalesce('last_heartbeat_at', 'start_time')
+    ).filter(
+        last_seen__lt=now - timezone.timedelta(hours=stale_hours)
+    )
+    return close_sessions(stale, now=now, max_seconds=max_seconds, chunk_size=chunk_size)
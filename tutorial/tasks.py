@@ -0,0 +1,338 @@
+# tasks.py - バックグラウンドジョブ
+"""
+チャプター結果の記録や経験値・バッジの授与など、レスポンスを待たせる
+必要のない副作用をバックグラウンドジョブとして実行する。
+
+- @task で登録した関数を enqueue() すると Job テーブルに 1 行追加する。
+  呼び出し元のトランザクションと同時にコミットされるため、ロールバック
+  された処理のジョブが実行されることはない。
+- run_jobs コマンドのワーカープロセスが Job を取り出して実行する。
+  失敗したジョブは TUTORIAL_JOB_RETRY_DELAY 秒から倍々に間隔を空けて
+  max_attempts 回まで再試行する。ジョブは再実行されても結果が変わらない
+  よう（冪等に）書くこと。
+- settings.TUTORIAL_PERIODIC_JOBS に登録したジョブは、ワーカーが
+  指定した間隔ごとにキューへ追加する（cron を別に用意しなくてよい）。
+- settings.TUTORIAL_JOB_BACKEND は既定で 'db'。ワーカーが動いていない場合
+  （実行予定を TUTORIAL_JOB_STALL_SECONDS 秒過ぎた待機中のジョブがある場合）は、
+  enqueue() がログに警告し、`manage.py check --database` も警告する。
+  'immediate' ではコミット後にその場で実行する。この場合も Job を記録して
+  run_job() で実行するため、失敗したジョブはワーカーが再試行する。
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import downloads
+from . import sessions as login_sessions
+from .study_time import sweep_stale_sessions
+from .models import (
+    ChapterResult, Job, UserProfile, UserProgress, UserQuestionAnswer,
+    calculate_experience_for_chapter
+)
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(func=None, *, max_attempts=5):
+    """関数をバックグラウンドジョブとして登録するデコレーター"""
+    def decorator(f):
+        f.task_name = f"{f.__module__}.{f.__name__}"
+        f.max_attempts = max_attempts
+        _registry[f.task_name] = f
+        return f
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def enqueue(func, *args, **kwargs):
+    """
+    func(*args, **kwargs) をバックグラウンドで実行する（引数は JSON で保存できる値のみ）
+    キューに登録した Job を返す（immediate バックエンドではコミット後に記録するため None）
+    """
+    name = getattr(func, 'task_name', None)
+    if name not in _registry:
+        raise ValueError(f"@task で登録されていない関数です: {func!r}")
+
+    payload = {'args': list(args), 'kwargs': kwargs}
+    if getattr(settings, 'TUTORIAL_JOB_BACKEND', 'db') == 'immediate':
+        transaction.on_commit(lambda: _run_immediately(func, payload))
+        return None
+
+    job = Job.objects.create(name=name, payload=payload, max_attempts=func.max_attempts)
+    _warn_if_stalled()
+    return job
+
+
+def stalled_job_count(stall_seconds=None):
+    """実行予定を stall_seconds 秒以上過ぎても待機中のジョブ数（ワーカーが動いていない兆候）"""
+    stall_seconds = stall_seconds or getattr(settings, 'TUTORIAL_JOB_STALL_SECONDS', 600)
+    cutoff = timezone.now() - timedelta(seconds=stall_seconds)
+    return Job.objects.filter(status='pending', run_at__lt=cutoff).count()
+
+
+_last_stall_check = {'at': None}
+
+
+def _warn_if_stalled():
+    """ワーカーが処理していないジョブが溜まっていればログに警告する（プロセスごとに間隔を空けて確認）"""
+    now = time.monotonic()
+    interval = getattr(settings, 'TUTORIAL_JOB_STALL_SECONDS', 600)
+    last = _last_stall_check['at']
+    if last is not None and now - last < interval:
+        return
+    _last_stall_check['at'] = now
+    stalled = stalled_job_count(interval)
+    if stalled:
+        logger.warning(
+            f"実行予定を {interval} 秒以上過ぎたジョブが {stalled} 件あります。run_jobs のワーカーを起動してください"
+        )
+
+
+def _run_immediately(func, payload):
+    """実行中として Job を記録してから実行する（失敗すれば run_job() が再試行待ちにする）"""
+    job = Job.objects.create(
+        name=func.task_name, payload=payload, max_attempts=func.max_attempts,
+        status='running', attempts=1, locked_by=worker_id(), locked_at=timezone.now(),
+    )
+    if not run_job(job):
+        _warn_if_stalled()
+
+
+# ==================== ワーカー ====================
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def retry_delay(attempts):
+    """attempts 回目の失敗後、次の実行までの秒数（指数バックオフ、最大 1 時間）"""
+    base = getattr(settings, 'TUTORIAL_JOB_RETRY_DELAY', 10)
+    return min(base * 2 ** (attempts - 1), 3600)
+
+
+def claim_jobs(worker, limit=10):
+    """
+    実行可能なジョブを最大 limit 件取り出して実行中にする
+    status='pending' を条件にした UPDATE で取り出すため、複数のワーカーが
+    同じジョブを実行することはない
+    """
+    now = timezone.now()
+    ids = list(
+        Job.objects.filter(status='pending', run_at__lte=now)
+        .order_by('run_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+
+    Job.objects.filter(id__in=ids, status='pending').update(
+        status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1
+    )
+    return list(
+        Job.objects.filter(id__in=ids, status='running', locked_by=worker, locked_at=now).order_by('run_at', 'id')
+    )
+
+
+def run_job(job):
+    """ジョブを 1 件実行し、結果に応じて完了・再試行待ち・失敗にする。成功したら True"""
+    func = _registry.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f"登録されていないジョブです: {job.name}")
+        func(*job.payload.get('args', []), **job.payload.get('kwargs', {}))
+    except Exception as e:
+        now = timezone.now()
+        job.last_error = traceback.format_exc()[-4000:]
+        job.locked_by = ''
+        job.locked_at = None
+        if func is not None and job.attempts < job.max_attempts:
+            job.status = 'pending'
+            job.run_at = now + timedelta(seconds=retry_delay(job.attempts))
+            logger.warning(
+                f"ジョブ失敗、再試行します: {job.name} #{job.id} ({job.attempts}/{job.max_attempts}) {e}"
+            )
+        else:
+            job.status = 'failed'
+            job.finished_at = now
+            logger.error(f"ジョブ失敗: {job.name} #{job.id} ({job.attempts}/{job.max_attempts}) {e}")
+        job.save(update_fields=['status', 'run_at', 'last_error', 'locked_by', 'locked_at', 'finished_at'])
+        return False
+
+    job.status = 'done'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at'])
+    return True
+
+
+def release_jobs(jobs):
+    """取り出したが実行していないジョブを待機中に戻す（試行回数も戻す）"""
+    Job.objects.filter(id__in=[job.id for job in jobs], status='running').update(
+        status='pending', locked_by='', locked_at=None, attempts=F('attempts') - 1
+    )
+
+
+def requeue_stale_jobs(timeout=None):
+    """ワーカーの異常終了で実行中のまま残ったジョブを待機中に戻し、件数を返す"""
+    timeout = timeout or getattr(settings, 'TUTORIAL_JOB_LOCK_TIMEOUT', 300)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='pending', locked_by='', locked_at=None, run_at=timezone.now()
+    )
+
+
+def schedule_periodic_jobs():
+    """
+    TUTORIAL_PERIODIC_JOBS（{ジョブ名: 間隔秒}）のうち、待機中・実行中のものが
+    無いジョブを前回の実行予定から間隔を空けてキューに追加し、追加した件数を返す
+    """
+    now = timezone.now()
+    scheduled = 0
+    for name, interval in getattr(settings, 'TUTORIAL_PERIODIC_JOBS', {}).items():
+        func = _registry.get(name)
+        if func is None:
+            logger.warning(f"定期ジョブが登録されていません: {name}")
+            continue
+        if Job.objects.filter(name=name, status__in=['pending', 'running']).exists():
+            continue
+        last_run_at = Job.objects.filter(name=name).order_by('-run_at').values_list('run_at', flat=True).first()
+        run_at = now if last_run_at is None else max(now, last_run_at + timedelta(seconds=interval))
+        Job.objects.create(name=name, payload={}, max_attempts=func.max_attempts, run_at=run_at)
+        scheduled += 1
+    return scheduled
+
+
+def purge_finished_jobs(days):
+    """完了してから days 日以上経ったジョブを削除し、件数を返す"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Job.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+# ==================== ジョブ ====================
+
+@task
+def record_session_result(user_id, chapter_id):
+    """
+    その時点の回答状況からチャプター結果を記録し、最高スコアを更新する
+    回答が 1 件も無ければ何もしない。記録した場合は正答率を返す
+    """
+    answers_qs = UserQuestionAnswer.objects.filter(
+        user_id=user_id,
+        question__chapter_id=chapter_id,
+    )
+
+    total = answers_qs.count()
+    if total == 0:
+        logger.info(f"[record_session_result] 自動記録スキップ: 回答数0 user={user_id}")
+        return None
+
+    correct = answers_qs.filter(is_correct=True).count()
+    accuracy = int(correct / total * 100)
+
+    # 途中で失敗した場合に結果だけが残らないよう、まとめてコミットする
+    with transaction.atomic():
+        ChapterResult.objects.create(
+            user_id=user_id,
+            chapter_id=chapter_id,
+            correct_count=correct,
+            total_count=total,
+            accuracy=accuracy,
+        )
+
+        user_progress, _ = UserProgress.objects.get_or_create(
+            user_id=user_id,
+            chapter_id=chapter_id,
+        )
+        if accuracy > user_progress.score:
+            user_progress.score = accuracy
+            user_progress.save()
+
+    logger.info(f"[record_session_result] 自動記録成功: user={user_id}, chapter={chapter_id}")
+    return accuracy
+
+
+@task
+def award_chapter_completion(progress_id):
+    """
+    完了したチャプターの経験値を授与し、レベルとバッジを更新する
+    experience_awarded を条件付き UPDATE で立ててから処理するため、
+    同じ進捗に対するジョブが複数回実行されても授与は 1 回だけ
+    """
+    with transaction.atomic():
+        claimed = UserProgress.objects.filter(
+            id=progress_id, completed=True, experience_awarded=False
+        ).update(experience_awarded=True)
+        if not claimed:
+            return
+
+        progress = UserProgress.objects.select_related('user', 'chapter').get(id=progress_id)
+        profile, _ = UserProfile.objects.get_or_create(user=progress.user)
+
+        # このチャプターですでに経験値を獲得したかチェック
+        if profile.has_experience_for_chapter(progress.chapter_id):
+            return
+
+        # 難易度に応じて異なる経験値を授与
+        experience_points = calculate_experience_for_chapter(progress.chapter)
+        profile.experience += experience_points
+        profile.add_chapter_experience(progress.chapter_id)
+
+        # レベルを再計算
+        old_level = profile.level
+        profile.level = profile.calculate_level()
+        profile.save()
+
+        # 条件を満たすバッジをチェックして授与
+        new_badges = profile.check_and_award_badges()
+
+    level_up_message = ""
+    if profile.level > old_level:
+        level_up_message = f" レベルが Lv.{profile.level} にアップ！"
+
+    badge_message = ""
+    if new_badges:
+        badge_message = f" 新しいバッジ獲得: {', '.join(badge.name for badge in new_badges)}"
+
+    logger.info(
+        f"ユーザー {progress.user.username} チャプター {progress.chapter.title} 完了 "
+        f"{experience_points} EXP 獲得{level_up_message}{badge_message}"
+    )
+
+
+@task
+def close_stale_study_sessions():
+    """終了通知が届かなかった古い学習セッションをまとめて閉じる（定期ジョブ）"""
+    closed = sweep_stale_sessions()
+    if closed:
+        logger.info(f"未終了の学習セッションを {closed} 件閉じました")
+
+
+@task
+def purge_expired_sessions():
+    """期限切れのログインセッションを小分けに削除する（定期ジョブ）"""
+    purged = login_sessions.purge_expired_sessions()
+    if purged:
+        logger.info(f"期限切れのセッションを {purged} 件削除しました")
+
+
+@task
+def flush_download_counts():
+    """
+    添付ファイルのダウンロード数を反映する（定期ジョブ）
+    終了時に DB へ書けなかったワーカーのスプールと、このプロセスの未反映分が対象
+    """
+    flushed = downloads.drain_spool() + downloads.download_counter.flush()
+    if flushed:
+        logger.info(f"ダウンロード数を {flushed} 件反映しました")
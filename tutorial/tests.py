@@ -1,3 +1,1138 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.admin import site as admin_site
+from django.contrib.auth.models import User
+from django.core.cache import CacheKeyWarning
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+
+from learning_website import urls as project_urls
+from learning_website.storage import MinifiedManifestStaticFilesStorage
+
+from . import cache as tutorial_cache
+from . import async_views, metrics, search
+from . import urls as tutorial_urls
+from .checks import check_job_queue
+from .diagram import LayoutConflict, get_diagram_data, update_layer_layout
+from .downloads import DownloadCounter, download_counter
+from .models import (
+    ArchitectureDiagramTemplate, Badge, BuildingBlock, Chapter, ChapterStudyTime, Choice, Job, Question,
+    StudyGuide, StudyGuideAttachment, UserArchitecture, UserBadge, UserProfile, UserProgress, UserQuestionAnswer,
+    WrongAnswer
+)
+from .question_import import QuestionImportError, build_plan, parse
+from .study_time import (
+    arecord_heartbeat, close_sessions, finish_session, parse_active, record_heartbeat
+)
+from .storage import content_addressed_storage
+from .tasks import (
+    claim_jobs, enqueue, flush_download_counts, release_jobs, requeue_stale_jobs, retry_delay, run_job, task
+)
+from .wrong_answers import arecord_wrong_answer, record_wrong_answer
+
+# 管理サイトのテンプレートが {% static %} を使うため、collectstatic 不要のストレージにする
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# 既定の /dev/shm のファイルキャッシュは実行をまたいで残るため、テスト全体でプロセス内キャッシュを使う（setUpModule）
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tutorial-tests'},
+    'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tutorial-tests-sessions'},
+}
+
+_module_context = []
+
+
+def setUpModule():
+    # テスト中のキャッシュ・メトリクス・ダウンロード数の退避ファイルを、本番と同じ /dev/shm 配下ではなく
+    # プロセス内と一時ディレクトリに置く。メトリクスは終了時に書き出されないよう、atexit に登録されていない
+    # 集計器で記録する
+    directory = tempfile.TemporaryDirectory()
+    overrides = override_settings(
+        CACHES=TEST_CACHES,
+        TUTORIAL_METRICS_DIR=os.path.join(directory.name, 'metrics'),
+        TUTORIAL_DOWNLOAD_COUNT_SPOOL_DIR=os.path.join(directory.name, 'downloads'),
+    )
+    registry = mock.patch.object(metrics, 'registry', metrics.MetricsRegistry())
+    overrides.enable()
+    registry.start()
+    _module_context.extend([directory.cleanup, overrides.disable, registry.stop])
+
+
+def tearDownModule():
+    while _module_context:
+        _module_context.pop()()
+
+
+@override_settings(STORAGES=TEST_STORAGES, TUTORIAL_JOB_BACKEND='db')
+class AdminChangelistQueryCountTests(TestCase):
+    """管理サイトの一覧ページで、行数によってクエリ数が増えないこと"""
+
+    changelists = [
+        'chapter', 'chapterstudytime', 'studyguide', 'studyguideattachment', 'question',
+        'choice', 'wronganswer', 'userprogress', 'userprofile', 'buildingblock', 'userbadge',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.block_type = BuildingBlock._meta.get_field('block_type').choices[0][0]
+        cls.sequence = 0
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def add_rows(self, count):
+        """各一覧に count 行ずつ追加する（ユーザー・チャプターなどの関連先も別々に作る）"""
+        for _ in range(count):
+            type(self).sequence += 1
+            n = self.sequence
+            user = User.objects.create_user(f'learner{n}', password='password')
+            UserProfile.objects.get_or_create(user=user)
+            chapter = Chapter.objects.create(title=f'Chapter {n}', description='-', order=n)
+            guide = StudyGuide.objects.create(chapter=chapter, content='<p>guide</p>')
+            StudyGuideAttachment.objects.create(study_guide=guide, key=f'ZIP{n}', file=f'study_guide_zips/{n}.zip')
+            question = Question.objects.create(chapter=chapter, question_type='choice', question_text=f'Q{n}')
+            Choice.objects.create(question=question, choice_text='A', is_correct=True)
+            Choice.objects.create(question=question, choice_text='B')
+            WrongAnswer.objects.create(user=user, question=question, wrong_answer='B', correct_answer='A')
+            UserProgress.objects.create(user=user, chapter=chapter)
+            ChapterStudyTime.objects.create(
+                user=user, chapter=chapter, start_time=timezone.now(), end_time=timezone.now(), total_seconds=60
+            )
+            block = BuildingBlock.objects.create(
+                name=f'Block {n}', block_type=self.block_type, description='-', code_snippet='pass'
+            )
+            block.chapters.add(chapter)
+            badge = Badge.objects.create(name=f'Badge {n}', description='-')
+            UserBadge.objects.create(user=user, badge=badge)
+
+    def count_queries(self, model_name):
+        url = reverse(f'admin:tutorial_{model_name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.add_rows(2)
+        small = {name: self.count_queries(name) for name in self.changelists}
+        self.add_rows(6)
+        for name in self.changelists:
+            with self.subTest(changelist=name):
+                self.assertEqual(self.count_queries(name), small[name])
+
+    def test_annotated_counts(self):
+        self.add_rows(1)
+        chapter = Chapter.objects.get()
+        Question.objects.create(chapter=chapter, question_type='fill', question_text='inactive', is_active=False)
+        response = self.client.get(reverse('admin:tutorial_chapter_changelist'))
+        self.assertEqual(response.context['cl'].result_list[0].active_question_count, 1)
+
+        response = self.client.get(reverse('admin:tutorial_buildingblock_changelist'))
+        self.assertEqual(response.context['cl'].result_list[0].related_chapters_count, 1)
+
+
+class CacheTests(TestCase):
+    """名前空間ごとのバージョン付きキャッシュ"""
+
+    def setUp(self):
+        tutorial_cache.get_cache().clear()
+        self.calls = []
+
+    def query(self, namespace, name, user_id=None):
+        def compute():
+            self.calls.append((namespace, user_id))
+            return len(self.calls)
+        return tutorial_cache.cached_query(namespace, name, compute, user_id=user_id)
+
+    def test_bump_invalidates_only_its_namespace(self):
+        entries = [(tutorial_cache.CONTENT, None), (tutorial_cache.USER, 1), (tutorial_cache.USER, 2),
+                   (tutorial_cache.LEADERBOARD, None)]
+        first = [self.query(namespace, 'entry', user_id) for namespace, user_id in entries]
+        self.assertEqual([self.query(namespace, 'entry', user_id) for namespace, user_id in entries], first)
+
+        tutorial_cache.bump(tutorial_cache.CONTENT)
+        tutorial_cache.bump(tutorial_cache.USER, 1)
+        self.calls.clear()
+        second = [self.query(namespace, 'entry', user_id) for namespace, user_id in entries]
+        self.assertEqual(self.calls, [(tutorial_cache.CONTENT, None), (tutorial_cache.USER, 1)])
+        self.assertEqual(second[2:], first[2:])
+
+    def test_import_bumps_content_only_after_commit(self):
+        chapter = Chapter.objects.create(title='Cache', description='-', order=1)
+        before = tutorial_cache.namespace_version(tutorial_cache.CONTENT)
+        records = parse(f'chapter,question_type,question_text,blank_1\n{chapter.id},fill,Q,x', 'csv')
+        with self.captureOnCommitCallbacks() as callbacks:
+            build_plan(records).apply()
+            self.assertEqual(tutorial_cache.namespace_version(tutorial_cache.CONTENT), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(tutorial_cache.namespace_version(tutorial_cache.CONTENT), before)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ChapterQuestionFragmentCacheTests(TestCase):
+    """chapter_detail の問題フラグメントキャッシュが選択肢の変更で作り直されること"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner', password='password')
+        cls.chapter = Chapter.objects.create(title='Fragments', description='-', order=1)
+        cls.question = Question.objects.create(chapter=cls.chapter, question_type='choice', question_text='Pick one')
+        cls.choice = Choice.objects.create(question=cls.question, choice_text='original-choice', is_correct=True)
+
+    def setUp(self):
+        tutorial_cache.get_cache().clear()
+        self.client.force_login(self.user)
+
+    def render(self):
+        return self.client.get(reverse('chapter_detail', args=[self.chapter.id]))
+
+    def test_choice_edit_rerenders_question_fragment(self):
+        self.assertContains(self.render(), 'original-choice')
+
+        self.choice.choice_text = 'edited-choice'
+        self.choice.save()
+
+        response = self.render()
+        self.assertContains(response, 'edited-choice')
+        self.assertNotContains(response, 'original-choice')
+
+
+@override_settings(TUTORIAL_JOB_BACKEND='db')
+class StudyBeaconTests(TestCase):
+    """sendBeacon による学習終了（CSRF トークンの代わりに Origin を検証する）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner', password='password')
+        cls.chapter = Chapter.objects.create(title='Beacon', description='-', order=1)
+
+    def setUp(self):
+        tutorial_cache.get_cache().clear()
+        self.client = self.client_class(enforce_csrf_checks=True)
+        self.client.force_login(self.user)
+        self.session = ChapterStudyTime.objects.create(
+            user=self.user, chapter=self.chapter, start_time=timezone.now() - timedelta(minutes=5)
+        )
+
+    def beacon(self, key='k1', **headers):
+        body = json.dumps({'study_session_id': self.session.id, 'active': True, 'idempotency_key': key})
+        return self.client.post(
+            reverse('end_chapter_study_beacon', args=[self.chapter.id]), body, content_type='text/plain', **headers
+        )
+
+    def test_same_origin_beacon_closes_session(self):
+        self.assertEqual(self.beacon(HTTP_ORIGIN='http://testserver').status_code, 204)
+        self.session.refresh_from_db()
+        self.assertIsNotNone(self.session.end_time)
+        self.assertEqual(list(Job.objects.values_list('name', flat=True)), ['tutorial.tasks.record_session_result'])
+
+    def test_referer_is_used_without_origin(self):
+        self.assertEqual(self.beacon(HTTP_REFERER='http://testserver/chapter/1/').status_code, 204)
+
+    def test_cross_origin_or_missing_origin_is_rejected(self):
+        self.assertEqual(self.beacon(HTTP_ORIGIN='https://evil.example').status_code, 403)
+        self.assertEqual(self.beacon().status_code, 403)
+        self.session.refresh_from_db()
+        self.assertIsNone(self.session.end_time)
+        self.assertFalse(Job.objects.exists())
+
+    def test_repeated_beacon_is_idempotent(self):
+        self.beacon(HTTP_ORIGIN='http://testserver')
+        self.session.refresh_from_db()
+        end_time = self.session.end_time
+        # 同じキーの再送も、別のキーで届いた終了済みセッションへの通知も何もしない
+        self.assertEqual(self.beacon(HTTP_ORIGIN='http://testserver').status_code, 204)
+        self.assertEqual(self.beacon('k2', HTTP_ORIGIN='http://testserver').status_code, 204)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.end_time, end_time)
+        self.assertEqual(Job.objects.count(), 1)
+
+
+class ContentAddressedStorageTests(TestCase):
+    """添付ファイル・ガイド画像の重複排除と gc_media"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.enterContext(override_settings(MEDIA_ROOT=self.root))
+        self.chapter = Chapter.objects.create(title='Media', description='-', order=1)
+        self.guide = StudyGuide.objects.create(chapter=self.chapter, content='')
+
+    def save(self, name, data):
+        return content_addressed_storage.save(name, ContentFile(data))
+
+    def exists(self, name):
+        return os.path.exists(content_addressed_storage.path(name))
+
+    def blob(self, name):
+        digest = name.rsplit('/', 2)[1]
+        return content_addressed_storage.blob_name(digest)
+
+    def gc_media(self, *args):
+        # 保存直後のファイルは猶予期間で残るため、すべて猶予期間より前に更新したことにする
+        old = time.time() - 2 * settings.TUTORIAL_BLOB_GC_GRACE_SECONDS
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                os.utime(os.path.join(dirpath, filename), (old, old))
+        call_command('gc_media', *args, stdout=StringIO())
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.save('study_guide_zips/sample.zip', b'same bytes')
+        second = self.save('study_guide_images/copy.png', b'same bytes')
+        self.assertEqual(self.save('study_guide_zips/sample.zip', b'same bytes'), first)
+
+        inodes = {os.stat(content_addressed_storage.path(name)).st_ino for name in (first, second, self.blob(first))}
+        self.assertEqual(len(inodes), 1)
+        self.assertEqual(os.stat(content_addressed_storage.path(self.blob(first))).st_nlink, 3)
+
+    def test_gc_media_dry_run_deletes_nothing(self):
+        name = self.save('study_guide_zips/orphan.zip', b'orphan')
+        self.gc_media('--dry-run')
+        self.assertTrue(self.exists(name))
+        self.assertTrue(self.exists(self.blob(name)))
+
+    def test_gc_media_keeps_referenced_blobs(self):
+        attached = self.save('study_guide_zips/attached.zip', b'shared')
+        # 参照されている添付と同じ内容の、参照されていない名前
+        duplicate = self.save('study_guide_zips/duplicate.zip', b'shared')
+        image = self.save('study_guide_images/figure.png', b'image')
+        orphan = self.save('study_guide_zips/orphan.zip', b'orphan')
+        StudyGuideAttachment.objects.create(study_guide=self.guide, key='ZIP1', file=attached)
+        self.guide.content = f'<img src="{content_addressed_storage.url(image)}">'
+        self.guide.save()
+
+        self.gc_media()
+
+        for name in (attached, self.blob(attached), image, self.blob(image)):
+            self.assertTrue(self.exists(name), name)
+        for name in (duplicate, orphan, self.blob(orphan)):
+            self.assertFalse(self.exists(name), name)
+
+
+class StaticMinifyTests(TestCase):
+    """collectstatic で縮小するのはサイトのバンドルだけ"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = MinifiedManifestStaticFilesStorage(location=directory.name)
+
+    def write(self, name, source):
+        path = self.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(source)
+        return path
+
+    def test_only_allowlisted_files_are_minified(self):
+        source = '/* comment */\nbody {\n    color: red;\n}\n'
+        bundle = self.write('css/chapter_detail.css', source)
+        other = self.write('admin/css/base.css', source)
+
+        self.assertTrue(self.storage.minify('css/chapter_detail.css'))
+        self.assertFalse(self.storage.minify('admin/css/base.css'))
+        with open(bundle, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'body{color: red}\n')
+        with open(other, encoding='utf-8') as f:
+            self.assertEqual(f.read(), source)
+
+
+class AsyncViewsTests(TestCase):
+    """TUTORIAL_ASYNC_VIEWS を有効にしたときの非同期版の回答・ハートビート"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # urls.py は読み込み時に同期版・非同期版を選ぶので、設定を変えてから読み込み直す
+        cls.enterClassContext(override_settings(TUTORIAL_ASYNC_VIEWS=True))
+        cls.addClassCleanup(cls.reload_urls)
+        cls.reload_urls()
+
+    @staticmethod
+    def reload_urls():
+        importlib.reload(tutorial_urls)
+        importlib.reload(project_urls)
+        clear_url_caches()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner', password='password')
+        cls.chapter = Chapter.objects.create(title='Async', description='-', order=1)
+        cls.question = Question.objects.create(chapter=cls.chapter, question_type='choice', question_text='Pick')
+        cls.correct = Choice.objects.create(question=cls.question, choice_text='right', is_correct=True, order=0)
+        cls.wrong = Choice.objects.create(question=cls.question, choice_text='wrong', order=1)
+
+    async def login(self):
+        await self.async_client.aforce_login(self.user)
+
+    def test_async_views_are_routed(self):
+        self.assertIs(resolve(reverse('submit_answer', args=[1])).func, async_views.submit_answer)
+        self.assertIs(resolve(reverse('update_study_time', args=[1])).func, async_views.update_study_time)
+
+    async def test_submit_answer(self):
+        await self.login()
+        url = reverse('submit_answer', args=[self.question.id])
+
+        response = await self.async_client.post(url, {'answer': str(self.wrong.id)})
+        self.assertEqual(response.json()['is_correct'], False)
+        self.assertEqual(response.json()['correct_answer'], 'right')
+        wrong_answer = await WrongAnswer.objects.aget(user=self.user, question=self.question)
+        self.assertEqual(wrong_answer.attempt_count, 1)
+
+        response = await self.async_client.post(url, {'answer': str(self.correct.id)})
+        self.assertEqual(response.json()['is_correct'], True)
+        answer = await UserQuestionAnswer.objects.aget(user=self.user, question=self.question)
+        self.assertEqual((answer.answer_text, answer.is_correct), (str(self.correct.id), True))
+
+    async def test_update_study_time(self):
+        await self.login()
+        session = await ChapterStudyTime.objects.acreate(
+            user=self.user, chapter=self.chapter, start_time=timezone.now() - timedelta(minutes=1)
+        )
+        response = await self.async_client.post(
+            reverse('update_study_time', args=[self.chapter.id]),
+            {'study_session_id': session.id, 'active': True, 'is_auto_save': True},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['success'], True)
+        await session.arefresh_from_db()
+        self.assertIsNotNone(session.last_heartbeat_at)
+
+
+class DiagramLayoutTests(TestCase):
+    """架構図レイアウトのコンペア・アンド・スワップ更新"""
+
+    def setUp(self):
+        self.diagram = ArchitectureDiagramTemplate.objects.create(
+            name='test diagram',
+            layers=[{'name': 'view', 'x': 0, 'y': 0, 'size': 100}, {'name': 'model', 'x': 10, 'y': 0, 'size': 100}],
+        )
+
+    def test_update_with_expected_version(self):
+        version, changed = update_layer_layout([{'name': 'view', 'x': 50}], self.diagram.version, self.diagram.name)
+        self.assertEqual((version, changed), (self.diagram.version + 1, ['view']))
+        self.diagram.refresh_from_db()
+        self.assertEqual(self.diagram.version, version)
+        self.assertEqual(self.diagram.layers[0]['x'], 50)
+
+    def test_stale_expected_version_conflicts(self):
+        update_layer_layout([{'name': 'view', 'x': 50}], self.diagram.version, self.diagram.name)
+        with self.assertRaises(LayoutConflict) as cm:
+            update_layer_layout([{'name': 'model', 'x': 60}], self.diagram.version, self.diagram.name)
+        self.assertEqual(cm.exception.current_version, self.diagram.version + 1)
+        self.diagram.refresh_from_db()
+        self.assertEqual(self.diagram.layers[1]['x'], 10)
+
+    def test_merge_without_expected_version_keeps_other_layers(self):
+        update_layer_layout([{'name': 'view', 'x': 50}], name=self.diagram.name)
+        update_layer_layout([{'name': 'model', 'x': 60}], name=self.diagram.name)
+        self.diagram.refresh_from_db()
+        self.assertEqual([layer['x'] for layer in self.diagram.layers], [50, 60])
+
+    def test_unchanged_layout_keeps_version(self):
+        self.assertEqual(
+            update_layer_layout([{'name': 'view', 'x': 0}], self.diagram.version, self.diagram.name),
+            (self.diagram.version, []),
+        )
+
+    def test_stale_instance_save_does_not_reuse_version(self):
+        stale = ArchitectureDiagramTemplate.objects.get(pk=self.diagram.pk)
+        version, _ = update_layer_layout([{'name': 'view', 'x': 50}], self.diagram.version, self.diagram.name)
+        stale.save()
+        self.assertEqual(stale.version, version + 1)
+        with self.assertRaises(LayoutConflict):
+            update_layer_layout([{'name': 'model', 'x': 60}], version, self.diagram.name)
+
+    def test_cache_is_invalidated_after_update(self):
+        self.assertEqual(get_diagram_data(self.diagram.name)['version'], self.diagram.version)
+        version, _ = update_layer_layout([{'name': 'view', 'x': 50}], self.diagram.version, self.diagram.name)
+        data = get_diagram_data(self.diagram.name)
+        self.assertEqual(data['version'], version)
+        self.assertEqual(data['layers'][0]['x'], 50)
+
+    def test_cache_key_is_valid_for_any_name(self):
+        # 空白や日本語を含む名前でも、memcached で使えないキー（CacheKeyWarning）にならない
+        self.diagram.name = '標準 アーキテクチャ図'
+        self.diagram.save()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.assertEqual(get_diagram_data(self.diagram.name)['version'], self.diagram.version)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class UserArchitectureReadTests(TestCase):
+    """アーキテクチャ図を表示するだけのリクエストでは行を作らない"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('learner', password='password')
+        self.client.force_login(self.user)
+
+    def test_get_requests_do_not_create_architecture(self):
+        # create_user_profile シグナルが作った図が無いユーザー（シグナル導入前のユーザーなど）
+        UserArchitecture.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get(reverse('building_blocks')).status_code, 200)
+        response = self.client.get(reverse('api_architecture_preview'))
+        self.assertEqual(response.json()['success'], True)
+        self.assertFalse(UserArchitecture.objects.filter(user=self.user).exists())
+
+
+@override_settings(TUTORIAL_DOWNLOAD_COUNT_FLUSH_INTERVAL=3600)
+class DownloadCounterTests(TestCase):
+    """添付ファイルのダウンロード数の集計と反映"""
+
+    def setUp(self):
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.enterContext(override_settings(TUTORIAL_DOWNLOAD_COUNT_SPOOL_DIR=spool.name))
+        chapter = Chapter.objects.create(title='Chapter', description='-', order=1)
+        guide = StudyGuide.objects.create(chapter=chapter, content='<p>guide</p>')
+        self.attachment = StudyGuideAttachment.objects.create(
+            study_guide=guide, key='ZIP', file='study_guide_zips/guide.zip'
+        )
+        self.counter = DownloadCounter()
+        self.addCleanup(self._cancel_timer)
+
+    def _cancel_timer(self):
+        if self.counter._timer is not None:
+            self.counter._timer.cancel()
+
+    def download_count(self):
+        self.attachment.refresh_from_db()
+        return self.attachment.download_count
+
+    def test_flush_adds_pending_counts(self):
+        for _ in range(3):
+            self.counter.add(self.attachment.id)
+        self.assertEqual(self.download_count(), 0)
+        self.assertEqual(self.counter.flush(), 3)
+        self.assertEqual(self.download_count(), 3)
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_failed_update_keeps_counts(self):
+        self.counter.add(self.attachment.id)
+        with mock.patch('tutorial.downloads.apply_counts', side_effect=DatabaseError('locked')):
+            with self.assertRaises(DatabaseError):
+                self.counter.flush()
+        self.counter.add(self.attachment.id)
+        self.assertEqual(self.counter.flush(), 2)
+        self.assertEqual(self.download_count(), 2)
+
+    def test_exit_flush_spools_and_job_drains(self):
+        self.counter.add(self.attachment.id)
+        with mock.patch('tutorial.downloads.apply_counts', side_effect=DatabaseError('locked')):
+            self.counter.flush_at_exit()
+        self.assertIsNone(self.counter._timer)
+        self.assertEqual(self.download_count(), 0)
+
+        flush_download_counts()
+        self.assertEqual(self.download_count(), 1)
+        flush_download_counts()
+        self.assertEqual(self.download_count(), 1)
+
+
+@override_settings(TUTORIAL_ATTACHMENT_OFFLOAD='')
+class AttachmentDownloadTests(TestCase):
+    """添付ファイルの配信（Range・条件付きリクエスト・ダウンロード数・アクセス権）"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name))
+        self.counted = self.enterContext(mock.patch.object(download_counter, 'add'))
+        self.user = User.objects.create_user('learner', password='password')
+        self.client.force_login(self.user)
+        chapter = Chapter.objects.create(title='Downloads', description='-', order=1)
+        self.guide = StudyGuide.objects.create(chapter=chapter, content='')
+        self.attachment = StudyGuideAttachment.objects.create(
+            study_guide=self.guide, key='ZIP1',
+            file=content_addressed_storage.save('study_guide_zips/sample.zip', ContentFile(b'0123456789')),
+        )
+        self.url = reverse('download_attachment', args=[self.attachment.id])
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        if response.streaming:
+            response.body = b''.join(response.streaming_content)
+        response.close()
+        return response
+
+    def test_full_download_is_counted(self):
+        response = self.get()
+        self.assertEqual((response.status_code, response.body), (200, b'0123456789'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.counted.assert_called_once_with(self.attachment.id)
+
+    def test_range_request_returns_partial_content(self):
+        response = self.get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual((response.status_code, response.body), (206, b'2345'))
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        # 途中からの再開は数えず、先頭からの Range は数える
+        self.counted.assert_not_called()
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-3').body, b'0123')
+        self.counted.assert_called_once_with(self.attachment.id)
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        self.counted.assert_not_called()
+
+    def test_if_range_uses_range_only_when_validator_matches(self):
+        etag = self.get()['ETag']
+        self.counted.reset_mock()
+
+        response = self.get(HTTP_RANGE='bytes=5-', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, response.body), (206, b'56789'))
+        self.counted.assert_not_called()
+
+        # ファイルが変わっていれば全体を返し、新しいダウンロードとして数える
+        response = self.get(HTTP_RANGE='bytes=5-', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, response.body), (200, b'0123456789'))
+        self.counted.assert_called_once_with(self.attachment.id)
+
+    def test_conditional_request_returns_not_modified(self):
+        first = self.get()
+        self.counted.reset_mock()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+        self.counted.assert_not_called()
+
+    # handler404 のテンプレートを使わず、Django 既定の 404 ページを返させる
+    @override_settings(DEBUG=True)
+    def test_unpublished_guide_is_staff_only(self):
+        self.guide.is_published = False
+        self.guide.save()
+        self.assertEqual(self.get().status_code, 404)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_anonymous_user_is_redirected_to_login(self):
+        self.client.logout()
+        self.assertEqual(self.get().status_code, 302)
+        self.counted.assert_not_called()
+
+
+job_calls = []
+
+
+@task
+def recording_job(value):
+    job_calls.append(value)
+
+
+@task(max_attempts=2)
+def failing_job(message):
+    raise RuntimeError(message)
+
+
+@override_settings(TUTORIAL_JOB_BACKEND='db', TUTORIAL_JOB_RETRY_DELAY=10)
+class JobQueueTests(TestCase):
+    """バックグラウンドジョブの登録・取り出し・再試行"""
+
+    def setUp(self):
+        job_calls.clear()
+
+    def test_enqueue_and_run(self):
+        job = enqueue(recording_job, 1)
+        self.assertEqual((job.status, job.payload), ('pending', {'args': [1], 'kwargs': {}}))
+        claimed = claim_jobs('worker-a')
+        self.assertEqual([j.id for j in claimed], [job.id])
+        self.assertEqual(claim_jobs('worker-b'), [])
+        self.assertTrue(run_job(claimed[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('done', 1))
+        self.assertEqual(job_calls, [1])
+
+    def test_failure_retries_with_backoff_then_fails(self):
+        job = enqueue(failing_job, 'boom')
+        before = timezone.now()
+        self.assertFalse(run_job(claim_jobs('worker')[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('pending', 1, ''))
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=retry_delay(1)))
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(claim_jobs('worker'), [])
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        self.assertFalse(run_job(claim_jobs('worker')[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_retry_delay_doubles_up_to_an_hour(self):
+        self.assertEqual([retry_delay(n) for n in (1, 2, 3)], [10, 20, 40])
+        self.assertEqual(retry_delay(20), 3600)
+
+    def test_release_and_requeue_stale_jobs(self):
+        job = enqueue(recording_job, 1)
+        release_jobs(claim_jobs('worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('pending', 0))
+
+        claim_jobs('worker')
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(timeout=60), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'pending')
+
+    def test_stalled_queue_is_reported(self):
+        enqueue(recording_job, 1)
+        self.assertEqual(check_job_queue(None), [])
+        Job.objects.update(run_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual([w.id for w in check_job_queue(None)], ['tutorial.W001'])
+
+    @override_settings(TUTORIAL_JOB_BACKEND='immediate')
+    def test_immediate_backend_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(enqueue(recording_job, 2))
+            self.assertEqual(job_calls, [])
+        self.assertEqual(job_calls, [2])
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    @override_settings(TUTORIAL_JOB_BACKEND='immediate')
+    def test_immediate_backend_failure_is_left_for_retry(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(failing_job, 'boom')
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertIn('RuntimeError', job.last_error)
+
+
+class MetricsRetentionTests(TestCase):
+    """終了したワーカーのメトリクスファイルの整理"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(override_settings(TUTORIAL_METRICS_DIR=self.directory))
+
+    def write_worker(self, pid, started, downloads):
+        with open(os.path.join(self.directory, f'{pid}-{started}.json'), 'w', encoding='utf-8') as f:
+            json.dump({'counters': {'test_downloads': downloads}}, f)
+
+    def dead_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        return process.pid
+
+    def test_process_without_requests_writes_no_file(self):
+        registry = metrics.MetricsRegistry()
+        registry.observe_cache('diagram', True)
+        registry.flush()
+        self.assertEqual(os.listdir(self.directory), [])
+
+        registry.observe_request('index', 0.01, 1, 0.001)
+        registry.flush()
+        self.assertEqual(os.listdir(self.directory), [f'{os.getpid()}-{registry._started}.json'])
+
+    def test_dead_and_replaced_workers_are_folded_into_retained_totals(self):
+        registry = self.enterContext(mock.patch.object(metrics, 'registry', metrics.MetricsRegistry()))
+        registry.observe_request('index', 0.01, 1, 0.001)
+        dead = self.dead_pid()
+        self.write_worker(dead, 1, 5)
+        # 同じ pid でより新しく起動したプロセス（このプロセス）があれば、古い方は終了している
+        self.write_worker(os.getpid(), 1, 7)
+
+        _, _, counters = metrics.collect()
+        self.assertEqual(counters['test_downloads'], 12)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            ['.lock', f'{os.getpid()}-{registry._started}.json', metrics.RETAINED_FILE],
+        )
+
+        # 整理した後も累計は減らない
+        _, _, counters = metrics.collect()
+        self.assertEqual(counters['test_downloads'], 12)
+
+
+class WrongAnswerRecordTests(TestCase):
+    """誤答の (ユーザー, 問題) ごとの集約"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner', password='password')
+        chapter = Chapter.objects.create(title='Chapter', description='-', order=1)
+        cls.question = Question.objects.create(chapter=chapter, question_type='fill', question_text='Q')
+
+    def test_repeated_mistakes_share_one_row(self):
+        record_wrong_answer(self.user, self.question, 'a', 'ok')
+        first = WrongAnswer.objects.get().created_at
+        for answer in ['b', 'a', 'c']:
+            record_wrong_answer(self.user, self.question, answer, 'ok', now=first + timedelta(minutes=1))
+
+        row = WrongAnswer.objects.get()
+        self.assertEqual(row.attempt_count, 4)
+        self.assertEqual(row.wrong_answer, 'c')
+        self.assertEqual(row.recent_wrong_answers, ['c', 'a', 'b'])
+        self.assertEqual(row.earlier_wrong_answers(), ['a', 'b'])
+        self.assertEqual(row.created_at, first)
+        self.assertEqual(row.last_wrong_at, first + timedelta(minutes=1))
+
+    @override_settings(TUTORIAL_WRONG_ANSWER_HISTORY=2)
+    def test_history_is_limited(self):
+        for answer in ['a', 'b', 'c']:
+            record_wrong_answer(self.user, self.question, answer, 'ok')
+        self.assertEqual(WrongAnswer.objects.get().recent_wrong_answers, ['c', 'b'])
+
+    def test_concurrent_insert_falls_back_to_update(self):
+        record_wrong_answer(self.user, self.question, 'a', 'ok')
+        # 別のリクエストが先に行を追加した直後を再現する（存在確認では見つからず、追加が一意制約で失敗する）
+        with mock.patch('django.db.models.query.QuerySet.first', return_value=None):
+            record_wrong_answer(self.user, self.question, 'b', 'ok')
+        row = WrongAnswer.objects.get()
+        self.assertEqual((row.attempt_count, row.recent_wrong_answers), (2, ['b', 'a']))
+
+    def test_async_variant(self):
+        async_to_sync(arecord_wrong_answer)(self.user, self.question, 'a', 'ok')
+        async_to_sync(arecord_wrong_answer)(self.user, self.question, 'b', 'ok')
+        self.assertEqual(WrongAnswer.objects.get().attempt_count, 2)
+
+
+class CompactWrongAnswersMigrationTests(TransactionTestCase):
+    """マイグレーション 0022 による 1 回 1 行の誤答履歴の集約"""
+
+    before = [('tutorial', '0021_search_index')]
+    after = [('tutorial', '0022_compact_wrong_answers')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_history_is_folded_into_one_row(self):
+        apps = self.migrate(self.before)
+        WrongAnswer = apps.get_model('tutorial', 'WrongAnswer')
+        user = apps.get_model('auth', 'User').objects.create(username='learner')
+        chapter = apps.get_model('tutorial', 'Chapter').objects.create(title='Chapter', description='-', order=1)
+        Question = apps.get_model('tutorial', 'Question')
+        question = Question.objects.create(chapter=chapter, question_type='fill', question_text='Q1')
+        other = Question.objects.create(chapter=chapter, question_type='fill', question_text='Q2')
+
+        start = timezone.now() - timedelta(days=10)
+        answers = ['a', 'b', 'a', 'c', 'd', 'e', 'f']
+        for day, answer in enumerate(answers):
+            row = WrongAnswer.objects.create(user=user, question=question, wrong_answer=answer, correct_answer=f'ok{day}')
+            WrongAnswer.objects.filter(id=row.id).update(created_at=start + timedelta(days=day))
+        kept = WrongAnswer.objects.order_by('id').first().id
+        WrongAnswer.objects.create(user=user, question=other, wrong_answer='x', correct_answer='y')
+
+        apps = self.migrate(self.after)
+        WrongAnswer = apps.get_model('tutorial', 'WrongAnswer')
+        self.assertEqual(WrongAnswer.objects.count(), 2)
+        row = WrongAnswer.objects.get(question_id=question.id)
+        self.assertEqual(row.id, kept)
+        self.assertEqual(row.attempt_count, len(answers))
+        self.assertEqual((row.wrong_answer, row.correct_answer), ('f', 'ok6'))
+        self.assertEqual(row.recent_wrong_answers, ['f', 'e', 'd', 'c', 'a'])
+        self.assertEqual(row.created_at, start)
+        self.assertEqual(row.last_wrong_at, start + timedelta(days=6))
+        self.assertEqual(WrongAnswer.objects.get(question_id=other.id).attempt_count, 1)
+
+
+def _fts5_trigram_available():
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE probe USING fts5(x, tokenize = 'trigram')")
+    except sqlite3.Error:
+        return False
+    return connection.vendor == 'sqlite'
+
+
+FTS5_TRIGRAM = _fts5_trigram_available()
+
+
+@skipUnless(FTS5_TRIGRAM, 'SQLite の FTS5（trigram トークナイザー）が使えない')
+class SearchIndexTests(TestCase):
+    """全文検索インデックスの検索結果と、保存・削除・インポートへの追従"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.chapter = Chapter.objects.create(title='検索の章', description='-', order=1)
+        cls.question = Question.objects.create(
+            chapter=cls.chapter, question_type='fill', question_text='関数の引数を数える',
+            code_snippet='def count_args(*args):', explanation='secret-explanation',
+        )
+        cls.guide = StudyGuide.objects.create(
+            chapter=cls.chapter, content='<p>リスト内包表記 &amp; ジェネレーター</p><script>hidden_call()</script>'
+        )
+        cls.block = BuildingBlock.objects.create(
+            name='HTTP Router', block_type=BuildingBlock._meta.get_field('block_type').choices[0][0],
+            description='URL を振り分ける', code_snippet='router = Router()',
+        )
+
+    def found(self, query, **kwargs):
+        return [(result['kind'], result['id']) for result in search.search(query, **kwargs)]
+
+    def test_search_returns_matching_rows(self):
+        self.assertEqual(self.found('引数を'), [('question', self.question.id)])
+        self.assertEqual(self.found('count_args'), [('question', self.question.id)])
+        self.assertEqual(self.found('内包表記 ジェネ'), [('guide', self.guide.id)])
+        self.assertEqual(self.found('router'), [('block', self.block.id)])
+        # 3 文字未満の検索語は LIKE で絞り込む
+        self.assertEqual(self.found('ジェ'), [('guide', self.guide.id)])
+        self.assertEqual(self.found('hidden_call'), [])
+
+    def test_explanation_is_only_searched_outside_public_search(self):
+        self.assertEqual(self.found('secret-explanation'), [])
+        self.assertEqual(self.found('secret-explanation', public=False), [('question', self.question.id)])
+
+    def test_index_follows_save_and_delete(self):
+        self.question.question_text = '戻り値を返す'
+        self.question.save()
+        self.assertEqual(self.found('引数を'), [])
+        self.assertEqual(self.found('戻り値'), [('question', self.question.id)])
+
+        self.chapter.is_active = False
+        self.chapter.save()
+        self.assertEqual(self.found('戻り値'), [])
+        self.assertEqual(self.found('戻り値', public=False), [('question', self.question.id)])
+
+        self.question.delete()
+        self.assertEqual(self.found('戻り値', public=False), [])
+
+    def test_import_indexes_questions(self):
+        records = parse(f'chapter,question_type,question_text,blank_1\n{self.chapter.id},fill,インポートした問題,x', 'csv')
+        build_plan(records).apply()
+        created = Question.objects.get(question_text='インポートした問題')
+        self.assertEqual(self.found('インポート'), [('question', created.id)])
+
+    def test_admin_search_uses_index(self):
+        request = RequestFactory().get('/admin/tutorial/question/', {'q': 'secret-explanation'})
+        request.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        model_admin = admin_site._registry[Question]
+        queryset, may_have_duplicates = model_admin.get_search_results(
+            request, Question.objects.all(), 'secret-explanation'
+        )
+        self.assertEqual(list(queryset), [self.question])
+        self.assertFalse(may_have_duplicates)
+
+
+@skipUnless(FTS5_TRIGRAM, 'SQLite の FTS5（trigram トークナイザー）が使えない')
+class SearchIndexMigrationTests(TransactionTestCase):
+    """マイグレーション 0021 による既存の教材のインデックス作成"""
+
+    before = [('tutorial', '0020_content_addressed_attachments')]
+    after = [('tutorial', '0021_search_index')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        # 仮想テーブルはテスト後の flush の対象外なので、ここで空にする
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+
+    def test_existing_content_is_indexed(self):
+        apps = self.migrate(self.before)
+        Chapter = apps.get_model('tutorial', 'Chapter')
+        Question = apps.get_model('tutorial', 'Question')
+        chapter = Chapter.objects.create(title='Chapter', description='-', order=1)
+        visible = Question.objects.create(chapter=chapter, question_type='fill', question_text='既存の問題文')
+        hidden = Question.objects.create(
+            chapter=chapter, question_type='fill', question_text='無効な問題文', is_active=False
+        )
+        guide = apps.get_model('tutorial', 'StudyGuide').objects.create(chapter=chapter, content='<b>既存のガイド</b>')
+
+        self.migrate(self.after)
+        self.assertEqual(
+            [(result['kind'], result['id']) for result in search.search('問題文')], [('question', visible.id)]
+        )
+        self.assertEqual(
+            sorted((result['kind'], result['id']) for result in search.search('既存の', public=False)),
+            [('guide', guide.id), ('question', visible.id)],
+        )
+        self.assertEqual([result['id'] for result in search.search('無効な', public=False)], [hidden.id])
+
+
+class QuestionImportTests(TestCase):
+    """CSV からの問題の一括インポート（差分・選択肢の更新・削除）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.chapter = Chapter.objects.create(title='Import', description='-', order=1)
+        cls.choice_question = Question.objects.create(
+            chapter=cls.chapter, question_type='choice', question_text='Which prints?'
+        )
+        Choice.objects.create(question=cls.choice_question, choice_text='print', is_correct=True, order=0)
+        Choice.objects.create(question=cls.choice_question, choice_text='echo', order=1)
+        cls.stale_question = Question.objects.create(chapter=cls.chapter, question_type='fill', question_text='Old')
+        Choice.objects.create(question=cls.stale_question, choice_text='old', is_correct=True)
+        user = User.objects.create_user('learner', password='password')
+        WrongAnswer.objects.create(user=user, question=cls.stale_question, wrong_answer='x', correct_answer='old')
+
+    def csv(self, *rows):
+        return parse('chapter,id,question_type,question_text,choices,blank_1,blank_2\n' + '\n'.join(rows), 'csv')
+
+    def rows(self):
+        return self.csv(
+            f'{self.chapter.id},{self.choice_question.id},choice,Which prints?,*print|puts|echo,,',
+            'Import,,multi_fill,Fill both,,*args|*a,kwargs',
+        )
+
+    def test_dry_run_diff_writes_nothing(self):
+        plan = build_plan(self.rows(), prune=True)
+        self.assertEqual(plan.diff_lines(), [
+            '+ [Import] multi_fill: Fill both',
+            '    + 空欄1: *args',
+            '    + 空欄1: *a',
+            '    + 空欄2: kwargs',
+            f'~ #{self.choice_question.id} [Import] Which prints?',
+            '    +   puts',
+            f'- #{self.stale_question.id} [Import] Old',
+        ])
+        self.assertEqual(plan.counts(), {
+            'questions_inserted': 1, 'questions_updated': 1, 'questions_deleted': 1, 'questions_unchanged': 0,
+            'choices_inserted': 4, 'choices_updated': 1, 'choices_deleted': 1,
+        })
+        self.assertEqual(Question.objects.count(), 2)
+        self.assertEqual(Choice.objects.count(), 3)
+
+    def test_apply_diffs_choices_and_prunes(self):
+        ids = dict(self.choice_question.choice_set.values_list('choice_text', 'id'))
+        build_plan(self.rows(), prune=True).apply()
+
+        self.assertEqual(
+            list(self.choice_question.choice_set.order_by('order').values_list('choice_text', 'is_correct', 'order')),
+            [('print', True, 0), ('puts', False, 1), ('echo', False, 2)],
+        )
+        # 選択問題の解答は選択肢の ID を保存しているため、変わっていない選択肢の ID は保つ
+        kept = dict(self.choice_question.choice_set.filter(choice_text__in=ids).values_list('choice_text', 'id'))
+        self.assertEqual(kept, ids)
+        created = Question.objects.get(question_text='Fill both')
+        self.assertEqual(
+            list(created.choice_set.order_by('blank_index', 'order').values_list('blank_index', 'choice_text', 'order')),
+            [(0, '*args', 0), (0, '*a', 1), (1, 'kwargs', 0)],
+        )
+        self.assertFalse(Question.objects.filter(id=self.stale_question.id).exists())
+        self.assertFalse(WrongAnswer.objects.exists())
+        self.assertEqual(Choice.objects.count(), 6)
+
+        # 書き込んだ後は同じファイルで差分が出ない
+        self.assertFalse(build_plan(self.rows(), prune=True).has_changes())
+
+    def test_without_prune_keeps_other_questions(self):
+        build_plan(self.rows()).apply()
+        self.assertTrue(Question.objects.filter(id=self.stale_question.id).exists())
+
+    def test_validation_errors_write_nothing(self):
+        records = self.csv(
+            'Import,,choice,No correct answer,a|b,,',
+            'Missing chapter,,fill,Q,,x,',
+            f'Import,{self.choice_question.id + 1000},fill,Q,,x,',
+        )
+        with self.assertRaises(QuestionImportError) as cm:
+            build_plan(records)
+        self.assertEqual(len(cm.exception.errors), 3)
+        self.assertTrue(cm.exception.errors[0].startswith('2行目'))
+        self.assertEqual(Question.objects.count(), 2)
+
+
+@override_settings(TUTORIAL_STUDY_IDLE_CUTOFF_SECONDS=90, TUTORIAL_STUDY_SESSION_MAX_SECONDS=3600)
+class StudyTimeTests(TestCase):
+    """ハートビートによる学習時間の積算"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner', password='password')
+        cls.chapter = Chapter.objects.create(title='Chapter', description='-', order=1)
+        cls.start = timezone.now() - timedelta(hours=1)
+
+    def setUp(self):
+        self.session = ChapterStudyTime.objects.create(user=self.user, chapter=self.chapter, start_time=self.start)
+
+    def at(self, seconds):
+        return self.start + timedelta(seconds=seconds)
+
+    def heartbeat(self, seconds, active=True):
+        return record_heartbeat(self.session.id, self.user, self.chapter.id, active=active, now=self.at(seconds))
+
+    def total(self):
+        self.session.refresh_from_db()
+        return self.session.total_seconds
+
+    def test_active_heartbeats_accumulate(self):
+        self.assertTrue(self.heartbeat(30))
+        self.assertTrue(self.heartbeat(60))
+        self.assertEqual(self.total(), 60)
+        self.assertEqual(self.session.last_heartbeat_at, self.at(60))
+
+    def test_inactive_heartbeat_and_idle_gap_are_not_counted(self):
+        self.heartbeat(30)
+        self.heartbeat(60, active=False)
+        self.heartbeat(90)
+        self.assertEqual(self.total(), 60)
+        # 間隔が上限（90 秒）を超えた区間はアイドルとして数えない
+        self.heartbeat(400)
+        self.heartbeat(430)
+        self.assertEqual(self.total(), 90)
+
+    def test_late_heartbeat_is_ignored(self):
+        self.heartbeat(60)
+        self.assertFalse(self.heartbeat(30))
+        self.assertEqual(self.total(), 60)
+        self.assertEqual(self.session.last_heartbeat_at, self.at(60))
+
+    def test_finish_adds_last_interval_once(self):
+        self.heartbeat(30)
+        self.assertTrue(finish_session(self.session.id, self.user, self.chapter.id, now=self.at(50)))
+        self.assertFalse(finish_session(self.session.id, self.user, self.chapter.id, now=self.at(80)))
+        self.assertFalse(self.heartbeat(90))
+        self.assertEqual(self.total(), 50)
+        self.assertEqual(self.session.end_time, self.at(50))
+
+    def test_async_heartbeat(self):
+        async_to_sync(arecord_heartbeat)(self.session.id, self.user, self.chapter.id, now=self.at(30))
+        self.assertEqual(self.total(), 30)
+
+    def test_close_sessions(self):
+        other_chapter = Chapter.objects.create(title='Other', description='-', order=2)
+        silent = ChapterStudyTime.objects.create(
+            user=self.user, chapter=other_chapter, start_time=self.start - timedelta(hours=5)
+        )
+        self.heartbeat(30)
+        closed = close_sessions(ChapterStudyTime.objects.all(), now=timezone.now())
+        self.assertEqual(closed, 2)
+        self.assertEqual(self.total(), 30)
+        silent.refresh_from_db()
+        # ハートビートの無いセッションは経過秒数を上限で打ち切る
+        self.assertEqual(silent.total_seconds, 3600)
+
+    def test_parse_active(self):
+        for value, expected in [(None, True), (True, True), (False, False), ('false', False), ('0', False),
+                                ('1', True), ('true', True)]:
+            with self.subTest(value=value):
+                self.assertEqual(parse_active(value), expected)
@@ -1,7 +1,14 @@
 # urls.py - 优化版
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import views, metrics
+
+# 高頻度 JSON エンドポイント（ASGI 運用時は非同期版を使う）
+if settings.TUTORIAL_ASYNC_VIEWS:
+    from . import async_views as api_views
+else:
+    api_views = views
 
 urlpatterns = [
     # ==================== 基本页面 ====================
@@ -14,10 +21,13 @@ urlpatterns = [
     path('chapter/<int:chapter_id>/', views.chapter_detail, name='chapter_detail'),
     path('chapter/<int:chapter_id>/reset/', views.reset_chapter_progress, name='reset_chapter_progress'),
     path('chapter/<int:chapter_id>/mark_guide_studied/', views.mark_guide_studied, name='mark_guide_studied'),
+    path('guide/attachment/<int:attachment_id>/', views.download_attachment, name='download_attachment'),
+    path('guide/images/upload/', views.upload_guide_image, name='upload_guide_image'),
     path('chapter/<int:chapter_id>/complete/', views.complete_chapter, name='complete_chapter'),
-    path('question/<int:question_id>/submit/', views.submit_answer, name='submit_answer'),
-    path('question/<int:question_id>/hint/', views.get_question_hint, name='get_question_hint'),
+    path('question/<int:question_id>/submit/', api_views.submit_answer, name='submit_answer'),
+    path('question/<int:question_id>/hint/', api_views.get_question_hint, name='get_question_hint'),
     path('chapters/<int:chapter_id>/record_result/',views.record_chapter_result,name='record_chapter_result'),
+    path('search/', views.search_content, name='search_content'),
 
     # ==================== 错题管理 ====================
     path('wrong-answers/', views.wrong_answers_book, name='wrong_answers_book'),
@@ -27,7 +37,8 @@ urlpatterns = [
     # ==================== 学習時間管理 ====================
     path('chapter/<int:chapter_id>/start-study/', views.start_chapter_study, name='start_chapter_study'),
     path('chapter/<int:chapter_id>/end-study/', views.end_chapter_study, name='end_chapter_study'),
-    path('chapter/<int:chapter_id>/update-study-time/', views.update_study_time, name='update_study_time'),
+    path('chapter/<int:chapter_id>/end-study/beacon/', views.end_chapter_study_beacon, name='end_chapter_study_beacon'),
+    path('chapter/<int:chapter_id>/update-study-time/', api_views.update_study_time, name='update_study_time'),
     path('cleanup-study-sessions/', views.cleanup_study_sessions, name='cleanup_study_sessions'),
 
     # ==================== 进度和统计 ====================
@@ -49,7 +60,7 @@ urlpatterns = [
     path('api/remove-block-from-slot/<int:slot_id>/', views.remove_block_from_slot, name='api_remove_block_from_slot'),
     path('api/reset-architecture/', views.reset_architecture, name='api_reset_architecture'),
     path('api/generate-architecture-code/', views.generate_architecture_code, name='api_generate_architecture_code'),
-    path('api/block-detail/<int:block_id>/', views.block_detail_api, name='api_block_detail'),
+    path('api/block-detail/<int:block_id>/', api_views.block_detail_api, name='api_block_detail'),
     
     # 架构图管理API
     path('api/save-architecture/', views.save_architecture, name='api_save_architecture'),
@@ -61,7 +72,10 @@ urlpatterns = [
     path('api/save-layer-layout/', views.save_layer_layout, name='save_layer_layout'),
 
     # 积木分类和预览API
-    path('api/block-categories/', views.get_block_categories, name='api_block_categories'),
+    path('api/block-categories/', api_views.get_block_categories, name='api_block_categories'),
     path('api/architecture-preview/', views.get_architecture_preview, name='api_architecture_preview'),
+
+    # ==================== 运维 ====================
+    path('metrics/', metrics.metrics_view, name='metrics'),
 ]
 
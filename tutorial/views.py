@@ -1,5 +1,6 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
+from django.http import Http404, JsonResponse, HttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
@@ -9,17 +10,32 @@ from django.db.models import Count, Q, Max, Exists, OuterRef, Sum
 from django.db.models.functions import TruncDate
 from datetime import timedelta
 from django.utils import timezone
+from django.conf import settings
+from django.core.cache import cache
 from django.views.decorators.http import require_POST
 import json
 import logging
+from urllib.parse import urlsplit
 
 from .models import (
-    Chapter,StudyGuide,Question,Choice,UserProgress,UserProfile,WrongAnswer,BuildingBlock,ArchitectureSlot,
-    UserArchitecture,ArchitectureTemplate,ChapterStudyTime,ArchitectureDiagramTemplate,DiagramComponent,
-    ChapterResult,UserBadge,Badge,UserQuestionAnswer
+    Chapter,StudyGuide,StudyGuideAttachment,Question,UserProgress,UserProfile,WrongAnswer,BuildingBlock,ArchitectureSlot,
+    UserArchitecture,ArchitectureTemplate,ChapterStudyTime,
+    ChapterResult,UserBadge,Badge,UserQuestionAnswer,calculate_experience_for_chapter
 )
 
 from .forms import RegisterForm
+from . import cache as tutorial_cache
+from . import search
+from .cache import cached_query
+from .downloads import serve_attachment
+from .grading import grade_answer
+from .storage import content_addressed_storage
+from .tasks import enqueue, record_session_result
+from .study_time import close_sessions, finish_session, parse_active, record_heartbeat
+from .wrong_answers import record_wrong_answer
+from .diagram import (
+    get_diagram_json, get_architecture_slots, update_layer_layout, LayoutConflict
+)
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +47,7 @@ def home(request):
     """
     try:
         # すべてのアクティブなチャプターを取得
-        chapters = Chapter.objects.filter(is_active=True).order_by('order')
+        chapters = get_active_chapters()
         
         # --- 【追加】ガイド表示判定のロジック ---
         show_guide = False
@@ -46,16 +62,20 @@ def home(request):
         # ユーザーがログインしている場合、進捗情報を取得
         chapters_with_progress = []
         if request.user.is_authenticated:
+            progress_widths = cached_query(
+                tutorial_cache.USER, 'chapter_progress_widths',
+                lambda: {
+                    chapter_id: 100 if completed else (50 if studied_guide else 0)
+                    for chapter_id, completed, studied_guide in UserProgress.objects.filter(
+                        user=request.user
+                    ).values_list('chapter_id', 'completed', 'studied_guide')
+                },
+                user_id=request.user.id,
+            )
             for chapter in chapters:
-                try:
-                    progress = UserProgress.objects.get(user=request.user, chapter=chapter)
-                    progress_width = 100 if progress.completed else (50 if progress.studied_guide else 0)
-                except UserProgress.DoesNotExist:
-                    progress_width = 0
-                
                 chapters_with_progress.append({
                     'chapter': chapter,
-                    'progress_width': progress_width
+                    'progress_width': progress_widths.get(chapter.id, 0)
                 })
         else:
              # 未ログインユーザーにはデフォルトの進捗を表示
@@ -111,7 +131,8 @@ def register(request):
 @login_required
 def chapter_detail(request, chapter_id):
     # 1. 获取当前章节
-    chapter = Chapter.objects.filter(id=chapter_id, is_active=True).first()
+    all_chapters = get_active_chapters()
+    chapter = next((c for c in all_chapters if c.id == chapter_id), None)
     if chapter is None:
         messages.error(request, "指定されたチャプターが見つかりません。")
         return redirect("home")
@@ -147,33 +168,42 @@ def chapter_detail(request, chapter_id):
 
     # 3. 获取学习指南
     try:
-        study_guide = StudyGuide.objects.filter(chapter=chapter, is_published=True).first()
+        study_guide = cached_query(
+            tutorial_cache.CONTENT, 'study_guide',
+            lambda: StudyGuide.objects.filter(chapter=chapter, is_published=True).first(),
+            chapter.id,
+        )
     except Exception as e:
         logger.error(f"[chapter_detail] 学習ガイド取得エラー: {e}", exc_info=True)
         study_guide = None
 
     # 4. 获取问题列表
     try:
-        questions = Question.objects.filter(chapter=chapter, is_active=True).order_by("order")
+        # 選択肢もまとめて取得してキャッシュする（テンプレートの choice_set.all はプリフェッチを使う）
+        questions = cached_query(
+            tutorial_cache.CONTENT, 'chapter_questions',
+            lambda: with_fragment_versions(
+                Question.objects.filter(chapter=chapter, is_active=True)
+                .order_by("order").prefetch_related("choice_set")
+            ),
+            chapter.id,
+        )
     except Exception as e:
         logger.error(f"[chapter_detail] 问题取得エラー: {e}", exc_info=True)
-        questions = Question.objects.none()
+        questions = []
 
-    # 4.5 读取用户之前的回答
+    # 4.5 读取用户之前的回答（問題のマークアップはキャッシュするので、回答状態は JSON で渡す）
+    question_states = {}
     try:
-        user_answers_qs = UserQuestionAnswer.objects.filter(
+        question_ids = [q.id for q in questions]
+        user_answers = UserQuestionAnswer.objects.filter(
             user=request.user,
-            question__chapter=chapter
-        ).select_related("question")
-        answers_by_qid = {ua.question_id: ua for ua in user_answers_qs}
-        for q in questions:
-            ua = answers_by_qid.get(q.id)
-            if ua:
-                q.user_answer = ua.answer_text
-                q.user_is_correct = ua.is_correct
-            else:
-                q.user_answer = ""
-                q.user_is_correct = None
+            question_id__in=question_ids
+        ).values_list("question_id", "answer_text", "is_correct")
+        question_states = {
+            question_id: {"answer": answer_text or "", "correct": is_correct}
+            for question_id, answer_text, is_correct in user_answers
+        }
     except Exception as e:
         logger.error(f"[chapter_detail] 用户回答取得エラー: {e}", exc_info=True)
 
@@ -184,7 +214,6 @@ def chapter_detail(request, chapter_id):
         logger.error(f"[chapter_detail] 进捗取得エラー: {e}", exc_info=True)
         user_progress = None
 
-    all_chapters = list(Chapter.objects.filter(is_active=True).order_by('order', 'id'))
     next_chapter = None
     try:
         current_index = all_chapters.index(chapter)
@@ -198,6 +227,8 @@ def chapter_detail(request, chapter_id):
         "chapter": chapter,
         "study_guide": study_guide,
         "questions": questions,
+        "question_states": question_states,
+        "fragment_timeout": tutorial_cache.timeout_for(tutorial_cache.CONTENT),
         "user_progress": user_progress,
         "current_session_id": study_session.id if study_session else None,
         "next_chapter": next_chapter,
@@ -214,28 +245,25 @@ def chapter_detail(request, chapter_id):
 def update_study_time(request, chapter_id):
     """
     更新学习时间（用于自动保存）
+    ハートビートとして扱い、前回からの区間がアクティブなら学習時間に加算する
     """
     try:
-        chapter = get_object_or_404(Chapter, id=chapter_id)
         data = json.loads(request.body)
         study_session_id = data.get('study_session_id')
-        frontend_seconds = data.get('frontend_seconds', 0)
+        active = parse_active(data.get('active'))
         is_auto_save = data.get('is_auto_save', False)
-        
-        logger.info(f"更新学习时间: 用户={request.user}, 章节={chapter_id}, 前端秒数={frontend_seconds}, 自动保存={is_auto_save}")
-        
+
+        logger.info(f"更新学习时间: 用户={request.user}, 章节={chapter_id}, 活动={active}, 自动保存={is_auto_save}")
+
         if study_session_id:
+            record_heartbeat(study_session_id, request.user, chapter_id, active=active)
             study_session = get_object_or_404(
-                ChapterStudyTime, 
-                id=study_session_id, 
+                ChapterStudyTime,
+                id=study_session_id,
                 user=request.user,
-                chapter=chapter
+                chapter_id=chapter_id
             )
-            
-            current_db_seconds = study_session.total_seconds or 0
-            study_session.total_seconds = max(int(frontend_seconds), current_db_seconds, 1)
-            study_session.save()
-            
+
             return JsonResponse({
                 'success': True,
                 'message': '学習時間を更新しました',
@@ -261,21 +289,8 @@ def cleanup_study_sessions(request):
     清理用户的所有活跃学习会话
     """
     try:
-        active_sessions = ChapterStudyTime.objects.filter(
-            user=request.user,
-            end_time__isnull=True
-        )
-        
-        count = active_sessions.count()
-        now = timezone.now()
-        
-        for session in active_sessions:
-            if session.start_time:
-                time_diff = now - session.start_time
-                session.total_seconds = max(int(time_diff.total_seconds()), 1)
-            session.end_time = now
-            session.save()
-        
+        count = close_sessions(ChapterStudyTime.objects.filter(user=request.user))
+
         return JsonResponse({
             'success': True,
             'message': f'清理了 {count} 个活跃会话'
@@ -359,9 +374,7 @@ def end_chapter_study(request, chapter_id):
         chapter = get_object_or_404(Chapter, id=chapter_id)
         data = json.loads(request.body or "{}")
         study_session_id = data.get('study_session_id')
-        
-        # 核心：前端传过来的绝对秒数
-        frontend_seconds = int(data.get('frontend_seconds', 0))
+        active = parse_active(data.get('active'))
 
         if study_session_id:
             study_session = get_object_or_404(
@@ -375,59 +388,17 @@ def end_chapter_study(request, chapter_id):
         if not study_session:
             return JsonResponse({'success': False, 'message': 'Session not found'}, status=400)
 
-        now = timezone.now()
-        study_session.end_time = now
-
-        # 计算后端存活时间作为兜底
-        backend_duration = int((now - study_session.start_time).total_seconds())
-        
-        # --- 修复逻辑 ---
-        # 既然你遇到了 1 秒的问题，说明 frontend_seconds 传值可能在某次调用中被清零了
-        # 我们取：已有值、前端传值、后端计算值 三者中的最大值，确保时间只能增加不能减少
-        current_db_val = study_session.total_seconds or 0
-        study_session.total_seconds = max(frontend_seconds, backend_duration, current_db_val)
-        
-        study_session.save()
+        # 最後のハートビートからの区間を加算して閉じる（アイドル区間は数えない）
+        closed = finish_session(study_session.id, request.user, chapter.id, active=active)
+        study_session.refresh_from_db()
 
         # 5. ★ここで「その時点の回答状況」からチャプター結果を自動記録する ★
-        try:
-            answers_qs = UserQuestionAnswer.objects.filter(
-                user=request.user,
-                question__chapter=chapter,
-            )
-
-            total = answers_qs.count()
-            correct = answers_qs.filter(is_correct=True).count()
-
-            if total > 0:
-                accuracy = int(correct / total * 100)
-
-                ChapterResult.objects.create(
-                    user=request.user,
-                    chapter=chapter,
-                    correct_count=correct,
-                    total_count=total,
-                    accuracy=accuracy,
-                )
-
-                user_progress, _ = UserProgress.objects.get_or_create(
-                    user=request.user,
-                    chapter=chapter,
-                )
-                if accuracy > user_progress.score:
-                    user_progress.score = accuracy
-                    user_progress.save()
-
-                logger.info(
-                    f"[end_chapter_study] 自動記録成功: user={request.user}, chapter={chapter.id}"
-                )
-            else:
-                logger.info(
-                    f"[end_chapter_study] 自動記録スキップ: 回答数0 user={request.user}"
-                )
-
-        except Exception as e2:
-            logger.error(f"[end_chapter_study] 結果記録エラー: {e2}", exc_info=True)
+        #    （バックグラウンドジョブで実行し、レスポンスは待たせない。既に閉じたセッションでは記録しない）
+        if closed:
+            try:
+                enqueue(record_session_result, request.user.id, chapter.id)
+            except Exception as e2:
+                logger.error(f"[end_chapter_study] 結果記録ジョブの登録エラー: {e2}", exc_info=True)
 
         # 6. レスポンス
         return JsonResponse({
@@ -442,6 +413,66 @@ def end_chapter_study(request, chapter_id):
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
 
+def _is_same_origin(request):
+    """Origin（無ければ Referer）が自サイトまたは CSRF_TRUSTED_ORIGINS かどうか"""
+    origin = request.META.get('HTTP_ORIGIN')
+    if not origin:
+        referer = request.META.get('HTTP_REFERER')
+        if not referer:
+            return False
+        parsed = urlsplit(referer)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+    allowed = {f"{request.scheme}://{request.get_host()}", *settings.CSRF_TRUSTED_ORIGINS}
+    return origin in allowed
+
+
+@csrf_exempt
+@require_POST
+def end_chapter_study_beacon(request, chapter_id):
+    """
+    navigator.sendBeacon 用の学習終了エンドポイント
+    本文は text/plain の JSON またはフォーム形式（sendBeacon はヘッダーを付けられない
+    ため CSRF トークンの代わりに Origin を検証する）。セッションを閉じる UPDATE だけを
+    行い、チャプター結果の記録はバックグラウンドに回して 204 を返す。
+    同じ idempotency_key の再送や、既に終了したセッションへの通知は何もしない
+    """
+    if not request.user.is_authenticated:
+        return HttpResponse(status=401)
+    if not _is_same_origin(request):
+        return HttpResponse(status=403)
+
+    try:
+        if request.content_type in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+            data = request.POST
+        else:
+            data = json.loads(request.body or "{}")
+        study_session_id = data.get('study_session_id')
+        active = parse_active(data.get('active'))
+        idempotency_key = str(data.get('idempotency_key') or study_session_id or '')
+    except (ValueError, TypeError, AttributeError):
+        return HttpResponse(status=400)
+
+    if idempotency_key:
+        cache_key = f"study_beacon:{request.user.id}:{chapter_id}:{idempotency_key}"
+        if not cache.add(cache_key, True, settings.TUTORIAL_BEACON_IDEMPOTENCY_TTL):
+            return HttpResponse(status=204)
+
+    if not study_session_id:
+        study_session_id = ChapterStudyTime.objects.filter(
+            user=request.user, chapter_id=chapter_id, end_time__isnull=True
+        ).order_by('-start_time').values_list('id', flat=True).first()
+        if study_session_id is None:
+            return HttpResponse(status=404)
+
+    # end_time が未設定の場合だけ閉じる（別プロセスに同時に届いた通知との二重記録を防ぐ）
+    if finish_session(study_session_id, request.user, chapter_id, active=active):
+        enqueue(record_session_result, request.user.id, chapter_id)
+    elif not ChapterStudyTime.objects.filter(id=study_session_id, user=request.user, chapter_id=chapter_id).exists():
+        return HttpResponse(status=404)
+
+    return HttpResponse(status=204)
+
+
 @login_required
 @require_POST
 def clear_chapter_wrong_answers(request, chapter_id):
@@ -485,11 +516,11 @@ def wrong_answers_book(request):
         total_correct = UserQuestionAnswer.objects.filter(user=user, is_correct=True).count()
         total_score = total_correct * 10
 
-        # 2. 全误答记录
-        wrong_answers_qs = WrongAnswer.objects.filter(user=user).select_related(
+        # 2. 全误答记录（問題ごとに 1 行。回数と最近の誤答を含む）
+        wrong_answers = list(WrongAnswer.objects.filter(user=user).select_related(
             'question', 'question__chapter'
-        ).order_by('-created_at')
-        total_wrong = wrong_answers_qs.count()
+        ).order_by('-last_wrong_at'))
+        total_wrong = len(wrong_answers)
 
         # 3. 【核心修改】日别学习时长统计 (最近7天)
         # 3. 日别学习时长统计 (最近7日間)
@@ -544,15 +575,22 @@ def wrong_answers_book(request):
 
         # 5. 组装章节误答数据 (维持原样)
         wrong_by_chapter = {}
-        for wa in wrong_answers_qs:
+        for wa in wrong_answers:
             cid = wa.question.chapter_id
             wrong_by_chapter.setdefault(cid, []).append(wa)
 
+        # チャプターごとの問題数は 1 クエリでまとめて集計する
+        question_counts = dict(
+            Question.objects.filter(chapter_id__in=wrong_by_chapter).values('chapter_id').annotate(
+                total=Count('id')
+            ).values_list('chapter_id', 'total')
+        )
+
         chapters_with_wrong_answers = []
         for cid, wa_list in wrong_by_chapter.items():
             chapter = wa_list[0].question.chapter
-            total_questions = Question.objects.filter(chapter=chapter).count()
-            unique_wrong = len({wa.question_id for wa in wa_list})
+            total_questions = question_counts.get(cid, 0)
+            unique_wrong = len(wa_list)
             accuracy = int((total_questions - unique_wrong) / total_questions * 100) if total_questions > 0 else 0
             
             chapters_with_wrong_answers.append({
@@ -567,7 +605,7 @@ def wrong_answers_book(request):
         total_questions_all = Question.objects.filter(chapter_id__in=chapter_seconds_map.keys()).count()
         global_accuracy = None
         if total_questions_all > 0:
-            unique_wrong_all = len({wa.question_id for wa in wrong_answers_qs})
+            unique_wrong_all = len(wrong_answers)
             global_accuracy = int(max(total_questions_all - unique_wrong_all, 0) / total_questions_all * 100)
 
         completed_chapters_count = UserProgress.objects.filter(user=user, completed=True).count()
@@ -610,6 +648,54 @@ def mark_guide_studied(request, chapter_id):
         logger.error(f"学習ガイドマークエラー: {e}")
         return JsonResponse({'success': False, 'message': '操作が失敗しました'})
 
+@login_required
+@require_http_methods(["GET", "HEAD"])
+def download_attachment(request, attachment_id):
+    """
+    学習ガイドの添付ファイルをダウンロード
+    公開中のガイド（有効なチャプター）の添付のみ。スタッフは非公開のものも取得できる
+    """
+    attachments = StudyGuideAttachment.objects.select_related('study_guide__chapter')
+    if not request.user.is_staff:
+        attachments = attachments.filter(study_guide__is_published=True, study_guide__chapter__is_active=True)
+    attachment = get_object_or_404(attachments, id=attachment_id)
+
+    response = serve_attachment(request, attachment)
+    if response is None:
+        logger.error(f"添付ファイルが見つかりません: attachment={attachment.id} file={attachment.file.name}")
+        raise Http404("添付ファイルが見つかりません")
+    return response
+
+GUIDE_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+@csrf_exempt
+@require_POST
+def upload_guide_image(request):
+    """
+    学習ガイド編集（TinyMCE）からの画像アップロード
+    TinyMCE は CSRF トークンを送らないため Origin を検証する。スタッフのみ。
+    画像は内容アドレスのストレージに保存するので、同じ画像を何度貼っても 1 つだけ保存される
+    """
+    if not (request.user.is_authenticated and request.user.is_staff):
+        return JsonResponse({'error': '権限がありません'}, status=403)
+    if not _is_same_origin(request):
+        return JsonResponse({'error': '不正なリクエストです'}, status=403)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'ファイルがありません'}, status=400)
+    if not upload.name.lower().endswith(GUIDE_IMAGE_EXTENSIONS):
+        return JsonResponse({'error': '画像ファイルのみアップロードできます'}, status=400)
+    if upload.size > settings.TUTORIAL_GUIDE_IMAGE_MAX_BYTES:
+        return JsonResponse({'error': 'ファイルサイズが大きすぎます'}, status=400)
+
+    try:
+        name = content_addressed_storage.save(f'study_guide_images/{upload.name}', upload)
+    except Exception as e:
+        logger.error(f"ガイド画像アップロードエラー: {e}", exc_info=True)
+        return JsonResponse({'error': 'アップロードに失敗しました'}, status=500)
+    return JsonResponse({'location': content_addressed_storage.url(name)})
+
 @login_required
 @require_http_methods(["POST"])
 def submit_answer(request, question_id):
@@ -620,95 +706,13 @@ def submit_answer(request, question_id):
         question = get_object_or_404(Question, id=question_id)
         user_answer = request.POST.get('answer', '')
         
-        is_correct = False
-        correct_answer_text = ""
-        error_message = ""
-        
-        # 問題タイプに基づいて回答を検証
-        if question.question_type == 'choice':
-            # 選択問題のロジック
-            selected_choice = get_object_or_404(Choice, id=user_answer)
-            is_correct = selected_choice.is_correct
-            
-            # 正解テキストを取得
-            correct_choices = question.choice_set.filter(is_correct=True)
-            correct_answer_text = ", ".join([choice.choice_text for choice in correct_choices])
-            
-            if not is_correct:
-                error_message = "選択が間違っています"
-                # 誤答を記録
-                WrongAnswer.objects.create(
-                    user=request.user,
-                    question=question,
-                    wrong_answer=selected_choice.choice_text,
-                    correct_answer=correct_answer_text
-                )
-        
-        elif question.question_type == 'fill':
-            # 空欄問題のロジック
-            correct_choices = question.choice_set.filter(
-                is_correct=True, 
-                blank_index=0
-            )
-            
-            # ユーザー回答が正解と一致するかチェック
-            user_answer_clean = user_answer.strip().lower()
-            for choice in correct_choices:
-                correct_answer_clean = choice.choice_text.strip().lower()
-                if user_answer_clean == correct_answer_clean:
-                    is_correct = True
-                    correct_answer_text = choice.choice_text
-                    break
-            
-            if not is_correct:
-                error_message = "回答が正しくありません"
-                # 记录错题
-                correct_answer_display = ", ".join([choice.choice_text for choice in correct_choices])
-                WrongAnswer.objects.create(
-                    user=request.user,
-                    question=question,
-                    wrong_answer=user_answer,
-                    correct_answer=correct_answer_display
-                )
+        # 問題タイプに基づいて回答を検証（選択肢は 1 クエリでまとめて取得）
+        result = grade_answer(question.question_type, user_answer, list(question.choice_set.all()))
+        is_correct = result['is_correct']
         
-        elif question.question_type == 'multi_fill':
-            # 複数空欄問題のロジック
-            user_answers = user_answer.split(',')
-            is_correct = True
-            correct_answers_by_blank = {}
-            
-            # 各空欄の正解を取得
-            for i in range(len(user_answers)):
-                correct_choices = question.choice_set.filter(
-                    is_correct=True, 
-                    blank_index=i
-                )
-                correct_answers_by_blank[i] = [choice.choice_text.strip().lower() for choice in correct_choices]
-            
-            # 各回答を検証
-            for i, user_ans in enumerate(user_answers):
-                user_ans_clean = user_ans.strip().lower()
-                if i in correct_answers_by_blank and user_ans_clean not in correct_answers_by_blank[i]:
-                    is_correct = False
-                    break
-            
-            # 正解テキストを構築
-            correct_answer_parts = []
-            for i in sorted(correct_answers_by_blank.keys()):
-                correct_options = correct_answers_by_blank[i]
-                if correct_options:
-                    correct_answer_parts.append(f"空{i+1}: {', '.join(correct_options)}")
-            correct_answer_text = "; ".join(correct_answer_parts)
-            
-            if not is_correct:
-                error_message = "一部の回答が正しくありません"
-                # 誤答を記録
-                WrongAnswer.objects.create(
-                    user=request.user,
-                    question=question,
-                    wrong_answer=user_answer,
-                    correct_answer=correct_answer_text
-                )
+        if result['wrong_answer'] is not None:
+            # 誤答を記録（ユーザー・問題ごとの 1 行に回数と最近の誤答を集約）
+            record_wrong_answer(request.user, question, result['wrong_answer'], result['wrong_correct_answer'])
 
         try:
             UserQuestionAnswer.objects.update_or_create(
@@ -726,8 +730,8 @@ def submit_answer(request, question_id):
             'success': True,
             'is_correct': is_correct,
             'explanation': question.explanation,
-            'correct_answer': correct_answer_text,
-            'message': error_message  # エラーメッセージを追加
+            'correct_answer': result['correct_answer'],
+            'message': result['message']  # エラーメッセージを追加
         })
     
     except Exception as e:
@@ -809,7 +813,17 @@ def complete_chapter(request, chapter_id):
             })
 
         # --- 【追加】レベルアップ判定のための事前準備 ---
+        # 経験値・バッジはシグナルから登録されるバックグラウンドジョブで授与されるため、
+        # ジョブの完了を待たずに授与後の経験値・レベルを見込みで計算する
+        # （まだジョブが処理していない他のチャプターの完了分も含める）
         profile = request.user.userprofile
+        pending_progress = UserProgress.objects.filter(
+            user=request.user, completed=True, experience_awarded=False
+        ).exclude(chapter=chapter).select_related('chapter')
+        for pending in pending_progress:
+            if not profile.has_experience_for_chapter(pending.chapter_id):
+                profile.experience += calculate_experience_for_chapter(pending.chapter)
+        profile.level = profile.calculate_level()
         old_level = profile.level  # 更新前のレベルを保存
         # ------------------------------------------
 
@@ -817,10 +831,12 @@ def complete_chapter(request, chapter_id):
         user_progress.completed = True
         user_progress.score = 100
         user_progress.save()
-        
-        # ユーザープロファイル情報を取得
-        # (models.pyのシグナル等で経験値が入る想定)
-        profile.refresh_from_db() # データベースの最新状態（更新後の経験値・レベル）を反映
+
+        experience_gained = 0
+        if not profile.has_experience_for_chapter(chapter.id):
+            experience_gained = calculate_experience_for_chapter(chapter)
+            profile.experience += experience_gained
+            profile.level = profile.calculate_level()
         level_info = profile.get_level_info()
         
         # --- 【追加】レベルアップの判定 ---
@@ -833,7 +849,7 @@ def complete_chapter(request, chapter_id):
             'message': f'おめでとうございます！第{chapter.order}章: {chapter.title}を完了しました',
             'level_info': level_info,
             'chapter_completed': True,
-            'experience_gained': 50,
+            'experience_gained': experience_gained,
             'level_up': is_level_up, # 【変更】判定結果を反映
             'new_level': new_level    # 【追加】新しいレベルを渡す
         }
@@ -926,7 +942,11 @@ def calculate_user_rank(user):
     """ユーザーランキングを計算（簡易版）"""
     # ここにより複雑なランキングロジックを実装可能
     user_exp = user.userprofile.experience
-    higher_rank_users = UserProfile.objects.filter(experience__gt=user_exp).count()
+    higher_rank_users = cached_query(
+        tutorial_cache.LEADERBOARD, 'users_above',
+        lambda: UserProfile.objects.filter(experience__gt=user_exp).count(),
+        user_exp,
+    )
     return higher_rank_users + 1
 
 # ==================== 進捗と誤答ビュー ====================
@@ -957,19 +977,15 @@ def level_profile(request):
         ).count()
         total_score = total_correct * 10
         
-        # === バッジデータ取得の修正 ===
-        print(f"=== バッジデータチェック開始 ===")
-        
+        # === バッジデータ取得 ===
         try:
             from .models import Badge, UserBadge
             
             # すべてのアクティブなバッジを取得
             all_badges = Badge.objects.filter(is_active=True).order_by('order')
-            print(f"✅ データベース内のアクティブバッジ総数: {all_badges.count()}")
             
             # ユーザーがアンロックしたバッジを取得
             user_badges = UserBadge.objects.filter(user=request.user)
-            print(f"✅ ユーザーがアンロックしたバッジ数: {user_badges.count()}")
             
             # バッジ進捗データを構築
             badges_with_progress = []
@@ -987,17 +1003,16 @@ def level_profile(request):
                         if hasattr(profile, 'get_badge_progress'):
                             progress_data = profile.get_badge_progress(badge)
                         else:
-                            print(f"⚠️ get_badge_progress メソッドが存在しません、デフォルト進捗データを使用")
                             # デフォルト進捗データを提供
                             progress_data = get_default_badge_progress(profile, badge)
                     except Exception as progress_error:
-                        print(f"⚠️ バッジ進捗取得失敗: {progress_error}")
+                        logger.warning(f"バッジ進捗取得失敗: {progress_error}")
                         progress_data = get_default_badge_progress(profile, badge)
                     
                     # アンロック時間を検索
                     unlocked_at = None
                     for user_badge in user_badges:
-                        if user_badge.badge.id == badge.id:
+                        if user_badge.badge_id == badge.id:
                             unlocked_at = user_badge.unlocked_at
                             break
                     
@@ -1012,26 +1027,22 @@ def level_profile(request):
                     
                     if is_unlocked:
                         unlocked_count += 1
-                    
-                    print(f"バッジ '{badge.name}': アンロック状態={is_unlocked}, 進捗データ={bool(progress_data)}")
+
 
                 except Exception as badge_error:
-                    print(f"❌ バッジ  {badge.name} の処理中にエラー: {badge_error}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception(f"バッジ {badge.name} の処理中にエラー: {badge_error}")
                     continue
             
-            print(f"✅ 最終バッジデータ: {len(badges_with_progress)} 個, アンロック済み: {unlocked_count} 個")
+            logger.debug(
+                "バッジデータ構築完了",
+                extra={'user_id': request.user.id, 'badges': len(badges_with_progress), 'unlocked': unlocked_count}
+            )
             
         except Exception as badge_main_error:
-            print(f"❌ バッジメインプロセス失敗: {badge_main_error}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"バッジメインプロセス失敗: {badge_main_error}")
             badges_with_progress = []
             unlocked_count = 0
-        
-        print(f"=== バッジデータチェック終了 ===")
-        # === バッジデータチェック終了 ===
+        # === バッジデータ取得終了 ===
         
         level_info = {
             'experience': profile.experience,
@@ -1053,10 +1064,7 @@ def level_profile(request):
         return render(request, 'tutorial/level_profile.html', context)
     
     except Exception as e:
-        logger.error(f"レベルプロファイル読み込みエラー: {e}")
-        print(f"❌ レベルプロファイルエラー: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"レベルプロファイル読み込みエラー: {e}")
         messages.error(request, 'レベルプロファイルの読み込み中にエラーが発生しました')
         return redirect('home')
 
@@ -1130,7 +1138,7 @@ def building_blocks(request):
             else:
                 locked_blocks.append(block)
         
-        # ユーザーのアーキテクチャスロットを取得または作成
+        # ユーザーのアーキテクチャスロットを取得
         slots_with_assignments = get_user_architecture_slots(request.user)
         
         # チャプター完了状況を計算
@@ -1186,107 +1194,15 @@ def block_detail(request, block_id):
 def get_architecture_data(request):
     """获取架构图数据"""
     try:
-        # 创建或获取默认架构图
-        diagram, created = ArchitectureDiagramTemplate.objects.get_or_create(
-            name="物品管理系统架构图",
-            defaults={
-                'description': '基于Django的物品管理系统标准架构',
-                'layers': [
-                    {'name': 'HTTP层',   'color': '#3B82F6', 'order': 0, 'x': 100, 'y': 200, 'size': 160},
-                    {'name': 'URL路由层', 'color': '#10B981', 'order': 1, 'x': 320, 'y': 200, 'size': 160},
-                    {'name': '视图层',   'color': '#8B5CF6', 'order': 2, 'x': 540, 'y': 200, 'size': 160},
-                    {'name': '表单层',   'color': '#EC4899', 'order': 3, 'x': 760, 'y': 200, 'size': 160},
-                    {'name': '模型层',   'color': '#EF4444', 'order': 4, 'x': 980, 'y': 200, 'size': 160},
-                    {'name': '模板层',   'color': '#06B6D4', 'order': 5, 'x': 1200,'y': 200, 'size': 160},
-                ],
-                'connections': [
-                    {'from': 'http_request', 'to': 'url_router', 'type': 'solid'},
-                    {'from': 'url_items', 'to': 'item_list_view', 'type': 'solid'},
-                    {'from': 'url_add', 'to': 'item_create_view', 'type': 'solid'},
-                    {'from': 'url_detect', 'to': 'item_delete_view', 'type': 'solid'},
-                    {'from': 'item_list_view', 'to': 'item_model', 'type': 'solid'},
-                    {'from': 'item_create_view', 'to': 'item_form', 'type': 'solid'},
-                    {'from': 'item_delete_view', 'to': 'item_model', 'type': 'solid'},
-                    {'from': 'item_form', 'to': 'item_model', 'type': 'solid'},
-                    {'from': 'item_list_view', 'to': 'item_list_template', 'type': 'dashed'},
-                    {'from': 'item_create_view', 'to': 'item_form_template', 'type': 'dashed'},
-                ]
-            }
-        )
-        
-        # 如果新创建，则初始化组件
-        if created:
-            components_data = [
-                # HTTP层
-                {'name': 'HTTP请求', 'type': 'http_request', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#3B82F6', 'layer': 'HTTP层', 'allowed_types': ['url'], 'order': 0},
-        
-                # URL路由层
-                {'name': 'URL路由器', 'type': 'url_router', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['url'], 'order': 0},
-                {'name': '/items/', 'type': 'url_items', 'x': 200, 'y': 10, 'width': 100, 'height': 40, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['view'], 'order': 1},
-                {'name': '/items/add/', 'type': 'url_add', 'x': 330, 'y': 10, 'width': 100, 'height': 40, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['view'], 'order': 2},
-                {'name': '/items/detect/', 'type': 'url_detect', 'x': 460, 'y': 10, 'width': 100, 'height': 40, 'color': '#10B981', 'layer': 'URL路由层', 'allowed_types': ['view'], 'order': 3},
-        
-                # 视图层
-                {'name': 'ItemListView', 'type': 'item_list_view', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#8B5CF6', 'layer': '视图层', 'allowed_types': ['view'], 'order': 0},
-                {'name': 'ItemCreateView', 'type': 'item_create_view', 'x': 200, 'y': 10, 'width': 120, 'height': 60, 'color': '#8B5CF6', 'layer': '视图层', 'allowed_types': ['view'], 'order': 1},
-                {'name': 'ItemDeleteView', 'type': 'item_delete_view', 'x': 350, 'y': 10, 'width': 120, 'height': 60, 'color': '#8B5CF6', 'layer': '视图层', 'allowed_types': ['view'], 'order': 2},
-        
-                # 表单层
-                {'name': 'ItemForm', 'type': 'item_form', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#EC4899', 'layer': '表单层', 'allowed_types': ['form'], 'order': 0},
-        
-                # 模型层
-                {'name': 'Item模型', 'type': 'item_model', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#EF4444', 'layer': '模型层', 'allowed_types': ['data_model'], 'order': 0},
-        
-                # 模板层
-                {'name': 'item_list.html', 'type': 'item_list_template', 'x': 50, 'y': 10, 'width': 120, 'height': 60, 'color': '#06B6D4', 'layer': '模板层', 'allowed_types': ['template'], 'order': 0},
-                {'name': '表单模板', 'type': 'item_form_template', 'x': 200, 'y': 10, 'width': 120, 'height': 60, 'color': '#06B6D4', 'layer': '模板层', 'allowed_types': ['template'], 'order': 1},
-            ]
-
-            for comp_data in components_data:
-                DiagramComponent.objects.create(
-                    diagram=diagram,
-                    name=comp_data['name'],
-                    component_type=comp_data['type'],
-                    position_x=comp_data['x'],
-                    position_y=comp_data['y'],
-                    width=comp_data['width'],
-                    height=comp_data['height'],
-                    color=comp_data['color'],
-                    allowed_block_types=comp_data['allowed_types'],
-                    layer=comp_data['layer'],
-                    order=comp_data['order']
-                )
-        
-        # 获取组件数据
-        components = DiagramComponent.objects.filter(diagram=diagram)
-        components_list = []
-        for comp in components:
-            components_list.append({
-                'id': comp.id,
-                'name': comp.name,
-                'type': comp.component_type,
-                'position': {'x': comp.position_x, 'y': comp.position_y},
-                'size': {'width': comp.width, 'height': comp.height},
-                'color': comp.color,
-                'allowed_block_types': comp.allowed_block_types,
-                'layer': comp.layer
+        # 默认架构图由 seed_defaults 命令 / 数据迁移投入，这里直接返回缓存中的 JSON
+        diagram_json = get_diagram_json()
+        if diagram_json is None:
+            return JsonResponse({
+                'success': False,
+                'message': '架构图尚未初始化，请执行 manage.py seed_defaults'
             })
 
-        for idx, layer in enumerate(diagram.layers):
-            layer.setdefault('x', 100 + idx * 220)
-            layer.setdefault('y', 200)
-            layer.setdefault('size', 160)
-        
-        return JsonResponse({
-            'success': True,
-            'diagram': {
-                'name': diagram.name,
-                'description': diagram.description,
-                'layers': diagram.layers,
-                'components': components_list,
-                'connections': diagram.connections
-            }
-        })
+        return HttpResponse(diagram_json, content_type='application/json')
         
     except Exception as e:
         logger.error(f"获取架构图数据错误: {e}")
@@ -1302,33 +1218,36 @@ def save_layer_layout(request):
     保存架构层的布局（位置/尺寸），写回 ArchitectureDiagramTemplate.layers JSON
     传入数据格式：
     {
+      "version": 3,            # 可选：读取时的版本号，不一致时返回 409
       "layers": [
         {"name": "HTTP层", "x": 120, "y": 260, "size": 160},
         ...
       ]
     }
+    只合并有变化的层，并以版本号做比较交换（CAS）更新
     """
     try:
         payload = json.loads(request.body)
         incoming_layers = payload.get('layers', [])
+        expected_version = payload.get('version')
+        if expected_version is not None:
+            expected_version = int(expected_version)
+
+        version, changed_layers = update_layer_layout(incoming_layers, expected_version)
 
-        diagram = ArchitectureDiagramTemplate.objects.get(name="物品管理系统架构图")
-        # 现有层做映射：按 name 合并位置
-        existing = {l['name']: l for l in diagram.layers}
-        for item in incoming_layers:
-            name = item.get('name')
-            if not name or name not in existing:
-                continue
-            existing[name]['x'] = int(item.get('x', existing[name].get('x', 0)))
-            existing[name]['y'] = int(item.get('y', existing[name].get('y', 0)))
-            existing[name]['size'] = int(item.get('size', existing[name].get('size', 160)))
-
-        # 写回列表（维持原顺序）
-        updated_layers = [existing[l['name']] for l in diagram.layers]
-        diagram.layers = updated_layers
-        diagram.save()
-
-        return JsonResponse({'success': True, 'message': '布局已保存'})
+        return JsonResponse({
+            'success': True,
+            'message': '布局已保存',
+            'version': version,
+            'changed_layers': changed_layers
+        })
+    except LayoutConflict as e:
+        return JsonResponse({
+            'success': False,
+            'conflict': True,
+            'version': e.current_version,
+            'message': f'保存失败: {str(e)}'
+        }, status=409)
     except Exception as e:
         logger.error(f"保存布局失败: {e}")
         return JsonResponse({'success': False, 'message': f'保存失败: {str(e)}'})
@@ -1676,7 +1595,7 @@ def get_architecture_preview(request):
     """
     try:
         #　ユーザーのアーキテクチャ図を取得
-        user_architecture, created = UserArchitecture.objects.get_or_create(user=request.user)
+        user_architecture = get_user_architecture(request.user)
         assigned_blocks = user_architecture.get_assigned_blocks()
         
         # プレビューデータを構築
@@ -1710,19 +1629,16 @@ def block_detail_api(request, block_id):
     API: ブロック詳細を取得
     """
     try:
-        print(f"=== ブロック詳細APIが呼び出されました ===")
-        print(f"リクエストユーザー: {request.user}")
-        print(f"リクエストブロックID: {block_id}")
-        
         block = get_object_or_404(BuildingBlock, id=block_id)
-        print(f"ブロックを発見: {block.name}")
         
         # ユーザーがこのブロックをアンロックしているかチェック
         is_unlocked = block.is_unlocked_for_user(request.user)
-        print(f"ブロックアンロック状態: {is_unlocked}")
+        logger.debug(
+            "ブロック詳細API",
+            extra={'user_id': request.user.id, 'block_id': block_id, 'unlocked': is_unlocked}
+        )
         
         if not is_unlocked:
-            print("ブロックがアンロックされていない、エラーを返す")
             return JsonResponse({
                 'success': False,
                 'message': 'このブロックはまだアンロックされていません'
@@ -1741,9 +1657,6 @@ def block_detail_api(request, block_id):
             'possible_projects': '<p class="no-content">制作可能なプロジェクトはまだ設定されていません</p>'
         }
         
-        print(f"返却データ: {block_data['name']}")
-        print("=== ブロック詳細API呼び出し完了 ===")
-        
         return JsonResponse({
             'success': True,
             'block': block_data
@@ -1751,7 +1664,6 @@ def block_detail_api(request, block_id):
     
     except Exception as e:
         logger.error(f"ブロック詳細取得エラー: {e}")
-        print(f"!!! ブロック詳細APIエラー: {e} !!!")
         return JsonResponse({
             'success': False,
             'message': f'ブロック詳細の取得中にエラーが発生しました: {str(e)}'
@@ -1777,22 +1689,26 @@ def block_library(request):
     ブロックライブラリページ
     """
     try:
-        # すべてのブロックを取得しタイプ別に分類
-        blocks_by_type = {}
-        all_blocks = BuildingBlock.objects.filter(is_active=True).order_by('block_type', 'order')
-        
-        for block in all_blocks:
-            if block.block_type not in blocks_by_type:
-                blocks_by_type[block.block_type] = {
-                    'display_name': block.get_block_type_display(),
-                    'blocks': []
-                }
-            
-            blocks_by_type[block.block_type]['blocks'].append(block)
-        
+        # すべてのブロックを取得しタイプ別に分類（教材データなのでキャッシュする）
+        def group_blocks():
+            blocks_by_type = {}
+            all_blocks = BuildingBlock.objects.filter(is_active=True).order_by('block_type', 'order')
+
+            for block in all_blocks:
+                if block.block_type not in blocks_by_type:
+                    blocks_by_type[block.block_type] = {
+                        'display_name': block.get_block_type_display(),
+                        'blocks': []
+                    }
+
+                blocks_by_type[block.block_type]['blocks'].append(block)
+            return blocks_by_type
+
+        blocks_by_type = cached_query(tutorial_cache.CONTENT, 'blocks_by_type', group_blocks)
+
         context = {
             'blocks_by_type': blocks_by_type,
-            'total_blocks': all_blocks.count()
+            'total_blocks': sum(len(group['blocks']) for group in blocks_by_type.values())
         }
         
         return render(request, 'block_library.html', context)
@@ -1801,22 +1717,96 @@ def block_library(request):
         logger.error(f"ブロックライブラリページエラー: {e}")
         return render(request, 'tutorial/block_library.html', {'blocks_by_type': {}, 'total_blocks': 0})
 
+# ==================== 検索 ====================
+
+SEARCH_MAX_LIMIT = 50
+
+@login_required
+@require_http_methods(["GET"])
+def search_content(request):
+    """
+    問題・学習ガイド・積木の全文検索（関連度順、一致箇所を <mark> で囲んだスニペット付き）
+    GET パラメーター: q（空白区切りの検索語、すべてを含むものが一致）、
+    type（question / guide / block、省略時はすべて）、limit（既定 20、最大 50）
+    """
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('type') or None
+    if kind is not None and kind not in search.KINDS:
+        return JsonResponse({'success': False, 'message': f'不明な種類です: {kind}'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), SEARCH_MAX_LIMIT)
+    except ValueError:
+        limit = 20
+
+    try:
+        results = search.search(query, kinds=[kind] if kind else None, limit=limit)
+
+        # ロックされた積木は詳細を表示できないため、結果から除く
+        block_ids = [result['id'] for result in results if result['kind'] == search.BLOCK]
+        if block_ids:
+            completed_chapters = UserProgress.objects.filter(
+                user=request.user, completed=True
+            ).values('chapter_id')
+            unlocked = set(
+                BuildingBlock.objects.filter(id__in=block_ids).filter(
+                    Q(manually_unlocked=True) | Q(chapters__in=completed_chapters)
+                ).values_list('id', flat=True)
+            )
+            results = [r for r in results if r['kind'] != search.BLOCK or r['id'] in unlocked]
+
+        chapter_titles = {chapter.id: chapter.title for chapter in get_active_chapters()}
+        for result in results:
+            if result['kind'] == search.BLOCK:
+                result['url'] = reverse('block_detail', args=[result['id']])
+            else:
+                result['url'] = reverse('chapter_detail', args=[result['chapter_id']])
+                if result['kind'] == search.QUESTION:
+                    result['url'] += f"#question-{result['id']}"
+            result['chapter'] = chapter_titles.get(result['chapter_id'], '')
+
+        return JsonResponse({'success': True, 'query': query, 'results': results})
+
+    except Exception as e:
+        logger.error(f"検索エラー: {e}")
+        return JsonResponse({'success': False, 'message': '検索中にエラーが発生しました'}, status=500)
+
 # ==================== 補助関数 ====================
 
+def get_active_chapters():
+    """有効なチャプターの一覧（表示順、キャッシュ済み）"""
+    return cached_query(
+        tutorial_cache.CONTENT, 'active_chapters',
+        lambda: list(Chapter.objects.filter(is_active=True).order_by('order', 'id')),
+    )
+
+def with_fragment_versions(questions):
+    """
+    問題の一覧を評価し、テンプレートのフラグメントキャッシュのキーに使う
+    fragment_version（問題の最終更新日時。選択肢の変更でも更新される）を付ける
+    """
+    questions = list(questions)
+    for question in questions:
+        question.fragment_version = int(question.updated_at.timestamp() * 1000000)
+    return questions
+
+def get_user_architecture(user):
+    """
+    ユーザーのアーキテクチャ図を読み取り専用で取得
+    GET で行を作らないよう、無ければ保存しない空の図を返す（図はユーザー作成時に
+    create_user_profile シグナルが作り、無い場合も割り当ての保存時に作られる）
+    """
+    return UserArchitecture.objects.filter(user=user).order_by('id').first() or UserArchitecture(user=user)
+
 def get_user_architecture_slots(user):
     """
     ユーザーのアーキテクチャスロットと割り当て状況を取得
     """
     try:
-        # すべてのアクティブなアーキテクチャスロットを取得
-        slots = ArchitectureSlot.objects.filter(required=False)  # 必須でないスロットのみ取得
-        
-        # スロットが存在しない場合、デフォルトスロットを作成
-        if not slots.exists():
-            slots = create_default_slots()
+        # 必須でないスロットのみ取得（デフォルトスロットは seed_defaults で投入済み）
+        slots = get_architecture_slots()
         
         # ユーザーのアーキテクチャ図を取得
-        user_architecture, created = UserArchitecture.objects.get_or_create(user=user)
+        user_architecture = get_user_architecture(user)
         assigned_blocks = user_architecture.get_assigned_blocks()
         
         # 返却データを構築
@@ -1834,75 +1824,6 @@ def get_user_architecture_slots(user):
         logger.error(f"ユーザーアーキテクチャスロット取得エラー: {e}")
         return []
 
-def create_default_slots():
-    """
-    デフォルトのアーキテクチャスロットを作成
-    """
-    default_slots_data = [
-        {
-            'name': 'データモデル層',
-            'description': 'データモデルとデータベース構造を定義',
-            'allowed_block_types': ['data_model'],
-            'x_position': 100,
-            'y_position': 100,
-            'border_color': '#4C56B3',
-            'background_color': '#F0F9FF',
-            'required': False,
-            'order': 1
-        },
-        {
-            'name': 'ビジネスロジック層',
-            'description': 'ビジネスロジックと計算を処理',
-            'allowed_block_types': ['view'],
-            'x_position': 400,
-            'y_position': 100,
-            'border_color': '#059669',
-            'background_color': '#F0FDF4',
-            'required': False,
-            'order': 2
-        },
-        {
-            'name': 'ビューレイヤー',
-            'description': 'HTTPリクエストとレスポンスを処理',
-            'allowed_block_types': ['view'],
-            'x_position': 100,
-            'y_position': 300,
-            'border_color': '#DC2626',
-            'background_color': '#FEF2F2',
-            'required': False,
-            'order': 3
-        },
-        {
-            'name': 'URL層',
-            'description': 'URLルーティングを定義',
-            'allowed_block_types': ['url'],
-            'x_position': 400,
-            'y_position': 300,
-            'border_color': '#0891B2',
-            'background_color': '#F0FDFA',
-            'required': False,
-            'order': 4
-        },
-        {
-            'name': 'テンプレート層',
-            'description': 'フロントエンドテンプレートを定義',
-            'allowed_block_types': ['template'],
-            'x_position': 700,
-            'y_position': 300,
-            'border_color': '#DB2777',
-            'background_color': '#FDF2F8',
-            'required': False,
-            'order': 5
-        },
-    ]
-    
-    slots = []
-    for slot_data in default_slots_data:
-        slot = ArchitectureSlot.objects.create(**slot_data)
-        slots.append(slot)
-    
-    return slots
-
 def get_completed_chapters_count(user):
     """
     ユーザーが完了したチャプター数を取得
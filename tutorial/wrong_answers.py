@@ -0,0 +1,77 @@
+# wrong_answers.py - 誤答記録の集約
+"""
+誤答は (ユーザー, 問題) ごとに WrongAnswer 1 行へ集約する。
+
+- 間違えるたびに attempt_count を 1 増やし、last_wrong_at・最後の誤答・
+  正解テキストを更新する。created_at は初めて間違えた日時のまま残る。
+- recent_wrong_answers には重複を除いた最近の誤答を新しい順に
+  settings.TUTORIAL_WRONG_ANSWER_HISTORY 件まで残す。
+- 回数は F() で加算するので、同時に届いた回答でも数え漏れない
+  （recent_wrong_answers は読み込んだ値から作り直すため、同時更新では
+  片方の誤答が履歴に残らないことがある）。
+- 行の追加が同時に起きた場合は (user, question) の一意制約で片方が失敗するので、
+  既存の行の更新としてやり直す。
+
+save() で保存するため、post_save シグナル（user キャッシュの無効化）は従来どおり発火する。
+"""
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+from .models import WrongAnswer
+
+UPDATE_FIELDS = ('attempt_count', 'last_wrong_at', 'wrong_answer', 'correct_answer', 'recent_wrong_answers')
+
+
+def history_limit():
+    return getattr(settings, 'TUTORIAL_WRONG_ANSWER_HISTORY', 5)
+
+
+def merge_recent(recent, answer, limit=None):
+    """最近の誤答（新しい順）の先頭に answer を加え、重複を除いて limit 件にする"""
+    limit = limit or history_limit()
+    return ([answer] + [item for item in (recent or []) if item != answer])[:limit]
+
+
+def _new_row(user, question, wrong_answer, correct_answer, now):
+    return WrongAnswer(
+        user=user, question=question, wrong_answer=wrong_answer, correct_answer=correct_answer,
+        recent_wrong_answers=[wrong_answer], attempt_count=1, created_at=now, last_wrong_at=now,
+    )
+
+
+def _apply_attempt(row, wrong_answer, correct_answer, now):
+    row.attempt_count = models.F('attempt_count') + 1
+    row.last_wrong_at = now
+    row.wrong_answer = wrong_answer
+    row.correct_answer = correct_answer
+    row.recent_wrong_answers = merge_recent(row.recent_wrong_answers, wrong_answer)
+
+
+def record_wrong_answer(user, question, wrong_answer, correct_answer, now=None):
+    """誤答を 1 回記録する"""
+    now = now or timezone.now()
+    row = WrongAnswer.objects.filter(user=user, question=question).first()
+    if row is None:
+        try:
+            with transaction.atomic():
+                _new_row(user, question, wrong_answer, correct_answer, now).save(force_insert=True)
+            return
+        except IntegrityError:
+            row = WrongAnswer.objects.get(user=user, question=question)
+    _apply_attempt(row, wrong_answer, correct_answer, now)
+    row.save(update_fields=UPDATE_FIELDS)
+
+
+async def arecord_wrong_answer(user, question, wrong_answer, correct_answer, now=None):
+    """record_wrong_answer の非同期版"""
+    now = now or timezone.now()
+    row = await WrongAnswer.objects.filter(user=user, question=question).afirst()
+    if row is None:
+        try:
+            await _new_row(user, question, wrong_answer, correct_answer, now).asave(force_insert=True)
+            return
+        except IntegrityError:
+            row = await WrongAnswer.objects.aget(user=user, question=question)
+    _apply_attempt(row, wrong_answer, correct_answer, now)
+    await row.asave(update_fields=UPDATE_FIELDS)